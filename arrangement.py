@@ -0,0 +1,162 @@
+import copy
+import heapq
+import math
+
+import numpy as np
+
+import hrsg as HRSG
+import plant
+
+# Search over the flue gas order of the HRSG's exchangers.
+#
+#     best = arrangement.Search(count=5, min_approach=10)   # main.py's HRSG
+#     best[0].order, best[0].min_approach, best[0].approaches
+#     hrsg = arrangement.Apply(plant.Plant()[2], best[0].order)
+#
+# Each exchanger's duty Q and water/steam profile are fixed by the steam cycle,
+# whatever its position; only the flue gas temperature reaching it depends on
+# the order, through the duties of the exchangers before it. With constant gas
+# cp an exchanger's smallest approach is
+#     T_gas_in + c,  c = min over its segment points of (heat / m cp - t cold) - Q / m cp
+# so c is worked out once per exchanger from a calculated HRSG and an
+# arrangement's approaches need no property calls at all. The stack
+# temperature, inlet - sum(Q) / m cp, is the same for every order, so
+# arrangements are ranked by their smallest approach (largest first). Many
+# orders share it, so ties go to the larger second smallest approach, then the
+# third and so on. With the flue_gas tables cp varies with temperature; the
+# search then uses the first exchanger's mean cp throughout, so its approaches
+# are estimates (Apply recalculates them exactly).
+#
+# The search is depth first over prefixes, branch and bound: a prefix whose
+# approaches already fall below min_approach is infeasible and dropped, and
+# one that cannot beat the count-th best arrangement found so far is dropped
+# too. The gas temperature after a prefix only depends on which exchangers it
+# holds, so the bound, the best smallest approach the remaining exchangers can
+# still reach, is worked out exactly for every subset beforehand (2^n of them
+# rather than n! orders).
+
+
+class Arrangement:
+
+    def __init__(self, order, approaches, min_approach, stack_temp):
+        self.order = order  # exchanger names, flue gas inlet first
+        self.approaches = approaches  # K, smallest approach of each exchanger in order
+        self.min_approach = min_approach
+        self.stack_temp = stack_temp  # K
+
+    def __repr__(self):
+        return "Arrangement(" + ", ".join(self.order) + "; min approach " + str(round(self.min_approach, 3)) + " K)"
+
+
+def Exchangers(hrsg):
+    # (names, Q, c, m cp) of a calculated HRSG; c as in the comment above
+    names = tuple(getattr(exchanger, 'name', str(index)) for index, exchanger in enumerate(hrsg.exchangers))
+    duty = np.array([float(exchanger.Q) for exchanger in hrsg.exchangers])
+    capacity = float(hrsg.exchangers[0].m['hot'] * hrsg.exchangers[0].cp['hot'])
+    offset = np.array([np.min(exchanger.profile['heat'] / capacity - exchanger.profile['t cold']) - exchanger.Q / capacity
+                       for exchanger in hrsg.exchangers])
+    return names, duty, offset, capacity
+
+
+def Search(hrsg=None, count=5, min_approach=-np.inf, stats=None):
+    # the count arrangements with the largest smallest approach, best first,
+    # as a list of Arrangement, among those keeping every approach at least
+    # min_approach K. hrsg is an HRSG, main.py's design point by default.
+    # stats: a dict to receive the number of orders and prefixes visited.
+    if hrsg is None:
+        hrsg = plant.Plant()[2]
+    if not hrsg.calculated:
+        hrsg.Calculate()
+    names, duty, offset, capacity = Exchangers(hrsg)
+    n = len(names)
+    full = (1 << n) - 1
+    inlet = float(hrsg.inlet_temp)
+
+    # gas temperature after each subset of exchangers and the best smallest
+    # approach the others can reach from there, largest subsets first
+    drop = _Drops(duty, capacity)
+    gas = (inlet - drop).tolist()
+    reach = [np.inf] * (full + 1)
+    for subset in range(full - 1, -1, -1):
+        best = -np.inf
+        for index in range(n):
+            if not subset >> index & 1:
+                best = max(best, min(gas[subset] + offset[index], reach[subset | 1 << index]))
+        reach[subset] = best
+    offset = offset.tolist()
+
+    found = []  # heap of (sorted approaches, -sequence, order, approaches), worst first
+    visited = 0
+    stack = [((), (), 0, np.inf)]
+    while stack:
+        order, approaches, subset, worst = stack.pop()
+        visited += 1
+        if subset == full:
+            entry = (sorted(approaches), -visited, order, approaches)
+            if len(found) < count:
+                heapq.heappush(found, entry)
+            else:
+                heapq.heappushpop(found, entry)  # keeps the better of entry and the worst
+            continue
+        children = []
+        for index in range(n):
+            if subset >> index & 1:
+                continue
+            approach = gas[subset] + offset[index]
+            score = min(worst, approach)
+            bound = min(score, reach[subset | 1 << index])
+            if score < min_approach or (len(found) == count and bound < found[0][0][0]):
+                continue
+            children.append((bound, order + (index,), approaches + (approach,), subset | 1 << index, score))
+        children.sort(key=lambda child: child[0])  # best popped first
+        stack.extend(child[1:] for child in children)
+
+    if stats is not None:
+        stats.update({'exchangers': n, 'orders': math.factorial(n), 'prefixes visited': visited})
+    stack_temp = inlet - float(drop[full])
+    return [Arrangement(tuple(names[index] for index in order), approaches, ranked[0], stack_temp)
+            for ranked, sequence, order, approaches in sorted(found, reverse=True)]
+
+
+def Exhaustive(hrsg, count=5):
+    # what Search finds, by scoring every order: the count best sorted
+    # approach tuples, best first. For checking Search on small HRSGs; the gas
+    # temperatures use Search's arithmetic so exact ties stay exact.
+    import itertools
+    names, duty, offset, capacity = Exchangers(hrsg)
+    gas = float(hrsg.inlet_temp) - _Drops(duty, capacity)
+    scores = []
+    for order in itertools.permutations(range(len(names))):
+        subset = 0
+        approaches = []
+        for index in order:
+            approaches.append(float(gas[subset]) + float(offset[index]))
+            subset |= 1 << index
+        scores.append(tuple(sorted(approaches)))
+    return sorted(scores, reverse=True)[:count]
+
+
+def _Drops(duty, capacity):
+    # flue gas temperature drop after each subset of exchangers (bit i set:
+    # exchanger i), so every order of the same exchangers gives the same value
+    drop = np.zeros(1 << len(duty))
+    for subset in range(1, len(drop)):
+        low = subset & -subset
+        drop[subset] = drop[subset ^ low] + duty[low.bit_length() - 1] / capacity
+    return drop
+
+
+def Apply(hrsg, order):
+    # a new calculated HRSG with copies of hrsg's exchangers in order (names)
+    exchangers = {getattr(exchanger, 'name', str(index)): exchanger for index, exchanger in enumerate(hrsg.exchangers)}
+    arranged = HRSG.HRSG([_Copy(exchangers[name]) for name in order], hrsg.inlet_temp)
+    arranged.Calculate()
+    return arranged
+
+
+def _Copy(exchanger):
+    # an exchanger whose temperatures can change without touching the original
+    copied = copy.copy(exchanger)
+    for name in ('t', 'm', 'cp', 'h'):
+        setattr(copied, name, dict(getattr(exchanger, name)))
+    return copied
@@ -0,0 +1,389 @@
+import os
+import time
+import types
+
+import numpy as np
+
+import instrument
+
+# Thermodynamic property backends, one chosen per run.
+#
+#     backends.Use('coolprop')                  # or HRSG_BACKEND=coolprop python main.py
+#     backends.Current().steam._Region1(600, 16.5)['h']
+#     backends.Compare('iapws', 'approximate')  # property and plant differences, timings
+#     backends.Choose(budget=1e-4)              # fastest backend within the budget
+#
+# A Backend has
+#     steam           water/steam properties with both the iapws.iapws97
+#                     scalar interface (_Region1, _Region2, _Region4, _TSat_P,
+#                     _PSat_T, _Backward1_T_Ps, _Backward2_T_Ps) and the
+#                     iapws97_vec array one (Region1, Region2, Saturation,
+#                     Region4, TSat_P, PSat_T, Backward1_T_Ps, Backward2_T_Ps)
+#     AirProperties   h [kJ/kg] and s [kJ/kgK] of air at P [Pa] and T [K],
+#                     scalars or arrays
+#     gas_cp          flue gas cp [kJ/kgK] of the HRSG's hot side
+# SteamCycle, SteamCycleBatch, HeatExchanger(Batch) and GasTurbine(Batch) use
+# Current() whenever they are not handed `properties` (or cp_gas) themselves;
+# with flue_gas.Use('tables') the gas side comes from the flue_gas tables instead.
+#
+#     iapws        iapws.iapws97 for scalars, iapws97_vec (the same equations
+#                  on arrays) for batches, CoolProp HEOS for air. The default,
+#                  and what the results before backends were.
+#     coolprop     CoolProp's low level AbstractState: IF97 water (one state
+#                  reused, a few us a call) and HEOS air
+#     approximate  property_tables (bilinear IAPWS-97 tables, memory mapped)
+#                  and air as an ideal gas of constant cp matched to HEOS at
+#                  298.15 K and 1 atm
+#
+# The choice is module state set by Use(), which also sets the HRSG_BACKEND
+# environment variable so worker processes started afterwards use it too.
+# With instrument.Enable() every property call is counted and timed under its
+# backend's name ('coolprop _Region1', 'approximate air' ...); Accounting()
+# adds them up per backend. Compare() evaluates two backends over ENVELOPE and
+# over random plant cases, for picking the fastest one that meets an accuracy
+# budget. coolprop agrees with iapws to round off about the design point; where
+# the HP turbine expansion ends wet (high hp with low ip) iapws extrapolates
+# the region 2 backward equation while coolprop flashes the state exactly, so
+# the two part by a few percent there.
+
+BACKENDS = ('iapws', 'coolprop', 'approximate')
+DEFAULT = 'iapws'
+
+FLUE_GAS_CP = 1.004  # kJ/kgK
+
+# CoolProp fluid for air. 'BICUBIC&HEOS' trades a one-off table build for much
+# cheaper property calls.
+AIR_FLUID = 'Air'
+AIR_BACKEND = 'HEOS'
+
+# ideal gas air of the approximate backend, referenced to CoolProp HEOS
+AIR_CP = 1.004  # kJ/kgK
+AIR_R = 0.287  # kJ/kgK
+AIR_T0 = 298.15  # K
+AIR_P0 = 101325  # Pa
+AIR_H0 = 424.4360439165022  # kJ/kg, HEOS at T0, P0
+AIR_S0 = 3.880489164764383  # kJ/kgK
+
+# sampled ranges of Compare, T [K] and P [MPa] (air P [bar])
+ENVELOPE = {
+    'region1': {'T': (275, 620), 'P': (0.05, 20)},
+    'region2': {'T': (380, 870), 'P': (0.05, 18)},  # superheat of 5 K and more
+    'saturation': {'P': (0.005, 18)},
+    'air': {'T': (270, 1700), 'P': (0.8, 25)},
+}
+
+STEAM_FUNCTIONS = ('Region1', 'Region2', 'Saturation', 'Region4', 'TSat_P', 'PSat_T', 'Backward1_T_Ps', 'Backward2_T_Ps')
+SCALAR_FUNCTIONS = ('_Region1', '_Region2', '_Region4', '_TSat_P', '_PSat_T', '_Backward1_T_Ps', '_Backward2_T_Ps')
+
+_backends = {}
+
+
+class Backend:
+
+    def __init__(self, name, steam, air, gas_cp=FLUE_GAS_CP):
+        self.name = name
+        self.steam = steam
+        self._air = air  # h, s = air(P [Pa], T [K])
+        self.gas_cp = gas_cp
+
+    def AirProperties(self, P, T):
+        start = instrument.Start()
+        h, s = self._air(P, T)
+        instrument.Stop(self.name + ' air', start)
+        return h, s
+
+
+def Get(name=None):
+    # the Backend called name, Current() for None; built on first use
+    if name is None:
+        return Current()
+    if isinstance(name, Backend):
+        return name
+    if name not in _backends:
+        builders = {'iapws': _Iapws, 'coolprop': _CoolProp, 'approximate': _Approximate}
+        if name not in builders:
+            raise ValueError("Unknown property backend " + str(name) + ", expected one of " + ", ".join(BACKENDS))
+        _backends[name] = builders[name]()
+    return _backends[name]
+
+
+def Current():
+    return Get(os.environ.get('HRSG_BACKEND', DEFAULT))
+
+
+def Use(name):
+    # make name the backend for this process and the workers it starts
+    backend = Get(name)
+    os.environ['HRSG_BACKEND'] = backend.name
+    return backend
+
+
+def Steam(properties=None):
+    # (property object, instrument label) for a model's `properties` argument:
+    # the current backend's steam if None, a Backend's, or any iapws style
+    # module or object as it is
+    if properties is None or isinstance(properties, (Backend, str)):
+        backend = Get(properties)
+        return backend.steam, backend.name
+    return properties, 'iapws'
+
+
+def Accounting():
+    # {backend: {'count', 'seconds'}} of the calls instrument has recorded
+    totals = {}
+    for name, entry in instrument.Profile()['calls'].items():
+        backend = name.split(' ')[0]
+        if backend in BACKENDS:
+            total = totals.setdefault(backend, {'count': 0, 'seconds': 0.0})
+            total['count'] += entry['count']
+            total['seconds'] += entry['seconds']
+    return totals
+
+
+def _Iapws():
+    import iapws.iapws97 as steam
+    import iapws97_vec
+    functions = {name: getattr(iapws97_vec, name) for name in STEAM_FUNCTIONS}
+    functions.update({name: getattr(steam, name) for name in SCALAR_FUNCTIONS})
+    return Backend('iapws', types.SimpleNamespace(**functions), _CoolPropAir())
+
+
+def _CoolProp():
+    return Backend('coolprop', CoolPropSteam(), _CoolPropAir())
+
+
+def _Approximate():
+    import property_tables
+    return Backend('approximate', property_tables.Load(), IdealAir)
+
+
+def _CoolPropAir():
+    # h, s of air from one low level CoolProp state reused for every update,
+    # skipping the string parsing and set-up PropsSI pays on each call. Arrays
+    # of states go through PropsSI in one call, which loops over them in C++.
+    # CoolProp takes seconds to load, so it is imported on the first call.
+    state = []
+
+    def Air(P, T):
+        import CoolProp
+        if np.ndim(P) or np.ndim(T):
+            P, T = np.broadcast_arrays(np.asarray(P, dtype=float), np.asarray(T, dtype=float))
+            props = CoolProp.CoolProp.PropsSI(['H', 'S'], 'P', P.ravel(), 'T', T.ravel(), AIR_BACKEND + '::' + AIR_FLUID)
+            props = np.reshape(props, (-1, 2)) / 1000
+            return props[:, 0].reshape(P.shape), props[:, 1].reshape(P.shape)
+        if not state:
+            state.append(CoolProp.AbstractState(AIR_BACKEND, AIR_FLUID))
+        state[0].update(CoolProp.PT_INPUTS, P, T)
+        return state[0].hmass() / 1000, state[0].smass() / 1000
+    return Air
+
+
+def IdealAir(P, T):
+    # h, s of air as an ideal gas of constant cp, P [Pa] and T [K] scalars or arrays
+    h = AIR_H0 + AIR_CP * (T - AIR_T0)
+    s = AIR_S0 + AIR_CP * np.log(T / AIR_T0) - AIR_R * np.log(P / AIR_P0)
+    return h, s
+
+
+class CoolPropSteam:
+    # IF97 water through one CoolProp AbstractState, with the iapws.iapws97
+    # and iapws97_vec interfaces (P in MPa, h in kJ/kg, s in kJ/kgK). A
+    # region 1 or 2 state within 1e-6 K of saturation is taken on the
+    # saturation line, where CoolProp refuses a P, T flash.
+
+    def __init__(self):
+        import CoolProp
+        self.CoolProp = CoolProp
+        self.state = CoolProp.AbstractState('IF97', 'Water')
+        self.Pc = self.state.p_critical() / 1e6
+
+    def _Props(self, region, x):
+        state = self.state
+        return {'T': state.T(), 'P': state.p() / 1e6, 'v': 1 / state.rhomass(), 'h': state.hmass() / 1000,
+                's': state.smass() / 1000, 'region': region, 'x': x}
+
+    def _Single(self, T, P, region):
+        T, P = float(T), float(P)
+        if P < self.Pc:
+            saturation = self._TSat_P(P)
+            if (region == 1 and T >= saturation - 1e-6) or (region == 2 and T <= saturation + 1e-6):
+                self.state.update(self.CoolProp.PQ_INPUTS, P * 1e6, 0 if region == 1 else 1)
+                return self._Props(region, 0 if region == 1 else 1)
+        self.state.update(self.CoolProp.PT_INPUTS, P * 1e6, T)
+        return self._Props(region, 0 if region == 1 else 1)
+
+    def _Region1(self, T, P):
+        return self._Single(T, P, 1)
+
+    def _Region2(self, T, P):
+        return self._Single(T, P, 2)
+
+    def _Region4(self, P, x):
+        self.state.update(self.CoolProp.PQ_INPUTS, float(P) * 1e6, float(x))
+        return self._Props(4, x)
+
+    def _TSat_P(self, P):
+        self.state.update(self.CoolProp.PQ_INPUTS, float(P) * 1e6, 0)
+        return self.state.T()
+
+    def _PSat_T(self, T):
+        self.state.update(self.CoolProp.QT_INPUTS, 0, float(T))
+        return self.state.p() / 1e6
+
+    def _Backward1_T_Ps(self, P, s):
+        self.state.update(self.CoolProp.PSmass_INPUTS, float(P) * 1e6, float(s) * 1000)
+        return self.state.T()
+
+    def _Backward2_T_Ps(self, P, s):
+        self.state.update(self.CoolProp.PSmass_INPUTS, float(P) * 1e6, float(s) * 1000)
+        T = self.state.T()
+        return max(T, self._TSat_P(P)) if P <= self.Pc else T
+
+    # arrays, element by element on the one state
+
+    def _Each(self, function, *args, keys=('T', 'P', 'v', 'h', 's')):
+        args = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in args])
+        flat = [value.reshape(-1) for value in args]
+        results = [function(*values) for values in zip(*[value.tolist() for value in flat])]
+        return {key: np.array([result[key] for result in results], dtype=float).reshape(args[0].shape) for key in keys}
+
+    def _EachValue(self, function, *args):
+        args = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in args])
+        values = [function(*values) for values in zip(*[value.reshape(-1).tolist() for value in args])]
+        return np.array(values, dtype=float).reshape(args[0].shape)
+
+    def Region1(self, T, P, derivatives=False):
+        return self._Each(self._Region1, T, P)
+
+    def Region2(self, T, P, derivatives=False):
+        return self._Each(self._Region2, T, P)
+
+    def Region4(self, P, x):
+        return self._Each(self._Region4, P, x, keys=('T', 'P', 'v', 'h', 's', 'x'))
+
+    def Saturation(self, P):
+        return self._Each(lambda P: self._Region4(P, 0), P), self._Each(lambda P: self._Region4(P, 1), P)
+
+    def TSat_P(self, P):
+        return self._EachValue(self._TSat_P, P)
+
+    def PSat_T(self, T):
+        return self._EachValue(self._PSat_T, T)
+
+    def Backward1_T_Ps(self, P, s):
+        return self._EachValue(self._Backward1_T_Ps, P, s)
+
+    def Backward2_T_Ps(self, P, s, clamp=True):
+        return self._EachValue(self._Backward2_T_Ps if clamp else self._Backward2Unclamped, P, s)
+
+    def _Backward2Unclamped(self, P, s):
+        self.state.update(self.CoolProp.PSmass_INPUTS, float(P) * 1e6, float(s) * 1000)
+        return self.state.T()
+
+
+def Samples(points=2000, seed=0, envelope=ENVELOPE):
+    # random states over envelope: {'region1': (T, P), 'region2': (T, P),
+    # 'saturation': P, 'air': (T, P bar)}; log uniform in P
+    import iapws97_vec
+    rng = np.random.default_rng(seed)
+
+    def Pressure(low, high):
+        return np.exp(rng.uniform(np.log(low), np.log(high), points))
+
+    samples = {}
+    for region in ('region1', 'region2'):
+        P = Pressure(*envelope[region]['P'])
+        T = rng.uniform(*envelope[region]['T'], points)
+        saturation = iapws97_vec.TSat_P(P)
+        # keep region 1 below and region 2 5 K above saturation
+        T = np.minimum(T, saturation - 1) if region == 'region1' else np.maximum(T, saturation + 5)
+        samples[region] = (T, P)
+    samples['saturation'] = Pressure(*envelope['saturation']['P'])
+    samples['air'] = (rng.uniform(*envelope['air']['T'], points), Pressure(*envelope['air']['P']))
+    return samples
+
+
+def _Properties(backend, samples):
+    # {property: values} of one backend at the samples, and seconds per call
+    steam = backend.steam
+    values, seconds = {}, {}
+
+    def Timed(name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        seconds[name] = (time.perf_counter() - start) / len(np.atleast_1d(args[0]))
+        return result
+
+    for region, function in (('region1', steam.Region1), ('region2', steam.Region2)):
+        T, P = samples[region]
+        props = Timed(region, function, T, P)
+        values[region + ' h'], values[region + ' s'] = props['h'], props['s']
+        backward = steam.Backward1_T_Ps if region == 'region1' else steam.Backward2_T_Ps
+        values[region + ' backward T'] = Timed(region + ' backward', backward, P, props['s']) - T
+    liquid, vapour = Timed('saturation', steam.Saturation, samples['saturation'])
+    values['saturation T'] = liquid['T']
+    values['saturation hf'], values['saturation hg'] = liquid['h'], vapour['h']
+    values['saturation sf'], values['saturation sg'] = liquid['s'], vapour['s']
+    T, P = samples['air']
+    reference = np.array(backend._air(AIR_P0, AIR_T0))
+    start = time.perf_counter()
+    air = [backend._air(pressure * 1e5, temperature) for temperature, pressure in zip(T.tolist(), P.tolist())]
+    seconds['air'] = (time.perf_counter() - start) / len(T)
+    air = np.array(air, dtype=float) - reference  # changes from T0, P0, free of the reference state
+    values['air h'], values['air s'] = air[:, 0], air[:, 1]
+    return values, seconds
+
+
+def Compare(a='iapws', b='approximate', points=2000, seed=0, plant_cases=200, envelope=ENVELOPE):
+    # differences of backend b from backend a over envelope:
+    #     'properties': {property: worst absolute difference}  (K, kJ/kg, kJ/kgK;
+    #                   backward T is the error of T(P, s(T, P)) - T)
+    #     'plant':      {plant result: worst relative difference} over
+    #                   plant_cases random cases of the random steam inputs
+    #     'seconds':    {call: (seconds per state for a, for b)}
+    import plant
+    a, b = Get(a), Get(b)
+    samples = Samples(points, seed, envelope)
+    values_a, seconds_a = _Properties(a, samples)
+    values_b, seconds_b = _Properties(b, samples)
+    properties = {name: float(np.max(np.abs(values_b[name] - values_a[name]))) for name in values_a}
+
+    differences = {}
+    if plant_cases:
+        inputs = PlantCases(plant_cases, seed)
+        results = []
+        for backend, seconds in ((a, seconds_a), (b, seconds_b)):
+            start = time.perf_counter()
+            results.append(plant.EvaluatePlantBatch(inputs, properties=backend.steam))
+            seconds['plant case'] = (time.perf_counter() - start) / plant_cases
+        differences = {name: float(np.nanmax(np.abs(results[1][name] - results[0][name]) / np.maximum(np.abs(results[0][name]), 1e-12)))
+                       for name in plant.RESULTS}
+    return {'backends': (a.name, b.name), 'properties': properties, 'plant': differences,
+            'seconds': {name: (seconds_a[name], seconds_b[name]) for name in seconds_a}}
+
+
+def PlantCases(n=200, seed=0):
+    # random steam cycle operating points about the main.py design point
+    rng = np.random.default_rng(seed)
+    return {
+        'hp': rng.uniform(140, 165, n),
+        'ip': rng.uniform(7, 10, n),
+        'lp': rng.uniform(3, 5, n),
+        'm1': rng.uniform(45, 55, n),
+        'm3': rng.uniform(50, 58, n),
+        'steam_high_temp': rng.uniform(550, 580, n),
+        'water_low_temp': rng.uniform(5, 25, n),
+    }
+
+
+def Choose(budget=1e-4, reference='iapws', candidates=BACKENDS, plant_cases=200, seed=0):
+    # (name, comparison) of the backend with the fastest plant case whose
+    # plant results are all within budget (relative) of the reference
+    best = None
+    for name in candidates:
+        comparison = Compare(reference, name, points=200, seed=seed, plant_cases=plant_cases)
+        if max(comparison['plant'].values()) <= budget:
+            seconds = comparison['seconds']['plant case'][1]
+            if best is None or seconds < best[2]:
+                best = (name, comparison, seconds)
+    return best[:2] if best else None
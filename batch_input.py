@@ -0,0 +1,215 @@
+import csv
+import itertools
+import os
+import re
+import time
+
+import numpy as np
+
+import instrument
+import plant
+import timeseries
+
+# Operating point files of any length through the plant, a chunk at a time.
+#
+#     stats = batch_input.Evaluate('points.csv', 'results')    # writes results.csv
+#     stats['rows per second'], stats['invalid'], stats['failed']
+#     for names, rows, valid in batch_input.Chunks('points.npy', chunk=50000): ...
+#
+# Inputs are CSV files with a header row, .npy files (structured, or 2D with
+# `names`) or raw float64 files (.bin, with `names`). Columns are plant inputs,
+# 'load' (the fraction timeseries.LOAD_INPUTS are scaled by) or ignored with
+# ignore=(...). A header can give a column's unit, "hp [MPa]" or
+# "T_atm [K]", or `units` can ({'hp': 'MPa'}); columns without one are in the
+# units of plant.DEFAULTS (UNITS below).
+#
+# CSV files are streamed `chunk` lines at a time and binary files are memory
+# mapped and sliced, so peak memory depends on the chunk size and not on the
+# file. Each chunk is converted to the plant's units, scaled by its load and
+# then checked against LIMITS in whole-array operations; rows with a missing,
+# non-numeric or out of range value are counted as invalid and given nan
+# results without being evaluated. Blank lines are not rows. The rest go
+# through plant.EvaluateRows in one batch.
+
+# unit of each plant input in plant.DEFAULTS
+UNITS = {
+    'hp': 'bar', 'ip': 'bar', 'lp': 'bar', 'P_atm': 'bar',
+    'm1': 'kg/s', 'm2': 'kg/s', 'm3': 'kg/s', 'ma': 'kg/s', 'fuel_in': 'kg/s', 'fluegas_massflow': 'kg/s',
+    'steam_high_temp': 'C', 'water_low_temp': 'C', 'T_atm': 'C',
+    'LHV': 'kJ/kg', 'cp_gas': 'kJ/kgK',
+    'AF': '-', 'P_r': '-', 'n_t': '-', 'n_c': '-', 'k_gas': '-', 'load': '-',
+}
+
+# unit -> (quantity, scale, offset): value in the quantity's base unit is value * scale + offset
+CONVERSIONS = {
+    'Pa': ('pressure', 1, 0), 'kPa': ('pressure', 1e3, 0), 'bar': ('pressure', 1e5, 0), 'MPa': ('pressure', 1e6, 0),
+    'K': ('temperature', 1, 0), 'C': ('temperature', 1, 273.15),
+    'kg/s': ('mass flow', 1, 0), 'kg/h': ('mass flow', 1 / 3600, 0), 't/h': ('mass flow', 1 / 3.6, 0),
+    'kJ/kg': ('specific energy', 1, 0), 'MJ/kg': ('specific energy', 1e3, 0),
+    'kJ/kgK': ('specific heat', 1, 0), 'J/kgK': ('specific heat', 1e-3, 0),
+    '-': ('ratio', 1, 0), '%': ('ratio', 1e-2, 0),
+}
+
+# valid range of each input in its plant.DEFAULTS unit, ends included
+LIMITS = {
+    'hp': (0.01, 1000), 'ip': (0.01, 1000), 'lp': (0.01, 1000), 'P_atm': (0.01, 100),
+    'm1': (0, np.inf), 'm2': (0, np.inf), 'm3': (0, np.inf), 'ma': (0, np.inf), 'fuel_in': (0, np.inf),
+    'fluegas_massflow': (1e-9, np.inf),
+    'steam_high_temp': (0, 2000), 'water_low_temp': (0, 370), 'T_atm': (-100, 100),
+    'LHV': (0, np.inf), 'cp_gas': (1e-9, np.inf),
+    'AF': (0, np.inf), 'P_r': (1, np.inf), 'n_t': (1e-9, 1), 'n_c': (1e-9, 1), 'k_gas': (1 + 1e-9, np.inf),
+    'load': (0, np.inf),
+}
+
+
+def Convert(values, unit, to):
+    # values in `unit` expressed in `to`, e.g. Convert(p, 'bar', 'MPa')
+    if unit == to:
+        return np.asarray(values, dtype=float)
+    for name in (unit, to):
+        if name not in CONVERSIONS:
+            raise ValueError("Unknown unit " + str(name) + ", expected one of " + ", ".join(CONVERSIONS))
+    quantity, scale, offset = CONVERSIONS[unit]
+    target, to_scale, to_offset = CONVERSIONS[to]
+    if quantity != target:
+        raise ValueError("Cannot convert " + quantity + " in " + unit + " to " + target + " in " + to)
+    return (np.asarray(values, dtype=float) * scale + offset - to_offset) / to_scale
+
+
+def ParseColumn(column):
+    # (name, unit or None) of a header entry such as "hp [MPa]"
+    match = re.fullmatch(r'\s*([^\[\]]*?)\s*(?:\[\s*([^\[\]]*?)\s*\])?\s*', column)
+    return match.group(1), match.group(2) or None
+
+
+def Columns(header, units=None, ignore=()):
+    # (names, units, keep): plant input names, their units in the file and
+    # the indices of the columns that are used
+    names, file_units, keep = [], [], []
+    for index, column in enumerate(header):
+        name, unit = ParseColumn(column)
+        if name in ignore:
+            continue
+        if name not in UNITS:
+            raise ValueError("Unknown column " + str(column) + ", expected plant inputs or load")
+        names.append(name)
+        file_units.append((units or {}).get(name, unit) or UNITS[name])
+        Convert(0, file_units[-1], UNITS[name])  # raises for a unit of the wrong kind
+        keep.append(index)
+    return tuple(names), tuple(file_units), keep
+
+
+def Read(filename, chunk=100000, names=None):
+    # (header, rows) chunks of a file as float arrays in the file's units;
+    # text that is not a number becomes nan
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        with open(filename, newline='') as f:
+            header = next(csv.reader([f.readline()]))
+            while True:
+                lines = list(itertools.islice(f, chunk))
+                if not lines:
+                    return
+                yield header, _ParseLines(lines, len(header))
+    elif extension in ('.npy', '.bin'):
+        if extension == '.npy':
+            data = np.load(filename, mmap_mode='r')
+        elif names is None:
+            raise ValueError("Raw binary files need the column names")
+        else:
+            data = np.memmap(filename, dtype=np.float64, mode='r').reshape(-1, len(names))
+        if data.dtype.names:
+            header = list(data.dtype.names)
+        elif names is None:
+            raise ValueError("2D .npy files need the column names")
+        else:
+            header = list(names)
+        for start in range(0, len(data), chunk):
+            part = data[start:start + chunk]
+            if data.dtype.names:
+                yield header, np.stack([np.asarray(part[name], dtype=float) for name in header], axis=1)
+            else:
+                yield header, np.asarray(part, dtype=float).reshape(len(part), len(header))
+    else:
+        raise ValueError("Unknown operating point file type " + extension + ", expected .csv, .npy or .bin")
+
+
+def _ParseLines(lines, columns):
+    # CSV lines as a (lines, columns) array, fast path first, then row by row
+    # for the chunks holding blank or non-numeric fields or short rows. Blank
+    # lines are skipped on both paths, as np.loadtxt skips them.
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        return np.empty((0, columns))
+    try:
+        rows = np.loadtxt(lines, delimiter=',', ndmin=2)
+        if rows.shape[1] == columns:
+            return rows
+    except ValueError:
+        pass
+    rows = np.full((len(lines), columns), np.nan)
+    for index, row in enumerate(csv.reader(lines)):
+        for column, value in enumerate(row[:columns]):
+            try:
+                rows[index, column] = float(value)
+            except ValueError:
+                pass
+    return rows
+
+
+def Chunks(filename, chunk=100000, names=None, units=None, ignore=(), base=None):
+    # (plant.INPUTS, rows, valid) per chunk: rows of every plant input in
+    # plant.DEFAULTS units, file columns converted and load applied, missing
+    # inputs from base (plant.DEFAULTS by default), and the rows whose load and
+    # final inputs pass LIMITS
+    base = dict(plant.DEFAULTS, **(base or {}))
+    for header, data in Read(filename, chunk, names):
+        columns, file_units, keep = Columns(header, units, ignore)
+        values = {name: Convert(data[:, index], unit, UNITS[name]) for name, unit, index in zip(columns, file_units, keep)}
+        load = values.pop('load', 1)
+        rows = np.empty((len(data), len(plant.INPUTS)))
+        for index, name in enumerate(plant.INPUTS):
+            rows[:, index] = values.get(name, base[name])
+            if name in timeseries.LOAD_INPUTS:
+                rows[:, index] *= load
+        # checked as the plant will see them, after the load is applied
+        valid = np.ones(len(data), dtype=bool)
+        for name, value in itertools.chain([('load', load)], zip(plant.INPUTS, rows.T)):
+            low, high = LIMITS[name]
+            valid &= (value >= low) & (value <= high)  # nan fails both
+        yield plant.INPUTS, rows, valid
+
+
+def Evaluate(filename, output=None, chunk=10000, names=None, units=None, ignore=(), base=None, segments=1, store=None, progress=None):
+    # plant.RESULTS of every row of filename; output: file name (no extension)
+    # of a CSV of the rows' plant inputs and results. store: a
+    # result_store.ResultStore the valid rows are appended to. progress is
+    # called as progress(rows_done). Returns counts and timing.
+    start = time.perf_counter()
+    counts = {'rows': 0, 'invalid': 0, 'failed': 0}
+    writer = open(output + ".csv", 'w') if output else None
+    try:
+        if writer:
+            writer.write(",".join(plant.INPUTS + plant.RESULTS) + "\n")
+        for inputs, rows, valid in Chunks(filename, chunk, names, units, ignore, base):
+            results = np.full((len(rows), len(plant.RESULTS)), np.nan)
+            if valid.any():
+                with instrument.Stage('batch input chunk'):
+                    results[valid] = plant.EvaluateRows(rows[valid], inputs, batch=True, segments=segments)
+                if store is not None:
+                    store.AppendTable(inputs, rows[valid], results[valid])
+            counts['rows'] += len(rows)
+            counts['invalid'] += int(np.count_nonzero(~valid))
+            counts['failed'] += int(np.count_nonzero(valid & np.all(np.isnan(results), axis=1)))
+            if writer:
+                np.savetxt(writer, np.concatenate([rows, results], axis=1), delimiter=',', fmt='%.10g')
+            if progress is not None:
+                progress(counts['rows'])
+    finally:
+        if writer:
+            writer.close()
+        if store is not None:
+            store.Flush()
+    counts['seconds'] = time.perf_counter() - start
+    counts['rows per second'] = counts['rows'] / counts['seconds'] if counts['seconds'] else 0.0
+    return counts
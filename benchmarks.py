@@ -0,0 +1,1067 @@
+import argparse
+import contextlib
+import glob
+import io
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import steam_3_pressure_with_reheat as steam
+
+# Timing checks for the fast paths against the original classes.
+# Run from within the HRSG folder: python benchmarks.py [name ...], --help
+# for the options. test_models.py asserts the accuracy claims (python -m pytest).
+
+
+def RandomSteamInputs(n, seed=0):
+    # hp kept below 165 bar so the drums stay out of IAPWS region 3
+    rng = np.random.default_rng(seed)
+    return [rng.uniform(100, 165, n),  # hp
+            rng.uniform(6, 12, n),  # ip
+            rng.uniform(3, 5, n),  # lp
+            rng.uniform(40, 55, n),  # m1
+            rng.uniform(4, 8, n),  # m2
+            rng.uniform(45, 60, n),  # m3
+            rng.uniform(20, 39, n),  # ma
+            rng.uniform(500, 580, n),  # steam_high_temp
+            rng.uniform(12, 25, n)]  # water_low_temp
+
+
+def SteamCycleBatch(n=100000, scalar_cases=200):
+    inputs = RandomSteamInputs(n)
+
+    start = time.perf_counter()
+    batch = steam.SteamCycleBatch(*inputs)
+    batch_time = (time.perf_counter() - start) / n
+
+    # worst relative difference over the states (P[6] is never set, so 0 in both)
+    worst = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(scalar_cases):
+            cycle = steam.SteamCycle(*[value[i] for value in inputs])
+            for name in ('T', 'P', 'h', 's'):
+                reference = np.array(getattr(cycle, name)[1:])
+                error = np.abs(getattr(batch, name)[1:, i] - reference) / np.maximum(np.abs(reference), 1e-12)
+                worst = max(worst, error.max())
+    scalar_time = (time.perf_counter() - start) / scalar_cases
+
+    return {
+        'cases': n,
+        'batch us/case': batch_time * 1e6,
+        'scalar us/case': scalar_time * 1e6,
+        'speedup': scalar_time / batch_time,
+        'max relative error': worst
+    }
+
+
+def PropertyTables(repeats=2000):
+    import timeit
+    import iapws.iapws97 as iapws97
+    import property_tables
+
+    tables = property_tables.Load()
+    results = property_tables.Validate(tables)
+    for name, analytic, tabulated in (
+            ('region 1', lambda: iapws97._Region1(400, 0.8), lambda: tables._Region1(400, 0.8)),
+            ('region 2', lambda: iapws97._Region2(700, 0.8), lambda: tables._Region2(700, 0.8)),
+            ('region 4', lambda: iapws97._Region4(0.8, 1), lambda: tables._Region4(0.8, 1)),
+            ('backward 2', lambda: iapws97._Backward2_T_Ps(0.8, 7), lambda: tables._Backward2_T_Ps(0.8, 7))):
+        analytic_time = timeit.timeit(analytic, number=repeats) / repeats
+        tabulated_time = timeit.timeit(tabulated, number=repeats) / repeats
+        results[name + ' speedup'] = analytic_time / tabulated_time
+    return results
+
+
+def GasTurbine(n=1000, seed=0):
+    # pressure ratio / efficiency sweep. The original class made 8 PropsSI calls
+    # per turbine; that property cost alone is compared with whole GasTurbine
+    # constructions on the reusable AbstractState (cold and warm cache) and with
+    # GasTurbineBatch over the whole sweep.
+    from CoolProp.CoolProp import PropsSI
+    import gas_turbine as gt
+
+    rng = np.random.default_rng(seed)
+    P_r = rng.uniform(10, 30, n)
+    n_t = rng.uniform(0.8, 0.9, n)
+    n_c = rng.uniform(0.8, 0.9, n)
+
+    batch = gt.GasTurbineBatch(14.2, 50, 50000, P_r, n_t, n_c)
+    gt.AirProperties.cache_clear()
+    start = time.perf_counter()
+    for i in range(n):
+        for index in range(1, 5):
+            P = gt.BarToPa(batch.P[index, i])
+            T = gt.ToKelvin(batch.T[index, i])
+            PropsSI('S', 'P', P, 'T', T, 'Air')
+            PropsSI('H', 'P', P, 'T', T, 'Air')
+    propssi_time = (time.perf_counter() - start) / n
+
+    gt.AirProperties.cache_clear()
+    start = time.perf_counter()
+    for i in range(n):
+        gt.GasTurbine(14.2, 50, 50000, P_r[i], n_t[i], n_c[i])
+    cold_time = (time.perf_counter() - start) / n
+
+    start = time.perf_counter()
+    for i in range(n):
+        gt.GasTurbine(14.2, 50, 50000, P_r[i], n_t[i], n_c[i])
+    warm_time = (time.perf_counter() - start) / n
+
+    gt.AirProperties.cache_clear()
+    start = time.perf_counter()
+    gt.GasTurbineBatch(14.2, 50, 50000, P_r, n_t, n_c)
+    batch_time = (time.perf_counter() - start) / n
+
+    return {
+        'cases': n,
+        'PropsSI calls only us/case': propssi_time * 1e6,
+        'GasTurbine us/case': cold_time * 1e6,
+        'GasTurbine cached us/case': warm_time * 1e6,
+        'GasTurbineBatch us/case': batch_time * 1e6,
+        'speedup': propssi_time / batch_time,
+    }
+
+
+def InverseProperties(n=20000, seed=0):
+    # round trip through the forward equations; the original PFromTS stepped
+    # down from p0 in `precision` increments, timed here from 1 MPa above
+    import iapws.iapws97 as iapws97
+    import iapws97_vec
+    import inverse_properties
+
+    rng = np.random.default_rng(seed)
+    T = rng.uniform(650, 1050, n)
+    P = np.exp(rng.uniform(np.log(0.001), np.log(10), n))
+    region2 = iapws97_vec.Region2(T, P, derivatives=False)
+    T1 = rng.uniform(280, 600, n)
+    P1 = np.maximum(np.exp(rng.uniform(np.log(0.01), np.log(90), n)), 1.001 * iapws97_vec.PSat_T(T1))
+    region1 = iapws97_vec.Region1(T1, P1, derivatives=False)
+
+    results = {'cases': n}
+    for name, solve, reference in (
+            ('PFromTS region 2', lambda: inverse_properties.PFromTS(T, region2['s']), P),
+            ('TFromPH region 2', lambda: inverse_properties.TFromPH(P, region2['h'], region=2), T),
+            ('TFromPS region 2', lambda: inverse_properties.TFromPS(P, region2['s'], region=2), T),
+            ('PFromTH region 2', lambda: inverse_properties.PFromTH(T, region2['h'], region=2), P),
+            ('TFromPH region 1', lambda: inverse_properties.TFromPH(P1, region1['h']), T1),
+            ('TFromPS region 1', lambda: inverse_properties.TFromPS(P1, region1['s']), T1)):
+        start = time.perf_counter()
+        solved = solve()
+        results[name + ' us/case'] = (time.perf_counter() - start) / n * 1e6
+        results[name + ' max relative error'] = np.max(np.abs(solved / reference - 1))
+
+    target = iapws97._Region2(700, 0.8)['s']
+    start = time.perf_counter()
+    p = 1.8
+    while iapws97._Region2(700, p)['s'] < target:
+        p -= 1e-4
+    stepping_time = time.perf_counter() - start
+    start = time.perf_counter()
+    inverse_properties.PFromTS(700, target, guess=1.8)
+    results['PFromTS scalar speedup over 1e-4 MPa stepping'] = stepping_time / (time.perf_counter() - start)
+    return results
+
+
+def Sweep(n=400, seed=0):
+    # plant sweep throughput for 1, 2, 4, ... workers up to the core count.
+    # Scaling is only near linear when each worker gets several chunks of
+    # enough cases that the ~ms per case dominates process start-up.
+    import sweep
+
+    rng = np.random.default_rng(seed)
+    cases = {'hp': rng.uniform(100, 165, n), 'm1': rng.uniform(40, 55, n), 'P_r': rng.uniform(12, 25, n)}
+    results = {'cases': n, 'cores': os.cpu_count()}
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        start = time.perf_counter()
+        sweep.Sweep(cases, workers=workers)
+        elapsed = time.perf_counter() - start
+        results[str(workers) + ' workers cases/s'] = n / elapsed
+        if workers == 1:
+            serial = elapsed
+        else:
+            results[str(workers) + ' workers scaling'] = serial / elapsed / workers
+        workers *= 2
+    return results
+
+
+def Optimise(workers=1):
+    # time to the constrained net work optimum from the default settings,
+    # compared with the hand-tuned main.py design point
+    import optimise
+    import plant
+
+    start = time.perf_counter()
+    best = optimise.Optimise('net_work', workers=workers)
+    return {
+        'seconds': time.perf_counter() - start,
+        'generations': best.generations,
+        'plant evaluations': best.evaluations,
+        'cache hits': best.cache_hits,
+        'feasible': best.feasible,
+        'net work kW': best.value,
+        'design point net work kW': plant.EvaluatePlant()['net_work'],
+        'inputs': {name: round(value, 3) for name, value in best.inputs.items()},
+    }
+
+
+def Pinch(segments=200, repeats=50, n=200, seed=0):
+    # discretised HRSG: one design point with the scalar classes, then a batch
+    import plant
+
+    gasTurbine, steamCycle, hrsg = plant.Plant(segments=segments)
+    start = time.perf_counter()
+    for i in range(repeats):
+        hrsg.Calculate()
+    scalar_time = (time.perf_counter() - start) / repeats
+
+    inputs = dict(zip(('hp', 'ip', 'lp', 'm1', 'm2', 'm3', 'ma', 'steam_high_temp', 'water_low_temp'), RandomSteamInputs(n, seed)))
+    gasTurbine, steamCycle, batch = plant.PlantBatch(inputs, segments=segments)
+    start = time.perf_counter()
+    batch.Calculate()
+    batch_time = (time.perf_counter() - start) / n
+
+    return {
+        'segments': segments,
+        'exchangers': len(hrsg.exchangers),
+        'HRSG.Calculate ms': scalar_time * 1e3,
+        'min approach K': hrsg.min_approach,
+        'pinch': hrsg.pinch['exchanger'],
+        'HRSGBatch.Calculate ms/case': batch_time * 1e3,
+    }
+
+
+def PlantModel(repeats=200):
+    # one-parameter changes on the dependency-tracked model against a full
+    # plant evaluation
+    import plant
+    import plant_model
+
+    model = plant_model.PlantModel()
+    model.Calculate()
+    results = {}
+    for label, change in (('LP Economiser flow', lambda i: model.SetExchanger('LP Economiser', m_cold=100 + 0.01 * i)),
+                          ('m1', lambda i: model.Set(m1=45 + 0.01 * i)),
+                          ('P_r', lambda i: model.Set(P_r=18 + 0.01 * i))):
+        start = time.perf_counter()
+        for i in range(repeats):
+            change(i)
+            model.Calculate()
+        results[label + ' us'] = (time.perf_counter() - start) / repeats * 1e6
+        results[label + ' nodes rerun'] = len(model.recomputed)
+
+    start = time.perf_counter()
+    for i in range(repeats):
+        plant.EvaluatePlant(m1=45 + 0.01 * i)
+    results['full EvaluatePlant us'] = (time.perf_counter() - start) / repeats * 1e6
+    return results
+
+
+def States(n=300, cases=1000000):
+    # memory kept per case when a sweep holds on to its cycles: whole objects
+    # with the iapws result dicts, whole objects without them, and the
+    # __slots__ Result() records. Measured over n cases, scaled to `cases`.
+    import tracemalloc
+    import gas_turbine as gt
+
+    inputs = RandomSteamInputs(n)
+    P_r = np.random.default_rng(1).uniform(12, 25, n)
+    results = {'measured cases': n}
+    for label, keep, compact in (('objects with property dicts', True, False),
+                                 ('objects without property dicts', False, False),
+                                 ('Result records', False, True)):
+        kept = []
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(n):
+                cycle = steam.SteamCycle(*[value[i] for value in inputs], keep_properties=keep)
+                turbine = gt.GasTurbine(14.2, 50, 50000, P_r[i], .85, .85)
+                kept.append((cycle.Result(), turbine.Result()) if compact else (cycle, turbine))
+                del cycle, turbine
+        gt.AirProperties.cache_clear()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[label + ' bytes/case'] = size / n
+        results[label + ' GB per ' + str(cases) + ' cases'] = size / n * cases / 1e9
+        del kept
+    return results
+
+
+def ResultStore(n=2000, chunk_cases=500):
+    # n batch cases (states, works, exchangers) written to a result store and
+    # read back, against the same steam state rows as CSV text
+    import shutil
+    import tempfile
+    import plant
+    import result_store
+
+    inputs = dict(zip(('hp', 'ip', 'lp', 'm1', 'm2', 'm3', 'ma', 'steam_high_temp', 'water_low_temp'), RandomSteamInputs(n)))
+    chunks = []
+    for first in range(0, n, chunk_cases):
+        chunk = {name: value[first:first + chunk_cases] for name, value in inputs.items()}
+        chunks.append((plant.PlantBatch(chunk), chunk))
+    folder = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        with result_store.ResultStore(folder + '/store', chunk_cases=chunk_cases) as store:
+            for objects, chunk in chunks:
+                store.AppendBatch(*objects, inputs=chunk)
+        write_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = result_store.ResultStore(folder + '/store')
+        states = store.Read('steam_states')
+        hot_out = store.Read('exchangers')['hot_out']
+        read_time = time.perf_counter() - start
+
+        table = np.stack([states[name] for name in ('case', 'state', 'T', 'P', 'h', 's')], axis=1).astype(float)
+        start = time.perf_counter()
+        np.savetxt(folder + '/steam_data.csv', table, delimiter=',')
+        csv_write_time = time.perf_counter() - start
+        start = time.perf_counter()
+        np.loadtxt(folder + '/steam_data.csv', delimiter=',')
+        csv_read_time = time.perf_counter() - start
+        size = sum(os.path.getsize(filename) for filename in glob.glob(folder + '/store/*'))
+        csv_size = os.path.getsize(folder + '/steam_data.csv')
+    finally:
+        shutil.rmtree(folder)
+
+    expected = np.concatenate([np.stack([exchanger.t['hot out'] for exchanger in objects[2].exchangers], axis=1).reshape(-1)
+                               for objects, chunk in chunks])
+    return {
+        'cases': n,
+        'store write (all tables) ms': write_time * 1e3,
+        'store read states + exchangers ms': read_time * 1e3,
+        'steam states csv write ms': csv_write_time * 1e3,
+        'steam states csv read ms': csv_read_time * 1e3,
+        'store bytes/case (all tables)': size / n,
+        'steam states csv bytes/case': csv_size / n,
+        'read back exact': bool(np.array_equal(hot_out, expected)),
+    }
+
+
+def Instrument(n=300):
+    # SteamCycle with its printout sent to a null stream (what the sweeps did)
+    # against quiet mode, and a plant evaluation with instrumentation off and on
+    import instrument
+    import plant
+
+    inputs = RandomSteamInputs(n)
+    results = {'cases': n}
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        start = time.perf_counter()
+        for i in range(n):
+            steam.SteamCycle(*[value[i] for value in inputs], keep_properties=False)
+        results['SteamCycle printing us'] = (time.perf_counter() - start) / n * 1e6
+    with instrument.Quiet():
+        start = time.perf_counter()
+        for i in range(n):
+            steam.SteamCycle(*[value[i] for value in inputs], keep_properties=False)
+        results['SteamCycle quiet us'] = (time.perf_counter() - start) / n * 1e6
+
+    for label, on in (('off', False), ('on', True)):
+        instrument.Enable(on)
+        instrument.Reset()
+        start = time.perf_counter()
+        for i in range(n):
+            plant.Plant(hp=inputs[0][i])
+        results['Plant instrumentation ' + label + ' us'] = (time.perf_counter() - start) / n * 1e6
+    profile = instrument.Profile()
+    instrument.Enable(False)
+    results['property calls per case'] = {name: entry['count'] / n for name, entry in profile['regions'].items()}
+    results['stage ms per case'] = {name: round(entry['seconds'] / n * 1e3, 3) for name, entry in profile['stages'].items()}
+    return results
+
+
+STARTUP_TARGET = 0.5  # s, cold start of the models and of python cli.py --help
+HEAVY_MODULES = ('matplotlib', 'CoolProp', 'iapws', 'scipy')
+
+
+def Startup(repeats=3):
+    # cold start in fresh interpreters: importing the models, the CLI's help,
+    # and a whole design point run from the CLI (best of repeats)
+    import subprocess
+
+    folder = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for label, command in (('import models', [sys.executable, '-c', 'import cli, plant, plant_model, sweep, optimise, result_store']),
+                           ('cli --help', [sys.executable, 'cli.py', '--help']),
+                           ('cli design point', [sys.executable, 'cli.py', '--quiet'])):
+        times = []
+        for repeat in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=folder, check=True, stdout=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+        results[label + ' s'] = min(times)
+    loaded = subprocess.run([sys.executable, '-c', 'import sys, cli, plant, plant_model, sweep, optimise, result_store; '
+                             'print(" ".join(name for name in ' + repr(HEAVY_MODULES) + ' if name in sys.modules))'],
+                            cwd=folder, check=True, capture_output=True, text=True).stdout.split()
+    results['heavy modules at import'] = loaded
+    results['target s'] = STARTUP_TARGET
+    results['under target'] = not loaded and results['import models s'] <= STARTUP_TARGET and results['cli --help s'] <= STARTUP_TARGET
+    return results
+
+
+def TimeSeries(hours=8760, incremental_steps=200):
+    # a year of hourly ambient temperatures and loads through timeseries.Simulate;
+    # peak memory for one and for ten years shows it does not grow with length
+    import tracemalloc
+    import plant
+    import timeseries
+
+    def Year(years=1):
+        hour = np.arange(hours * years)
+        return timeseries.Hourly(T_atm=10 + 8 * np.sin(2 * np.pi * hour / 8760) + 5 * np.sin(2 * np.pi * hour / 24),
+                                 load=0.8 + 0.2 * np.sin(2 * np.pi * hour / 24 + 1))
+
+    results = {'steps': hours}
+    start = time.perf_counter()
+    net_work = sum(step['net_work'] for step in timeseries.Simulate(Year()))
+    results['year s'] = time.perf_counter() - start
+    results['mean net work kW'] = net_work / hours
+    for years in (1, 10):
+        tracemalloc.start()
+        for step in timeseries.Simulate(Year(years)):
+            pass
+        results['peak MB, ' + str(years) + ' year'] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+    start = time.perf_counter()
+    for step in timeseries.Simulate(itertools.islice(Year(), incremental_steps), incremental=True):
+        pass
+    results['incremental us/step'] = (time.perf_counter() - start) / incremental_steps * 1e6
+    start = time.perf_counter()
+    for condition in itertools.islice(Year(), incremental_steps):
+        plant.EvaluatePlant(timeseries.Inputs(condition, plant.DEFAULTS))
+    results['EvaluatePlant per step us'] = (time.perf_counter() - start) / incremental_steps * 1e6
+    return results
+
+
+
+def HeatBalance(n=1000, scalar_cases=10, seed=0):
+    # evaporator pinch solve over a random sweep, all cases in one SolveBatch,
+    # against scipy's fsolve case by case on the scalar plant
+    from scipy import optimize
+    import heat_balance
+    import plant
+
+    rng = np.random.default_rng(seed)
+    inputs = {'hp': rng.uniform(140, 165, n), 'P_r': rng.uniform(15, 25, n), 'T_atm': rng.uniform(-5, 30, n)}
+    results = {'cases': n}
+    start = time.perf_counter()
+    solved = heat_balance.SolveBatch(inputs, pinch=10)
+    results['batch us/case'] = (time.perf_counter() - start) / n * 1e6
+    results['iterations'] = solved['iterations']
+    results['converged'] = int(np.count_nonzero(solved['converged']))
+    results['max residual K'] = float(solved['residual'].max())
+
+    def Pinches(flows, values):
+        gasTurbine, steamCycle, hrsg = plant.Plant(dict(values, **dict(zip(heat_balance.UNKNOWNS, flows))), gas_properties=False)
+        exchangers = {exchanger.name: exchanger for exchanger in hrsg.exchangers}
+        return [exchangers[name].t['hot out'] - exchangers[name].t['cold in'] - 10 for name in heat_balance.EVAPORATORS]
+
+    start = time.perf_counter()
+    difference = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for case in range(scalar_cases):
+            values = {name: float(value[case]) for name, value in inputs.items()}
+            values['fluegas_massflow'] = plant.DEFAULTS['fuel_in'] * (1 + plant.DEFAULTS['AF'])
+            flows = optimize.fsolve(Pinches, [plant.DEFAULTS[name] for name in heat_balance.UNKNOWNS], args=(values,))
+            difference = max(difference, np.max(np.abs(flows - [solved['inputs'][name][case] for name in heat_balance.UNKNOWNS])))
+    results['fsolve us/case'] = (time.perf_counter() - start) / scalar_cases * 1e6
+    results['max flow difference kg/s'] = float(difference)
+    results['speedup'] = results['fsolve us/case'] / results['batch us/case']
+    return results
+
+
+def Service(n=2000, unique=500, workers=1, seed=0):
+    # service.py in its own process on a Unix socket: the first request (pool
+    # start and warm up), n pipelined requests over `unique` configurations,
+    # and the same again from the cache, against one cli.py process per case
+    import subprocess
+    import tempfile
+    import service
+
+    rng = np.random.default_rng(seed)
+    configurations = [{'hp': hp, 'P_r': P_r} for hp, P_r in zip(rng.uniform(140, 165, unique), rng.uniform(15, 25, unique))]
+    requests = [configurations[i] for i in rng.integers(0, unique, n)]
+    results = {'requests': n, 'unique': unique}
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'hrsg.sock')
+        server = subprocess.Popen([sys.executable, 'service.py', '--socket', path, '--workers', str(workers), '--quiet'])
+        try:
+            start = time.perf_counter()
+            while not os.path.exists(path):
+                time.sleep(0.01)
+            with service.Client(path) as client:
+                client.Evaluate()
+                results['first request s'] = time.perf_counter() - start
+                start = time.perf_counter()
+                client.EvaluateMany(requests)
+                results['pipelined us/request'] = (time.perf_counter() - start) / n * 1e6
+                start = time.perf_counter()
+                client.EvaluateMany(requests)
+                results['cached us/request'] = (time.perf_counter() - start) / n * 1e6
+                results['stats'] = client.Stats()
+        finally:
+            server.terminate()
+            server.wait()
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'cli.py', '--quiet', '--hp', '150'], check=True)
+        results['cli.py process per case s'] = time.perf_counter() - start
+    return results
+
+
+def DiskCache(n=200, seed=0):
+    # sweep of gas turbine inputs over a few steam cycles, uncached, through an
+    # empty disk cache and again from the filled one
+    import tempfile
+    import disk_cache
+    import sweep
+
+    rng = np.random.default_rng(seed)
+    names = ('P_r', 'T_atm', 'hp')
+    rows = np.stack([rng.uniform(15, 25, n), rng.uniform(-5, 30, n), rng.choice([140, 150, 160, 165], n)], axis=1)
+    results = {'cases': n}
+    start = time.perf_counter()
+    plain = sweep.Sweep((names, rows), workers=1)
+    results['uncached ms/case'] = (time.perf_counter() - start) / n * 1e3
+    with tempfile.TemporaryDirectory() as folder:
+        cache = disk_cache.DiskCache(folder)
+        for label in ('cold', 'warm'):
+            start = time.perf_counter()
+            table = sweep.Sweep((names, rows), workers=1, cache=cache)
+            results[label + ' ms/case'] = (time.perf_counter() - start) / n * 1e3
+            results[label + ' hit rate'] = {component: stats['hit_rate'] for component, stats in cache.Stats().items() if component != 'evicted'}
+            cache.ResetStats()
+        results['max difference kW'] = float(np.max(np.abs(table['net_work'] - plain['net_work'])))
+        results['cache KB'] = cache.Size() / 1e3
+    return results
+
+
+def Plots(n=1000, per_figure=100, naive_cases=10):
+    # pinch and cycle plots of a sweep: plot data without matplotlib, overlay and
+    # small multiple figures, against one PlotPinchgraph figure per case
+    import tempfile
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    import plant
+    import plots
+
+    inputs = {'hp': np.linspace(140, 165, n), 'P_r': np.linspace(15, 25, n)}
+    results = {'cases': n}
+    objects = plant.PlantBatch(inputs, segments=4, gas_properties=True)
+    start = time.perf_counter()
+    data = plots.PlotData(*objects)
+    results['data only us/case'] = (time.perf_counter() - start) / n * 1e6
+    with tempfile.TemporaryDirectory() as folder:
+        plots.Render('pinch', plots.Select(data['pinch'], slice(0, 1)), os.path.join(folder, 'warm.png'))
+        for layout in ('overlay', 'grid'):
+            start = time.perf_counter()
+            plots.Render('pinch', plots.Select(data['pinch'], slice(0, per_figure)), os.path.join(folder, layout + '.png'), layout)
+            results['pinch ' + layout + ' ms/case'] = (time.perf_counter() - start) / per_figure * 1e3
+        start = time.perf_counter()
+        files = plots.SavePlots(inputs, folder, per_figure=per_figure, segments=4)
+        results['SavePlots figures'] = len(files)
+        results['SavePlots ms/case, all kinds'] = (time.perf_counter() - start) / n * 1e3
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for case in range(naive_cases):
+                gasTurbine, steamCycle, hrsg = plant.Plant({name: value[case] for name, value in inputs.items()}, segments=4)
+                figure, axes = plt.subplots(1, 1)
+                hrsg.PlotPinchgraph(axes, difference_threshold=50)
+                figure.savefig(os.path.join(folder, 'naive.png'))
+                plt.close(figure)
+        results['PlotPinchgraph ms/case'] = (time.perf_counter() - start) / naive_cases * 1e3
+    return results
+
+
+def Uncertainty(n=100000, repeats=10, small=1000):
+    # Monte Carlo over uncertainty.EXAMPLE: time and peak memory of n streamed
+    # samples, its quantiles against those of every sample held at once, and
+    # the spread of the mean net work over seeds for Latin hypercube and plain
+    # random sampling of `small` samples
+    import tracemalloc
+    import plant
+    import uncertainty
+
+    results = {'samples': n}
+    tracemalloc.start()
+    start = time.perf_counter()
+    streamed = uncertainty.Propagate(n=n, seed=1)
+    results['streamed s'] = time.perf_counter() - start
+    results['streamed peak MB'] = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    results['failed'] = streamed.failed
+
+    samples = uncertainty.Sample(uncertainty.EXAMPLE, n, np.random.default_rng(1), 'random')
+    net_work = plant.EvaluatePlantBatch(samples)['net_work']
+    quantiles = np.array(uncertainty.QUANTILES)
+    held = uncertainty.Statistics()
+    held.Add(net_work)
+    results['quantile error, std'] = float(np.max(np.abs(held.Quantile(quantiles) - np.quantile(net_work, quantiles))) / np.std(net_work))
+    results['mean vs held, std'] = abs(streamed.statistics['net_work']['mean'] - net_work.mean()) / np.std(net_work)
+    for method in ('lhs', 'random'):
+        means = [uncertainty.Propagate(n=small, batch=small, method=method, seed=seed).statistics['net_work']['mean'] for seed in range(repeats)]
+        results[method + ' spread of mean kW'] = float(np.std(means))
+    return results
+
+
+def Sensitivity():
+    # full Jacobian of plant.RESULTS over every input, against one
+    # EvaluatePlant per perturbed case, and one plant evaluation for scale
+    import plant
+    import sensitivity
+
+    sensitivity.Jacobian()
+    plant.EvaluatePlant()
+    results = {'inputs': len(plant.INPUTS)}
+    start = time.perf_counter()
+    result = sensitivity.Jacobian()
+    results['Jacobian ms'] = (time.perf_counter() - start) * 1e3
+    start = time.perf_counter()
+    plant.EvaluatePlant()
+    results['EvaluatePlant ms'] = (time.perf_counter() - start) * 1e3
+    start = time.perf_counter()
+    brute = np.empty_like(result.jacobian)
+    for column, name in enumerate(result.wrt):
+        step = result.steps[name]
+        up = plant.EvaluatePlant({name: result.inputs[name] + step})
+        down = plant.EvaluatePlant({name: result.inputs[name] - step})
+        brute[:, column] = [(up[output] - down[output]) / (2 * step) for output in result.outputs]
+    results['one case at a time ms'] = (time.perf_counter() - start) * 1e3
+    scale = np.maximum(np.abs(brute), 1e-6 * np.max(np.abs(brute), axis=1, keepdims=True))
+    results['max relative difference'] = float(np.max(np.abs(result.jacobian - brute) / scale))
+    return results
+
+def CycleGraph(n=100000):
+    # THREE_PRESSURE_REHEAT against SteamCycleBatch on the same random cases
+    # (P[6] is left out, SteamCycleBatch never sets it), and the 2 pressure graph
+    import cycle_graph
+
+    inputs = dict(zip(('hp', 'ip', 'lp', 'm1', 'm2', 'm3', 'ma', 'steam_high_temp', 'water_low_temp'), RandomSteamInputs(n)))
+    start = time.perf_counter()
+    batch = steam.SteamCycleBatch(*inputs.values())
+    batch_time = time.perf_counter() - start
+    start = time.perf_counter()
+    cycle = cycle_graph.THREE_PRESSURE_REHEAT.Evaluate(inputs)
+    graph_time = time.perf_counter() - start
+    start = time.perf_counter()
+    cycle_graph.TWO_PRESSURE.Evaluate(inputs)
+    two_time = time.perf_counter() - start
+
+    worst = 0
+    for name in ('T', 'P', 'h', 's', 'efficiency'):
+        computed, reference = np.atleast_2d(getattr(cycle, name)), np.atleast_2d(getattr(batch, name))
+        if name == 'P':
+            computed, reference = np.delete(computed, 6, axis=0), np.delete(reference, 6, axis=0)
+        error = np.abs(computed[-15:] - reference[-15:]) / np.maximum(np.abs(reference[-15:]), 1e-12)
+        worst = max(worst, error.max())
+    return {
+        'cases': n,
+        'dependency levels': len(cycle_graph.THREE_PRESSURE_REHEAT.levels),
+        'graph us/case': graph_time / n * 1e6,
+        'SteamCycleBatch us/case': batch_time / n * 1e6,
+        '2 pressure graph us/case': two_time / n * 1e6,
+        'max relative difference': worst,
+    }
+
+def Arrangement():
+    # branch and bound over the design HRSG's exchanger orders against
+    # scoring all 9! orders at once with numpy
+    import itertools
+    import arrangement
+    import plant
+
+    hrsg = plant.Plant(segments=20)[2]
+    stats = {}
+    start = time.perf_counter()
+    best = arrangement.Search(hrsg, count=5, stats=stats)
+    search_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    names, duty, offset, capacity = arrangement.Exchangers(hrsg)
+    orders = np.array(list(itertools.permutations(range(len(names)))))
+    gas = hrsg.inlet_temp - np.concatenate([np.zeros((len(orders), 1)), np.cumsum(duty[orders], axis=1)[:, :-1]], axis=1) / capacity
+    ranked = sorted(map(tuple, np.sort(gas + offset[orders], axis=1).tolist()), reverse=True)[:len(best)]
+    exhaustive_time = time.perf_counter() - start
+    return {
+        'orders': stats['orders'],
+        'prefixes visited': stats['prefixes visited'],
+        'search ms': search_time * 1e3,
+        'exhaustive ms': exhaustive_time * 1e3,
+        'best min approach K': best[0].min_approach,
+        'design order min approach K': hrsg.min_approach,
+        'same as exhaustive': all(np.allclose(sorted(found.approaches), expected) for found, expected in zip(best, ranked)),
+        'random sets same as exhaustive': ArrangementCheck(),
+    }
+
+
+def ArrangementCheck(trials=50, seed=0):
+    # Search against arrangement.Exhaustive on random sets of 3 to 6
+    # exchangers, count 1, 3 and 5: the number of sets where they differ
+    import types
+    import arrangement
+
+    rng = np.random.default_rng(seed)
+    failures = 0
+    for n in range(3, 7):
+        for trial in range(trials):
+            exchangers = []
+            for index in range(n):
+                duty = rng.uniform(1e3, 5e4)
+                exchangers.append(types.SimpleNamespace(name=str(index), Q=duty, m={'hot': 100.0}, cp={'hot': 1.0},
+                                                        profile={'heat': np.linspace(0, duty, 4), 't cold': np.sort(rng.uniform(300, 700, 4))}))
+            hrsg = types.SimpleNamespace(exchangers=exchangers, inlet_temp=900.0, calculated=True)
+            for count in (1, 3, 5):
+                found = [tuple(sorted(best.approaches)) for best in arrangement.Search(hrsg, count=count)]
+                failures += found != arrangement.Exhaustive(hrsg, count)
+    return failures == 0
+
+
+def BatchInput(n=100000, chunks=(1000, 10000)):
+    # a CSV of n operating points with units in the header, evaluated at each
+    # chunk size: rows per second and peak memory, which follows the chunk
+    import tempfile
+    import tracemalloc
+    import batch_input
+
+    rng = np.random.default_rng(1)
+    columns = np.stack([rng.uniform(0, 30, n) + 273.15, rng.uniform(0.7, 1, n), rng.uniform(14, 16.5, n), rng.uniform(108, 144, n)], axis=1)
+    results = {'rows': n}
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'points.csv')
+        np.savetxt(filename, columns, delimiter=',', fmt='%.10g', header='T_atm [K],load,hp [MPa],ma [t/h]', comments='')
+        start = time.perf_counter()
+        for chunk in batch_input.Chunks(filename, chunks[-1]):
+            pass
+        results['read and convert rows/s'] = n / (time.perf_counter() - start)
+        for chunk in chunks:
+            counts = batch_input.Evaluate(filename, os.path.join(folder, 'results'), chunk=chunk)
+            results['chunk ' + str(chunk) + ' rows/s'] = counts['rows per second']
+            tracemalloc.start()  # slows the writing down, so timed apart
+            batch_input.Evaluate(filename, os.path.join(folder, 'results'), chunk=chunk)
+            results['chunk ' + str(chunk) + ' peak MB'] = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+    return results
+
+def Backends(points=2000, plant_cases=200):
+    # each backend against iapws over backends.ENVELOPE and random plant cases:
+    # largest differences (absolute for properties, relative for plant
+    # results) and time per call
+    import backends
+
+    results = {}
+    for name in backends.BACKENDS[1:]:
+        comparison = backends.Compare('iapws', name, points=points, plant_cases=plant_cases)
+        for key, value in comparison['seconds'].items():
+            results[name + ' ' + key + ' us'] = [round(1e6 * seconds, 3) for seconds in value]
+        properties = comparison['properties']
+        results[name + ' steam property max abs diff'] = max(value for key, value in properties.items() if not key.startswith('air'))
+        results[name + ' air h max abs diff'] = properties['air h']
+        results[name + ' plant max rel diff'] = max(comparison['plant'].values())
+    chosen = backends.Choose(budget=1e-4)
+    results['fastest within 1e-4'] = chosen[0] if chosen else None
+    return results
+
+def FlueGas(n=1000, seed=0):
+    # the gas turbine on the flue_gas tables: scalar and batch cost against the
+    # constant cp model with CoolProp h and s, and how far each model's works
+    # are from its own enthalpies (heat in against m_t h3 - m_air h2, and the
+    # HRSG duty against the flue gas enthalpy drop)
+    import CoolProp.CoolProp as CP
+    import flue_gas
+    import gas_turbine as gt
+    import plant
+
+    rng = np.random.default_rng(seed)
+    AF = rng.uniform(35, 70, n)
+    P_r = rng.uniform(10, 30, n)
+    results = {}
+    for model in flue_gas.MODELS:
+        gt.AirProperties.cache_clear()
+        gt.GasTurbine(14.2, 50, 50000, 20.1, 0.85, 0.85, model=model)
+        start = time.perf_counter()
+        for i in range(100):
+            gt.GasTurbine(14.2, AF[i], 50000, P_r[i], 0.85, 0.85, model=model)
+        scalar = (time.perf_counter() - start) / 100
+        start = time.perf_counter()
+        batch = gt.GasTurbineBatch(14.2, AF, 50000, P_r, 0.85, 0.85, model=model)
+        seconds = time.perf_counter() - start
+        results[model + ' GasTurbine ms'] = round(1e3 * scalar, 4)
+        results[model + ' GasTurbineBatch ' + str(n) + ' ms'] = round(1e3 * seconds, 4)
+        results[model + ' batch / scalar'] = round(seconds / scalar, 2)
+        balance = batch.work['heat in'] - (batch.m_t * batch.h[3] - batch.m_air * batch.h[2])
+        results[model + ' gas turbine balance rel error'] = float(np.max(np.abs(balance) / batch.work['heat in']))
+
+    flue_gas.Use('tables')
+    try:
+        gasTurbine, steamCycle, hrsg = plant.Plant(segments=5)
+    finally:
+        flue_gas.Use(flue_gas.DEFAULT)
+    gas = flue_gas.FlueGas(plant.DEFAULTS['AF'])
+    drop = plant.DEFAULTS['fluegas_massflow'] * (gas.Enthalpy(hrsg.inlet_temp) - gas.Enthalpy(hrsg.outlet_temp))
+    results['tables hrsg balance rel error'] = float(abs(hrsg.heatDuty - drop) / hrsg.heatDuty)
+    T = np.linspace(300, 1500, 25)
+    reference = np.array([CP.PropsSI('H', 'T', t, 'P', 1e5, 'Air') for t in T]) / 1000
+    air = flue_gas.FlueGas().Enthalpy(T)
+    results['air h against CoolProp HEOS max kJ/kg'] = float(np.max(np.abs((air - air[0]) - (reference - reference[0]))))
+    return results
+
+# Regression suite: python benchmarks.py --record | --check [--threshold X]
+#
+# Times the core entry points at single case and batch scale (best of
+# REPEATS), records the peak memory each allocates, and compares every path's
+# numbers at the main.py design point with the CSVs in reference/ (copies of
+# the shipped steam_data.csv, work_data.csv, gas_turbine.csv,
+# gas_turbine_works.csv and hrsg.csv, which main.py overwrites). --record
+# saves the timings and memory to BASELINE; --check fails (exit status 1) if a
+# timing or peak memory is more than `threshold` times its baseline, or if any
+# path differs from the references by more than ACCURACY_RTOL, or if the cold
+# start (Startup) is over STARTUP_TARGET or pulls in HEAVY_MODULES.
+
+BASELINE = 'benchmarks_baseline.json'
+REFERENCE = 'reference'
+ACCURACY_RTOL = 1e-9
+THRESHOLD = 1.5
+REPEATS = 5
+MEMORY_SLACK = 64 * 1024  # bytes of peak memory allowed over the threshold
+
+
+def SuiteCases(n=1000):
+    # name -> function to time, prepared once
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+    import gas_turbine as gt
+    import instrument
+    import plant
+
+    design = plant.DEFAULTS
+    steam_inputs = [design[name] for name in ('hp', 'ip', 'lp', 'm1', 'm2', 'm3', 'ma', 'steam_high_temp', 'water_low_temp')]
+    turbine_inputs = [design[name] for name in ('fuel_in', 'AF', 'LHV', 'P_r', 'n_t', 'n_c')]
+    batch_inputs = dict(zip(('hp', 'ip', 'lp', 'm1', 'm2', 'm3', 'ma', 'steam_high_temp', 'water_low_temp'), RandomSteamInputs(n)))
+    P_r = np.random.default_rng(1).uniform(12, 25, n)
+
+    gasTurbine, steamCycle, hrsg = plant.Plant()
+    segmented = plant.Plant(segments=50)[2]
+    batch = plant.PlantBatch(batch_inputs)[2]
+    figure, axes = plt.subplots(1, 1)
+
+    def Quiet(function):
+        def Run():
+            with instrument.Quiet():
+                function()
+        return Run
+
+    def Plot():
+        axes.clear()
+        hrsg.PlotPinchgraph(axes, title="pinch plot", difference_threshold=50)
+        figure.canvas.draw()
+
+    return {
+        'SteamCycle': Quiet(lambda: steam.SteamCycle(*steam_inputs)),
+        'SteamCycleBatch ' + str(n): lambda: steam.SteamCycleBatch(*RandomSteamInputs(n)),
+        'GasTurbine': lambda: (gt.AirProperties.cache_clear(), gt.GasTurbine(*turbine_inputs)),
+        'GasTurbineBatch ' + str(n): lambda: (gt.AirProperties.cache_clear(), gt.GasTurbineBatch(*turbine_inputs[:3], P_r, *turbine_inputs[4:])),
+        'HRSG.Calculate': hrsg.Calculate,
+        'HRSG.Calculate segments=50': segmented.Calculate,
+        'HRSGBatch.Calculate ' + str(n): batch.Calculate,
+        'PlotPinchgraph': Plot,
+        'EvaluatePlant': plant.EvaluatePlant,
+        'EvaluatePlantBatch ' + str(n): lambda: plant.EvaluatePlantBatch(batch_inputs),
+    }
+
+
+def Suite(repeats=REPEATS):
+    # seconds (best of repeats) and peak allocated bytes of each SuiteCases entry
+    import tracemalloc
+
+    results = {}
+    for name, function in SuiteCases().items():
+        function()  # warm up imports and caches
+        times = []
+        for repeat in range(repeats):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {'seconds': min(times), 'peak bytes': peak}
+    return results
+
+
+def Accuracy(reference=REFERENCE):
+    # largest relative difference of each path from each reference file at the
+    # main.py design point
+    import plant
+    import plant_model
+
+    rows = {}
+    for name in ('steam_data', 'work_data', 'gas_turbine', 'gas_turbine_works', 'hrsg'):
+        with open(os.path.join(reference, name + '.csv')) as f:
+            rows[name] = [line.split(',') for line in f.read().splitlines() if line]
+    expected = {
+        'steam_data': np.array(rows['steam_data'], dtype=float),
+        'work_data': {row[0]: float(row[1]) for row in rows['work_data'] if len(row) == 2 and row[0] != 'Work Type'},
+        'gas_turbine': np.array(rows['gas_turbine'][1:], dtype=float),
+        'gas_turbine_works': {row[0]: float(row[1]) for row in rows['gas_turbine_works']},
+        'hrsg': {row[0]: np.array(row[1:], dtype=float) for row in rows['hrsg'][1:]},
+    }
+
+    model = plant_model.PlantModel()
+    model.Calculate()
+    paths = {
+        'scalar': plant.Plant(),
+        'batch': plant.PlantBatch(),
+        'plant_model': (model.gasTurbine, model.steamCycle, model.hrsg),
+    }
+    results = {}
+    for path, objects in paths.items():
+        for name, (computed, reference_values) in _Outputs(*objects, expected).items():
+            results[path + ' ' + name] = _RelativeError(computed, reference_values)
+    return results
+
+
+def _Outputs(gasTurbine, steamCycle, hrsg, expected):
+    # (computed, expected) arrays for each reference file; batch objects are
+    # read at their first case
+    batch = isinstance(steamCycle, steam.SteamCycleBatch)
+
+    def Value(value):
+        value = np.asarray(value, dtype=float)
+        return value[..., 0] if batch and value.ndim else value
+
+    works = dict(steamCycle.total_works, **steamCycle.massflows)
+    turbine_works = dict(gasTurbine.work, Efficiency=gasTurbine.efficiency)
+    exchangers = {exchanger.name: exchanger for exchanger in hrsg.exchangers}
+    return {
+        'steam_data.csv': (np.stack([Value(getattr(steamCycle, name)) for name in ('T', 'P', 'h', 's')], axis=1), expected['steam_data']),
+        'work_data.csv': (np.array([Value(works[name]) for name in expected['work_data']]), np.array(list(expected['work_data'].values()))),
+        'gas_turbine.csv': (np.stack([Value(getattr(gasTurbine, name))[1:] for name in ('T', 'P', 's')], axis=1), expected['gas_turbine']),
+        'gas_turbine_works.csv': (np.array([Value(turbine_works[name]) for name in expected['gas_turbine_works']]),
+                                  np.array(list(expected['gas_turbine_works'].values()))),
+        'hrsg.csv': (np.array([[Value(exchangers[name].t['hot in']), Value(exchangers[name].t['hot out']), Value(exchangers[name].t['cold in']),
+                                Value(exchangers[name].t['cold out']), Value(exchangers[name].m['cold']), Value(exchangers[name].Q)]
+                               for name in expected['hrsg']]), np.array(list(expected['hrsg'].values()))),
+    }
+
+
+def _RelativeError(computed, expected):
+    computed = np.asarray(computed, dtype=float)
+    expected = np.asarray(expected, dtype=float)
+    error = np.where(expected == 0, np.abs(computed), np.abs(computed - expected) / np.where(expected == 0, 1, np.abs(expected)))
+    return float(error.max())
+
+
+def Record(filename=BASELINE):
+    # run the suite and save it as the baseline
+    import platform
+    baseline = {
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform()},
+        'suite': Suite(),
+    }
+    with open(filename, 'w') as f:
+        json.dump(baseline, f, indent=1)
+    return baseline
+
+
+def Check(threshold=THRESHOLD, filename=BASELINE):
+    # compare with the baseline and the references; returns the failures
+    failures = []
+    for name, error in Accuracy().items():
+        ok = error <= ACCURACY_RTOL
+        print("\t" + name + ": relative error " + str(error) + ("" if ok else " FAILED"))
+        if not ok:
+            failures.append(name)
+
+    startup = Startup()
+    print("\tcold start: import " + str(round(startup['import models s'], 3)) + " s, cli --help " + str(round(startup['cli --help s'], 3)) +
+          " s (target " + str(STARTUP_TARGET) + " s)" + ("" if startup['under target'] else " FAILED"))
+    if not startup['under target']:
+        failures.append("startup")
+
+    baseline = {}
+    if os.path.exists(filename):
+        with open(filename) as f:
+            baseline = json.load(f)['suite']
+    else:
+        print("\tno " + filename + ", timings are not compared (run --record first)")
+    for name, result in Suite().items():
+        line = "\t" + name + ": " + str(round(result['seconds'] * 1e3, 4)) + " ms, peak " + str(round(result['peak bytes'] / 1024, 1)) + " kB"
+        if name in baseline:
+            slower = result['seconds'] / baseline[name]['seconds']
+            line += " (" + str(round(slower, 2)) + "x baseline time)"
+            if slower > threshold:
+                failures.append(name + " time")
+                line += " SLOWER"
+            if result['peak bytes'] > threshold * baseline[name]['peak bytes'] + MEMORY_SLACK:
+                failures.append(name + " memory")
+                line += " MORE MEMORY"
+        print(line)
+    return failures
+
+
+BENCHMARKS = {
+    'steam_cycle_batch': SteamCycleBatch,
+    'property_tables': PropertyTables,
+    'gas_turbine': GasTurbine,
+    'inverse_properties': InverseProperties,
+    'sweep': Sweep,
+    'optimise': Optimise,
+    'pinch': Pinch,
+    'plant_model': PlantModel,
+    'states': States,
+    'result_store': ResultStore,
+    'instrument': Instrument,
+    'startup': Startup,
+    'timeseries': TimeSeries,
+    'heat_balance': HeatBalance,
+    'service': Service,
+    'disk_cache': DiskCache,
+    'plots': Plots,
+    'uncertainty': Uncertainty,
+    'sensitivity': Sensitivity,
+    'cycle_graph': CycleGraph,
+    'arrangement': Arrangement,
+    'batch_input': BatchInput,
+    'backends': Backends,
+    'flue_gas': FlueGas,
+}
+
+
+def Parser():
+    parser = argparse.ArgumentParser(description="Timing and accuracy checks of the models")
+    parser.add_argument('names', nargs='*', metavar='name', help="benchmarks to run, default all: " + ", ".join(BENCHMARKS))
+    parser.add_argument('--record', action='store_true', help="run the regression suite and save it as the baseline (" + BASELINE + ")")
+    parser.add_argument('--check', action='store_true', help="compare the suite with the baseline and the reference outputs, exit 1 on failure")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="slowdown and memory factor --check allows")
+    return parser
+
+
+if __name__ == '__main__':
+    parser = Parser()
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error("unknown benchmark " + ", ".join(unknown) + ", expected one of " + ", ".join(BENCHMARKS))
+    if args.record:
+        for name, result in Record()['suite'].items():
+            print(name + ": " + str(result))
+        sys.exit()
+    if args.check:
+        failures = Check(args.threshold)
+        print("FAILED: " + ", ".join(failures) if failures else "passed")
+        sys.exit(1 if failures else 0)
+    for name in args.names or list(BENCHMARKS):
+        print(name)
+        for key, value in BENCHMARKS[name]().items():
+            print("\t" + key + ": " + str(value))
@@ -0,0 +1,199 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+import backends
+import flue_gas
+import instrument
+import plant
+
+# Headless command line for the combined cycle, for batch jobs without a display.
+#
+#     python cli.py                                    design point, results as JSON
+#     python cli.py --config plant.json --hp 150 --output runs/a
+#     python cli.py --output runs/a --plot             also pinch and T-s/h-s PNGs
+#     python cli.py --sweep hp=140:165:6 --sweep P_r=15:25:3 --output runs/b
+#     python cli.py --sweep hp=140:165:1000 --plot     plots of 100 cases a figure (plots)
+#     python cli.py --series year.csv --output runs/c  one row per step (timeseries)
+#     python cli.py --sensitivity --output runs/d      Jacobian and indices (sensitivity)
+#     python cli.py --batch points.csv --output runs/e operating point files in chunks (batch_input)
+#     python cli.py --backend coolprop                 another property backend (backends)
+#     python cli.py --gas-model tables                 temperature dependent gas properties (flue_gas)
+#
+# Inputs are plant.DEFAULTS, replaced by the --config JSON file ({"hp": 150,
+# ...}) and then by flags, one per plant input (--hp 150 --T_atm 15 ...).
+# --output DIR writes results.json and main.py's CSV files (steam_data,
+# work_data, gas_turbine, gas_turbine_works, hrsg), or for a sweep sweep.csv
+# and, with --store, a result_store directory. --plot on a sweep saves every
+# case's plots with plots.SavePlots, overlaid a figure at a time, in DIR/plots.
+#
+# Imports are kept to what the run needs: iapws and CoolProp load on their
+# first property call, and CoolProp not at all unless the gas turbine h and s
+# are wanted (--output or --plot). matplotlib is only imported for --plot, with
+# the non-interactive Agg backend. `python benchmarks.py startup` times it.
+
+
+def Parser():
+    parser = argparse.ArgumentParser(description="Combined cycle plant model")
+    parser.add_argument('--config', help="JSON file of plant inputs")
+    for name in plant.INPUTS:
+        parser.add_argument('--' + name, type=float, help="default " + str(plant.DEFAULTS[name]))
+    parser.add_argument('--backend', choices=backends.BACKENDS, help="property backend, default $HRSG_BACKEND or " + backends.DEFAULT)
+    parser.add_argument('--gas-model', choices=flue_gas.MODELS, help="gas turbine and flue gas model, default $HRSG_GAS_MODEL or " + flue_gas.DEFAULT)
+    parser.add_argument('--segments', type=int, default=1, help="exchanger discretisation for the pinch")
+    parser.add_argument('--sweep', action='append', default=[], metavar='NAME=START:STOP:COUNT',
+                        help="sweep an input over COUNT evenly spaced values, repeat for a grid")
+    parser.add_argument('--workers', type=int, default=1, help="processes for a sweep")
+    parser.add_argument('--sensitivity', action='store_true', help="derivatives and normalised sensitivities of the results to every input")
+    parser.add_argument('--series', help="CSV of operating conditions, one step per row (input names and load as columns)")
+    parser.add_argument('--batch', help="CSV, .npy or .bin file of operating points, read in chunks (batch_input)")
+    parser.add_argument('--chunk', type=int, default=10000, help="rows per chunk for --batch")
+    parser.add_argument('--output', help="folder for the results files")
+    parser.add_argument('--store', action='store_true', help="also append a sweep to a result store in the output folder")
+    parser.add_argument('--plot', action='store_true', help="save the pinch, steam T-s and gas turbine h-s plots as PNG")
+    parser.add_argument('--quiet', action='store_true', help="print nothing")
+    parser.add_argument('--profile', action='store_true', help="save stage timings and property call counts (profile.json)")
+    return parser
+
+
+def Inputs(args, parser):
+    # plant inputs changed from DEFAULTS by the config file and flags
+    inputs = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+        unknown = [name for name in config if name not in plant.DEFAULTS]
+        if unknown:
+            parser.error("unknown inputs in " + args.config + ": " + ", ".join(unknown))
+        inputs.update(config)
+    for name in plant.INPUTS:
+        if getattr(args, name) is not None:
+            inputs[name] = getattr(args, name)
+    return inputs
+
+
+def Axes(args, parser):
+    # --sweep NAME=START:STOP:COUNT arguments as {name: values}
+    axes = {}
+    for text in args.sweep:
+        try:
+            name, limits = text.split('=')
+            start, stop, count = limits.split(':')
+            axes[name] = np.linspace(float(start), float(stop), int(count))
+        except ValueError:
+            parser.error("--sweep expects NAME=START:STOP:COUNT, got " + text)
+        if name not in plant.DEFAULTS:
+            parser.error("unknown input " + name)
+    return axes
+
+
+def Run(inputs, args):
+    # one case; returns its results
+    output = args.output or '.'
+    with instrument.Stage('plant'):
+        gasTurbine, steamCycle, hrsg = plant.Plant(inputs, segments=args.segments, gas_properties=bool(args.output or args.plot))
+    results = plant.Results(gasTurbine, steamCycle, hrsg)
+    if args.output:
+        with instrument.Stage('saving'):
+            values = dict(plant.DEFAULTS, **inputs)
+            with open(os.path.join(output, 'results.json'), 'w') as f:
+                json.dump({'inputs': values, 'results': results}, f, indent=1)
+            steamCycle.SaveResults(os.path.join(output, 'steam_data'), os.path.join(output, 'work_data'))
+            gasTurbine.SaveResults(os.path.join(output, 'gas_turbine'))
+            hrsg.SaveResults(os.path.join(output, 'hrsg'))
+    if args.plot:
+        with instrument.Stage('plotting'):
+            Plot(gasTurbine, steamCycle, hrsg, output)
+    return results
+
+
+def Plot(gasTurbine, steamCycle, hrsg, output):
+    # main.py's three figures as PNG files
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+
+    for filename, draw in (('pinch', lambda axes: hrsg.PlotPinchgraph(axes, title="Heat Consumption versus Temperature diagram for the HRSG",
+                                                                       difference_threshold=50)),
+                           ('steam_ts', lambda axes: steamCycle.PlotResults(axes, type='ts', annotated=True, lines=True, linestyle="solid")),
+                           ('gas_turbine_hs', lambda axes: gasTurbine.PlotResults(axes, type='hs'))):
+        figure, axes = plt.subplots(1, 1)
+        draw(axes)
+        figure.savefig(os.path.join(output, filename + '.png'))
+        plt.close(figure)
+
+
+def RunSweep(inputs, axes, args):
+    # a grid of cases; returns the sweep.SweepTable
+    import sweep
+
+    grid = dict(axes)
+    grid.update({name: [value] for name, value in inputs.items() if name not in axes})
+    store = None
+    if args.store:
+        import result_store
+        store = result_store.ResultStore(os.path.join(args.output or '.', 'store'))
+    names, rows = sweep.Grid(**grid)
+    with instrument.Stage('sweep'):
+        table = sweep.Sweep((names, rows), workers=args.workers, segments=args.segments, store=store)
+    if args.output:
+        table.SaveResults(os.path.join(args.output, 'sweep'))
+    if args.plot:
+        import plots
+        with instrument.Stage('plotting'):
+            plots.SavePlots(dict(zip(names, rows.T)), os.path.join(args.output or '.', 'plots'), workers=args.workers, segments=args.segments)
+    return table
+
+
+def Main(argv=None):
+    parser = Parser()
+    args = parser.parse_args(argv)
+    instrument.quiet = args.quiet
+    instrument.Enable(args.profile)
+    if args.backend:
+        backends.Use(args.backend)
+    if args.gas_model:
+        flue_gas.Use(args.gas_model)
+    inputs = Inputs(args, parser)
+    axes = Axes(args, parser)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    if args.series:
+        import timeseries
+        with instrument.Stage('series'):
+            steps = timeseries.Simulate(timeseries.ReadConditions(args.series), base=inputs, segments=args.segments)
+            count = timeseries.SaveSteps(steps, os.path.join(args.output or '.', 'series'))
+        instrument.Print(str(count) + " steps saved to " + os.path.join(args.output or '.', 'series.csv'))
+    elif args.batch:
+        import batch_input
+        with instrument.Stage('batch input'):
+            counts = batch_input.Evaluate(args.batch, os.path.join(args.output or '.', 'batch'), chunk=args.chunk, base=inputs,
+                                          segments=args.segments)
+        instrument.Print(json.dumps(counts, indent=1))
+    elif args.sensitivity:
+        import sensitivity
+        with instrument.Stage('sensitivity'):
+            result = sensitivity.Jacobian(inputs, segments=args.segments)
+        report = {'inputs': result.inputs, 'results': result.base, 'derivatives': result.Derivatives(), 'indices': result.Indices()}
+        if args.output:
+            with open(os.path.join(args.output, 'sensitivity.json'), 'w') as f:
+                json.dump(report, f, indent=1)
+        instrument.Print(json.dumps(report['indices'], indent=1))
+    elif axes:
+        table = RunSweep(inputs, axes, args)
+        instrument.Print(str(len(table)) + " cases, " + str(np.count_nonzero(~np.isnan(table['net_work']))) + " evaluated" +
+                         (", saved to " + args.output if args.output else ""))
+    else:
+        instrument.Print(json.dumps(Run(inputs, args), indent=1))
+
+    if args.profile:
+        instrument.SaveProfile(os.path.join(args.output or '.', 'profile'))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(Main())
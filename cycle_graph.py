@@ -0,0 +1,370 @@
+import numpy as np
+
+import backends
+import flue_gas
+import gas_turbine as gt
+import hrsg as HRSG
+import instrument
+import plant
+
+# Steam cycles described as a graph of state points and components.
+#
+#     cycle = cycle_graph.THREE_PRESSURE_REHEAT.Evaluate(plant.DEFAULTS)     # like SteamCycleBatch
+#     cycle.efficiency, cycle.T[14], cycle.total_works['HP Turbine work']
+#     cycle_graph.EvaluatePlantBatch(cycle_graph.TWO_PRESSURE, {'hp': [80, 100]})
+#
+# A State says how its point is fixed, from inputs or from other states:
+#     condensate        saturated liquid at the `temperature` input, P = Psat
+#     saturated_liquid  x = 0 at `pressure`
+#     saturated_vapour  x = 1 at `pressure`
+#     quality           wet steam of the given quality at `pressure`
+#     temperature       superheated steam at the `temperature` input
+#     isentropic        the entropy of state `source` at `pressure`, water
+#                       (region 1, pumps) or steam (region 2, turbines)
+# pressure is an input name in bar or the number of the state whose pressure
+# it shares. Isentropic states work either way along a line: a pump outlet
+# from its inlet, or a turbine inlet chained back from its exhaust.
+#
+# A Component joins two states and carries a mass flow, a linear combination
+# of the flow inputs ({'m1': 1, 'ma': -1} is m1 - ma). Pumps and turbines give
+# '<name> work'; economisers, evaporators, superheaters and reheaters give
+# '<name> Heat Input' and make up q_in; 'mixing' terms (steam brought to the
+# state it joins, like IP Superheater 2) are reported but not part of q_in;
+# extractions only record their flow. `hrsg` lists the heat input components
+# in flue gas order, which BuildHRSG turns into exchangers.
+#
+# Evaluate() sorts the states into dependency levels. Every state of a level
+# goes through the property backend together, one call per kind: a single
+# Saturation for all drums and wet states, then one Backward1_T_Ps/Region1 and
+# one Backward2_T_Ps/Region2 over the level's water and steam states, so
+# independent branches (the three pumps, the three drums) are computed
+# together. Inputs are arrays broadcast against each other and T, P, h and s
+# come back as (states + 1, cases) arrays indexed by state number.
+
+STATE_KINDS = ('condensate', 'saturated_liquid', 'saturated_vapour', 'quality', 'temperature', 'isentropic')
+COMPONENT_KINDS = ('pump', 'turbine', 'economiser', 'evaporator', 'superheater', 'reheat', 'mixing', 'extraction')
+HEAT_INPUTS = ('economiser', 'evaporator', 'superheater', 'reheat')
+
+# HRSG exchanger type of each heat input kind
+EXCHANGER_TYPES = {'economiser': 'economiser', 'evaporator': 'evaporator', 'superheater': 'superheater', 'reheat': 'superheater'}
+
+
+class State:
+
+    def __init__(self, number, kind, pressure=None, temperature=None, quality=None, source=None, region=None):
+        if kind not in STATE_KINDS:
+            raise ValueError("Unknown state kind " + str(kind) + ", expected one of " + ", ".join(STATE_KINDS))
+        self.number = number
+        self.kind = kind
+        self.pressure = pressure  # input name (bar) or state number
+        self.temperature = temperature  # input name (C)
+        self.quality = quality
+        self.source = source  # state number of an isentropic state
+        self.region = region  # 1 or 2 for an isentropic state
+
+    def Depends(self):
+        # state numbers that must be evaluated first
+        depends = []
+        if isinstance(self.pressure, int):
+            depends.append(self.pressure)
+        if self.source is not None:
+            depends.append(self.source)
+        return depends
+
+
+class Component:
+
+    def __init__(self, name, kind, inlet, outlet=None, flow=None):
+        if kind not in COMPONENT_KINDS:
+            raise ValueError("Unknown component kind " + str(kind) + ", expected one of " + ", ".join(COMPONENT_KINDS))
+        self.name = name
+        self.kind = kind
+        self.inlet = inlet
+        self.outlet = outlet  # None for an extraction
+        self.flow = flow  # {flow input: coefficient}
+
+    def Key(self):
+        # its total_works entry, None for an extraction
+        if self.kind in ('pump', 'turbine'):
+            return self.name + " work"
+        if self.kind == 'extraction':
+            return None
+        return self.name + " Heat Input"
+
+
+class CycleGraph:
+
+    def __init__(self, name, states, components, hrsg=(), lines=(), labels=()):
+        self.name = name
+        self.states = {state.number: state for state in states}
+        self.components = tuple(components)
+        self.hrsg = tuple(hrsg)  # heat input component names, flue gas order
+        self.lines = lines  # state numbers of each pressure line, for plots.CycleData
+        self.labels = labels
+        self.levels = self.Levels()
+
+        names = {component.name: component for component in self.components}
+        unknown = [name for name in self.hrsg if name not in names or names[name].kind not in HEAT_INPUTS]
+        if unknown:
+            raise ValueError("HRSG exchangers must be heat input components: " + ", ".join(unknown))
+
+    def Levels(self):
+        # state numbers grouped by dependency level, level 0 needing only inputs
+        level = {}
+        visiting = set()
+
+        def Level(number):
+            if number in level:
+                return level[number]
+            if number not in self.states:
+                raise ValueError("State " + str(number) + " of " + self.name + " is not defined")
+            if number in visiting:
+                raise ValueError("State " + str(number) + " of " + self.name + " depends on itself")
+            visiting.add(number)
+            level[number] = 1 + max([Level(other) for other in self.states[number].Depends()], default=-1)
+            visiting.discard(number)
+            return level[number]
+
+        for number in self.states:
+            Level(number)
+        return [sorted(number for number in self.states if level[number] == depth) for depth in range(max(level.values()) + 1)]
+
+    def Inputs(self):
+        # input names the graph reads
+        names = []
+        for state in self.states.values():
+            names += [name for name in (state.pressure, state.temperature) if isinstance(name, str)]
+        for component in self.components:
+            names += list(component.flow or {})
+        return tuple(dict.fromkeys(names))
+
+    def Exchangers(self):
+        # (name, cold_in, cold_out, component, type) like plant.EXCHANGERS
+        components = {component.name: component for component in self.components}
+        return tuple((name, components[name].inlet, components[name].outlet, name, EXCHANGER_TYPES[components[name].kind])
+                     for name in self.hrsg)
+
+    def Evaluate(self, inputs=None, properties=None, **overrides):
+        # CycleBatch of the graph at inputs/overrides (arrays broadcast together)
+        values = dict(inputs or {})
+        values.update(overrides)
+        missing = [name for name in self.Inputs() if name not in values]
+        if missing:
+            raise ValueError("Missing inputs for " + self.name + ": " + ", ".join(missing))
+        return CycleBatch(self, {name: values[name] for name in self.Inputs()}, properties)
+
+
+class CycleBatch:
+    # a CycleGraph evaluated for arrays of operating points. T, P, h and s are
+    # (states + 1, N) arrays (row 0 unused), total_works, q_in, w_net and
+    # efficiency are as in SteamCycleBatch, and massflows holds every
+    # component's flow by name.
+
+    def __init__(self, graph, inputs, properties=None):
+        properties = instrument.Properties(*backends.Steam(properties))
+        names = tuple(inputs)
+        arrays = np.broadcast_arrays(*[np.asarray(inputs[name], dtype=float) for name in names])
+        self.graph = graph
+        self.inputs = {name: value.reshape(-1) for name, value in zip(names, arrays)}
+        self.n = arrays[0].size if arrays else 1
+
+        rows = max(graph.states) + 1
+        self.T = np.zeros((rows, self.n))
+        self.P = np.zeros((rows, self.n))
+        self.h = np.zeros((rows, self.n))
+        self.s = np.zeros((rows, self.n))
+        for level in graph.levels:
+            self._Level([graph.states[number] for number in level], properties)
+
+        self.massflows = {}
+        self.total_works = {}
+        for component in graph.components:
+            flow = sum(coefficient * self.inputs[name] for name, coefficient in component.flow.items())
+            self.massflows[component.name] = flow
+            if component.kind == 'extraction':
+                continue
+            change = self.h[component.outlet] - self.h[component.inlet]
+            self.total_works[component.Key()] = flow * (-change if component.kind == 'turbine' else change)
+
+        works = self.total_works
+        kinds = {component.Key(): component.kind for component in graph.components}
+        self.q_in = sum(value for key, value in works.items() if kinds[key] in HEAT_INPUTS)
+        self.w_net = sum(value for key, value in works.items() if kinds[key] == 'turbine') - \
+            sum(value for key, value in works.items() if kinds[key] == 'pump')
+        works['Net Work'] = self.w_net
+        self.efficiency = self.w_net / self.q_in
+        works['Efficiency'] = self.efficiency
+
+    def _Pressure(self, state):
+        if isinstance(state.pressure, int):
+            return self.P[state.pressure]
+        return self.inputs[state.pressure] / 10  # bar to MPa
+
+    def _Level(self, level, properties):
+        # every state of one dependency level, one property call per kind
+        T, P, h, s = self.T, self.P, self.h, self.s
+        for state in level:
+            if state.kind == 'condensate':
+                T[state.number] = gt.ToKelvin(self.inputs[state.temperature])
+                P[state.number] = properties.PSat_T(T[state.number])
+            else:
+                P[state.number] = self._Pressure(state)
+
+        # saturation: one call over the distinct pressures of the level
+        wet = [state for state in level if state.kind in ('saturated_liquid', 'saturated_vapour', 'quality')]
+        if wet:
+            keys = list(dict.fromkeys(state.pressure for state in wet))
+            liquid, vapour = properties.Saturation(np.stack([P[next(state.number for state in wet if state.pressure == key)] for key in keys]))
+            for state in wet:
+                row = keys.index(state.pressure)
+                x = {'saturated_liquid': 0, 'saturated_vapour': 1}.get(state.kind, state.quality)
+                T[state.number] = liquid['T'][row]
+                for name, values in (('h', h), ('s', s)):
+                    if x == 0:
+                        values[state.number] = liquid[name][row]
+                    elif x == 1:
+                        values[state.number] = vapour[name][row]
+                    else:
+                        values[state.number] = liquid[name][row] + x * (vapour[name][row] - liquid[name][row])
+
+        # water (region 1) and steam (region 2): backward T(P, s) for the
+        # isentropic states, then one forward call over all of them
+        for region, backward, forward in ((1, 'Backward1_T_Ps', 'Region1'), (2, 'Backward2_T_Ps', 'Region2')):
+            isentropic = [state.number for state in level if state.kind == 'isentropic' and state.region == region]
+            if isentropic:
+                T[isentropic] = getattr(properties, backward)(P[isentropic], s[[self.graph.states[number].source for number in isentropic]])
+            fixed = [state for state in level if state.kind == ('condensate' if region == 1 else 'temperature')]
+            for state in fixed:
+                if state.kind == 'temperature':
+                    T[state.number] = gt.ToKelvin(self.inputs[state.temperature])
+            numbers = [state.number for state in fixed] + isentropic
+            if numbers:
+                props = getattr(properties, forward)(T[numbers], P[numbers], derivatives=False)
+                h[numbers] = props['h']
+                s[numbers] = props['s']
+
+    def BuildHRSG(self, inlet_temp, fluegas_massflow, properties=None, segments=1, fluegas=None):
+        # HRSGBatch of the graph's exchangers, like plant.BuildHRSGBatch
+        hrsg = HRSG.HRSGBatch(inlet_temp=inlet_temp)
+        for name, cold_in, cold_out, component, exchanger_type in self.graph.Exchangers():
+            exchanger = HRSG.HeatExchangerBatch(self.T[cold_in], self.T[cold_out], fluegas_massflow, self.massflows[component],
+                                                exchanger_type, self.P[cold_in], quality_in=0, quality_out=1, properties=properties, segments=segments,
+                                                fluegas=fluegas)
+            exchanger.set_name(name)
+            hrsg.AddExchanger(exchanger)
+        return hrsg
+
+    def __len__(self):
+        return self.n
+
+
+def PlantBatch(graph, inputs=None, properties=None, segments=1, gas_properties=True, **overrides):
+    # plant.PlantBatch with the steam cycle given by graph. Inputs the graph
+    # reads that are not plant inputs (e.g. another pressure level) must be
+    # given; the rest default to plant.DEFAULTS.
+    values = dict(plant.DEFAULTS)
+    values.update(inputs or {})
+    values.update(overrides)
+    values = dict(zip(values, [value.reshape(-1) for value in np.broadcast_arrays(
+        *[np.asarray(value, dtype=float) for value in values.values()])]))
+
+    with instrument.Stage('gas turbine batch'):
+        gasTurbine = gt.GasTurbineBatch(values['fuel_in'], values['AF'], values['LHV'], values['P_r'], values['n_t'], values['n_c'],
+                                        values['T_atm'], values['P_atm'], values['cp_gas'], values['k_gas'], gas_properties)
+    with instrument.Stage('steam cycle batch'):
+        steamCycle = graph.Evaluate(values, properties=properties)
+    with instrument.Stage('hrsg batch'):
+        hrsg = steamCycle.BuildHRSG(gt.ToKelvin(gasTurbine.T[4]), values['fluegas_massflow'], properties=properties, segments=segments,
+                                    fluegas=flue_gas.HotSide(values['AF']))
+        hrsg.Calculate()
+    return gasTurbine, steamCycle, hrsg
+
+
+def EvaluatePlantBatch(graph, inputs=None, properties=None, segments=1, **overrides):
+    # dict of plant.RESULTS arrays, one value per case
+    return plant.ResultsBatch(*PlantBatch(graph, inputs, properties, segments, False, **overrides))
+
+
+# main.py's cycle: the same states, works and HRSG as SteamCycle/SteamCycleBatch
+# (which leave P[6] at 0; here it is the condenser pressure)
+THREE_PRESSURE_REHEAT = CycleGraph(
+    "3 pressure with reheat",
+    states=(
+        State(1, 'condensate', temperature='water_low_temp'),
+        State(2, 'isentropic', pressure='lp', source=1, region=1),
+        State(3, 'saturated_liquid', pressure='lp'),
+        State(4, 'saturated_vapour', pressure='lp'),
+        State(5, 'isentropic', pressure='lp', source=6, region=2),
+        State(6, 'quality', pressure=1, quality=0.9),
+        State(7, 'isentropic', pressure='ip', source=3, region=1),
+        State(8, 'saturated_liquid', pressure='ip'),
+        State(9, 'saturated_vapour', pressure='ip'),
+        State(10, 'isentropic', pressure='ip', source=5, region=2),
+        State(11, 'isentropic', pressure='hp', source=3, region=1),
+        State(12, 'saturated_liquid', pressure='hp'),
+        State(13, 'saturated_vapour', pressure='hp'),
+        State(14, 'temperature', pressure='hp', temperature='steam_high_temp'),
+        State(15, 'isentropic', pressure='ip', source=14, region=2),
+    ),
+    components=(
+        Component("LP Pump", 'pump', 1, 2, {'m1': 1, 'm2': 1, 'm3': 1}),
+        Component("IP Pump", 'pump', 3, 7, {'m2': 1}),
+        Component("HP Pump", 'pump', 3, 11, {'m3': 1}),
+        Component("HP Turbine", 'turbine', 14, 15, {'m3': 1}),
+        Component("IP Turbine", 'turbine', 10, 5, {'m2': 1, 'm3': 1}),
+        Component("LP Turbine", 'turbine', 5, 6, {'m1': 1, 'm2': 1, 'm3': 1, 'ma': -1}),
+        Component("LP Superheater", 'superheater', 4, 5, {'m1': 1, 'ma': -1}),
+        Component("LP Evaporator", 'evaporator', 3, 4, {'m1': 1}),
+        Component("LP Economiser", 'economiser', 2, 3, {'m1': 1, 'm2': 1, 'm3': 1}),
+        Component("IP Superheater", 'reheat', 15, 10, {'m2': 1, 'm3': 1}),
+        Component("IP Superheater 2", 'mixing', 9, 15, {'m2': 1}),
+        Component("IP Evaporator", 'evaporator', 8, 9, {'m2': 1}),
+        Component("IP Economiser", 'economiser', 7, 8, {'m2': 1}),
+        Component("HP Superheater", 'superheater', 13, 14, {'m3': 1}),
+        Component("HP Evaporator", 'evaporator', 12, 13, {'m3': 1}),
+        Component("HP Economiser", 'economiser', 11, 12, {'m3': 1}),
+        Component("Amine", 'extraction', 5, flow={'ma': 1}),
+    ),
+    hrsg=tuple(name for name, cold_in, cold_out, mass_flow, exchanger_type in plant.EXCHANGERS),
+    lines=((1, 2, 3, 4, 5, 6, 1), (3, 7, 8, 9, 10, 5), (3, 11, 12, 13, 14, 15)),
+    labels=("Low Pressure", "Intermediate Pressure", "High Pressure"),
+)
+
+# two drums without reheat: the HP turbine exhausts to the LP header, where it
+# is brought to the LP turbine inlet state like IP Superheater 2 above. Uses
+# hp, lp, m1 (LP steam), m3 (HP steam) and ma from plant.DEFAULTS.
+TWO_PRESSURE = CycleGraph(
+    "2 pressure",
+    states=(
+        State(1, 'condensate', temperature='water_low_temp'),
+        State(2, 'isentropic', pressure='lp', source=1, region=1),
+        State(3, 'saturated_liquid', pressure='lp'),
+        State(4, 'saturated_vapour', pressure='lp'),
+        State(5, 'isentropic', pressure='lp', source=6, region=2),
+        State(6, 'quality', pressure=1, quality=0.9),
+        State(7, 'isentropic', pressure='hp', source=3, region=1),
+        State(8, 'saturated_liquid', pressure='hp'),
+        State(9, 'saturated_vapour', pressure='hp'),
+        State(10, 'temperature', pressure='hp', temperature='steam_high_temp'),
+        State(11, 'isentropic', pressure='lp', source=10, region=2),
+    ),
+    components=(
+        Component("LP Pump", 'pump', 1, 2, {'m1': 1, 'm3': 1}),
+        Component("HP Pump", 'pump', 3, 7, {'m3': 1}),
+        Component("HP Turbine", 'turbine', 10, 11, {'m3': 1}),
+        Component("LP Turbine", 'turbine', 5, 6, {'m1': 1, 'm3': 1, 'ma': -1}),
+        Component("LP Superheater", 'superheater', 4, 5, {'m1': 1, 'ma': -1}),
+        Component("LP Evaporator", 'evaporator', 3, 4, {'m1': 1}),
+        Component("LP Economiser", 'economiser', 2, 3, {'m1': 1, 'm3': 1}),
+        Component("HP Exhaust", 'mixing', 11, 5, {'m3': 1}),
+        Component("HP Superheater", 'superheater', 9, 10, {'m3': 1}),
+        Component("HP Evaporator", 'evaporator', 8, 9, {'m3': 1}),
+        Component("HP Economiser", 'economiser', 7, 8, {'m3': 1}),
+        Component("Amine", 'extraction', 5, flow={'ma': 1}),
+    ),
+    hrsg=("HP Superheater", "LP Superheater", "HP Evaporator", "HP Economiser", "LP Evaporator", "LP Economiser"),
+    lines=((1, 2, 3, 4, 5, 6, 1), (3, 7, 8, 9, 10, 11)),
+    labels=("Low Pressure", "High Pressure"),
+)
+
+GRAPHS = {graph.name: graph for graph in (THREE_PRESSURE_REHEAT, TWO_PRESSURE)}
@@ -0,0 +1,258 @@
+import fcntl
+import functools
+import hashlib
+import os
+import re
+import shutil
+import types
+
+import numpy as np
+
+import backends
+import flue_gas
+import gas_turbine as gt
+import instrument
+import plant
+import plant_model
+import states
+import steam_3_pressure_with_reheat as steam
+
+# Persistent cache of plant evaluations, shared by processes and runs.
+#
+#     cache = disk_cache.DiskCache('~/.cache/hrsg', max_bytes=2 ** 30)
+#     disk_cache.EvaluatePlant({'hp': 150}, cache)   # plant.RESULTS
+#     cache.Stats()                                 # hits, misses, hit rates
+#     sweep.Sweep(cases, cache=cache)                # or plant.EvaluateRows(..., cache=cache)
+#
+# Each component is cached on its own, keyed by a SHA-256 of its inputs:
+#     gas_turbine  plant_model.GAS_TURBINE_INPUTS
+#     steam_cycle  plant_model.STEAM_STATE_INPUTS and STEAM_FLOW_INPUTS
+#     hrsg         the steam cycle's key, HRSG inlet temperature, flue gas
+#                  mass flow, segments and AF (the hot side's flue gas)
+# so a case that only changes the gas turbine reuses the steam cycle, and the
+# HRSG is rebuilt from the cached steam states without recalculating them.
+# An entry is one record of the component's compact Result() arrays saved as
+# a .npy file (no pickles), <path>/<version>/<component>/<key[:2]>/<key>.npy.
+#
+# version is a hash of the model source files (CODE_FILES) and the iapws
+# version: editing the models starts an empty cache. Older versions' folders
+# are left alone (another checkout may still use them) until Prune() deletes
+# them; it only touches folders named like a version, never anything else
+# under path. Files are written to a temporary
+# name and renamed into place, so readers in other processes see whole entries
+# or none. A hit touches the file's modification time; once the entries pass
+# max_bytes the least recently used are deleted, under a file lock, until they
+# are back to 90% of it. Stats() counts this process's hits and misses.
+
+COMPONENTS = ('gas_turbine', 'steam_cycle', 'hrsg')
+
+CODE_FILES = ('gas_turbine.py', 'steam_3_pressure_with_reheat.py', 'hrsg.py', 'plant.py', 'states.py',
+              'iapws97_vec.py', 'inverse_properties.py', 'property_tables.py', 'backends.py', 'flue_gas.py', 'disk_cache.py')
+
+VERSION_PATTERN = re.compile(r'[0-9a-f]{16}')  # names of the folders Version() gives
+
+STEAM_INPUTS = plant_model.STEAM_STATE_INPUTS + plant_model.STEAM_FLOW_INPUTS
+
+# SteamCycle mass flow attributes the HRSG exchangers use, in plant.EXCHANGERS order
+EXCHANGER_FLOWS = tuple(mass_flow for name, cold_in, cold_out, mass_flow, exchanger_type in plant.EXCHANGERS)
+
+
+@functools.lru_cache(maxsize=None)
+def Version():
+    # hash of the model code the cached results depend on
+    import iapws
+    digest = hashlib.sha256(str(iapws.__version__).encode())
+    folder = os.path.dirname(os.path.abspath(__file__))
+    for filename in CODE_FILES:
+        with open(os.path.join(folder, filename), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def Key(component, values, prefix=b''):
+    # hex SHA-256 of a component name, the property backend, the gas model and
+    # its input values as float64
+    digest = hashlib.sha256(component.encode() + b'\0' + backends.Current().name.encode() + b'\0' + flue_gas.Current().encode() + b'\0' + prefix)
+    digest.update(np.asarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class DiskCache:
+
+    def __init__(self, path, max_bytes=256 * 2 ** 20):
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.version = Version()
+        self.folder = os.path.join(self.path, self.version)
+        os.makedirs(self.folder, exist_ok=True)
+        self.ResetStats()
+        self.written = 0  # bytes since the size was last checked
+
+    def _Filename(self, component, key):
+        return os.path.join(self.folder, component, key[:2], key + ".npy")
+
+    def Get(self, component, key):
+        # dict of the arrays stored under key, or None
+        filename = self._Filename(component, key)
+        try:
+            entry = np.load(filename, allow_pickle=False)
+            arrays = {name: entry[name] for name in entry.dtype.names}
+            os.utime(filename)
+        except (OSError, ValueError, EOFError):  # missing, or evicted while being read
+            self.misses[component] += 1
+            return None
+        self.hits[component] += 1
+        return arrays
+
+    def Put(self, component, key, **arrays):
+        filename = self._Filename(component, key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        temporary = filename + "." + str(os.getpid()) + ".tmp"
+        arrays = {name: np.asarray(value) for name, value in arrays.items()}
+        entry = np.empty((), dtype=[(name, value.dtype, value.shape) for name, value in arrays.items()])
+        for name, value in arrays.items():
+            entry[name] = value
+        try:
+            with open(temporary, 'wb') as f:
+                np.save(f, entry)
+            self.written += os.path.getsize(temporary)
+            os.replace(temporary, filename)
+        except OSError as error:
+            instrument.Print("Could not write cache entry " + filename + ": " + str(error))
+            try:
+                os.remove(temporary)
+            except OSError:
+                pass
+            return False
+        if self.written > self.max_bytes // 16:
+            self.Evict()
+        return True
+
+    def Entries(self):
+        # (modification time, bytes, filename) of every entry
+        entries = []
+        for folder, names, filenames in os.walk(self.folder):
+            for filename in filenames:
+                if filename.endswith(".npy"):
+                    try:
+                        info = os.stat(os.path.join(folder, filename))
+                    except OSError:
+                        continue
+                    entries.append((info.st_mtime, info.st_size, os.path.join(folder, filename)))
+        return entries
+
+    def Size(self):
+        # bytes of all entries
+        return sum(size for time, size, filename in self.Entries())
+
+    def Evict(self):
+        # delete least recently used entries until under 90% of max_bytes
+        self.written = 0
+        with open(os.path.join(self.folder, 'lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                entries = self.Entries()
+                total = sum(size for time, size, filename in entries)
+                if total <= self.max_bytes:
+                    return 0
+                evicted = 0
+                for time, size, filename in sorted(entries):
+                    if total <= 0.9 * self.max_bytes:
+                        break
+                    try:
+                        os.remove(filename)
+                    except OSError:
+                        pass
+                    total -= size
+                    evicted += 1
+                self.evicted += evicted
+                return evicted
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def Prune(self):
+        # delete the folders of other versions (results of older model code);
+        # returns their names
+        pruned = []
+        for name in os.listdir(self.path):
+            if name != self.version and VERSION_PATTERN.fullmatch(name) and os.path.isdir(os.path.join(self.path, name)):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+                pruned.append(name)
+        return pruned
+
+    def Clear(self):
+        # delete every entry of this version
+        shutil.rmtree(self.folder, ignore_errors=True)
+        os.makedirs(self.folder, exist_ok=True)
+
+    def ResetStats(self):
+        self.hits = dict.fromkeys(COMPONENTS, 0)
+        self.misses = dict.fromkeys(COMPONENTS, 0)
+        self.evicted = 0
+
+    def Stats(self):
+        # this process's lookups: hits, misses and hit rate per component and in total
+        stats = {}
+        for component in COMPONENTS:
+            lookups = self.hits[component] + self.misses[component]
+            stats[component] = {'hits': self.hits[component], 'misses': self.misses[component],
+                                'hit_rate': self.hits[component] / lookups if lookups else 0.0}
+        hits = sum(self.hits.values())
+        lookups = hits + sum(self.misses.values())
+        stats['total'] = {'hits': hits, 'misses': lookups - hits, 'hit_rate': hits / lookups if lookups else 0.0}
+        stats['evicted'] = self.evicted
+        return stats
+
+
+def Plant(inputs=None, cache=None, segments=1, **overrides):
+    # (GasTurbineResult, SteamCycleResult, HRSGResult) of one case, each
+    # component from the cache if it is there and calculated and stored if not
+    values = dict(plant.DEFAULTS)
+    values.update(inputs or {})
+    values.update(overrides)
+
+    gas_key = Key('gas_turbine', [values[name] for name in plant_model.GAS_TURBINE_INPUTS])
+    entry = cache.Get('gas_turbine', gas_key)
+    if entry is None:
+        with instrument.Quiet():
+            gasTurbine = gt.GasTurbine(values['fuel_in'], values['AF'], values['LHV'], values['P_r'], values['n_t'], values['n_c'],
+                                       values['T_atm'], values['P_atm'], values['cp_gas'], values['k_gas'], False).Result()
+        cache.Put('gas_turbine', gas_key, states=gasTurbine.states, work=gasTurbine.work, efficiency=gasTurbine.efficiency)
+    else:
+        gasTurbine = states.GasTurbineResult(entry['states'], entry['work'], float(entry['efficiency']))
+
+    steam_key = Key('steam_cycle', [values[name] for name in STEAM_INPUTS])
+    entry = cache.Get('steam_cycle', steam_key)
+    if entry is None:
+        with instrument.Quiet():
+            cycle = steam.SteamCycle(values['hp'], values['ip'], values['lp'], values['m1'], values['m2'], values['m3'], values['ma'],
+                                     values['steam_high_temp'], values['water_low_temp'], keep_properties=False)
+        steamCycle = cycle.Result()
+        flows = np.array([getattr(cycle, name) for name in EXCHANGER_FLOWS], dtype=float)
+        cache.Put('steam_cycle', steam_key, states=steamCycle.states, works=steamCycle.works, massflows=steamCycle.massflows,
+                  energies=np.array([steamCycle.q_in, steamCycle.w_net, steamCycle.efficiency]), flows=flows)
+    else:
+        q_in, w_net, efficiency = entry['energies'].tolist()
+        steamCycle = states.SteamCycleResult(entry['states'], entry['works'], entry['massflows'], q_in, w_net, efficiency)
+        flows = entry['flows']
+
+    inlet_temp = gt.ToKelvin(gasTurbine.T[4])
+    hrsg_key = Key('hrsg', [inlet_temp, values['fluegas_massflow'], segments, values['AF']], prefix=steam_key.encode())
+    entry = cache.Get('hrsg', hrsg_key)
+    if entry is None:
+        # BuildHRSG only needs the states and the exchanger mass flows
+        source = types.SimpleNamespace(T=steamCycle.T, P=steamCycle.P, **dict(zip(EXCHANGER_FLOWS, flows.tolist())))
+        with instrument.Quiet():
+            hrsg = plant.BuildHRSG(source, inlet_temp, values['fluegas_massflow'], segments=segments, fluegas=flue_gas.HotSide(values['AF']))
+            hrsg.Calculate()
+        hrsg = hrsg.Result()
+        cache.Put('hrsg', hrsg_key, exchangers=hrsg.exchangers,
+                  totals=np.array([hrsg.inlet_temp, hrsg.outlet_temp, hrsg.heatDuty, hrsg.min_approach], dtype=float))
+    else:
+        hrsg = states.HRSGResult(entry['exchangers'], *entry['totals'].tolist())
+    return gasTurbine, steamCycle, hrsg
+
+
+def EvaluatePlant(inputs=None, cache=None, segments=1, **overrides):
+    # plant.EvaluatePlant through the cache
+    return plant.Results(*Plant(inputs, cache, segments, **overrides))
@@ -0,0 +1,216 @@
+import functools
+import os
+import types
+
+import numpy as np
+
+# Temperature dependent air and flue gas properties from precomputed tables.
+#
+#     flue_gas.Use('tables')                 # or HRSG_GAS_MODEL=tables python main.py
+#     gas = flue_gas.FlueGas(50)             # products of methane burnt at AF 50
+#     gas.Enthalpy(1600), gas.Temperature(h), gas.Entropy(T, P), gas.Isentropic(T, 1 / 20)
+#     air = flue_gas.FlueGas()               # air, AF None
+#
+# The gas model is module state like backends: 'constant' (the default) keeps
+# the gas turbine and the HRSG hot side on a constant cp and k, 'tables' uses
+# the ideal gas tables below in GasTurbine(Batch) and, through HotSide(AF), in
+# the HRSG exchangers.
+#
+# The tables hold h(T), s0(T) (the 1 bar entropy) and cp(T) of air and of the
+# stoichiometric products of methane in air, every TABLE_STEP K over
+# TABLE_RANGE, built on first use from the NASA 7 coefficient polynomials of
+# each species (GRI-Mech 3.0). Burning a kg of fuel in AF kg of air gives
+# 1 + STOICHIOMETRIC_AF kg of stoichiometric products and AF - STOICHIOMETRIC_AF
+# kg of excess air, so the flue gas at any AF is a mass weighted mix of the two
+# columns and one table serves every AF. Properties are linear interpolations
+# on the uniform grid (an index, no search) and temperatures from h or s are a
+# few Newton steps on them, all over arrays, so a batch of states costs about
+# as much as one. AF below STOICHIOMETRIC_AF (rich, unburnt fuel) gives nan.
+#
+# h [kJ/kg] is sensible enthalpy, 0 at REFERENCE_T for every species, so the
+# fuel's LHV is the heat released by combustion at REFERENCE_T; s [kJ/kgK] is
+# absolute (third law) including the entropy of mixing. Temperatures are K,
+# pressures bar.
+
+MODELS = ('constant', 'tables')
+DEFAULT = 'constant'
+
+R = 8.314462618  # kJ/kmolK
+REFERENCE_T = 298.15  # K
+REFERENCE_P = 1  # bar
+TABLE_RANGE = (200, 3000)  # K
+TABLE_STEP = 1  # K
+NEWTON_STEPS = 12
+TOLERANCE = 1e-9  # K
+
+MOLAR_MASS = {'N2': 28.0134, 'O2': 31.9988, 'CO2': 44.0095, 'H2O': 18.01528, 'Ar': 39.948, 'CH4': 16.04246}  # kg/kmol
+
+AIR = {'N2': 0.78084, 'O2': 0.20946, 'Ar': 0.00934, 'CO2': 0.00036}  # mole fractions
+
+# NASA polynomials, cp/R = a1 + a2 T + a3 T^2 + a4 T^3 + a5 T^4, h/RT and s/R
+# from a6 and a7; (low 200-1000 K, high 1000-3500 K) coefficients per species
+NASA = {
+    'N2': ((3.298677, 1.4082404e-03, -3.963222e-06, 5.641515e-09, -2.444854e-12, -1020.8999, 3.950372),
+           (2.92664, 1.4879768e-03, -5.68476e-07, 1.0097038e-10, -6.753351e-15, -922.7977, 5.980528)),
+    'O2': ((3.78245636, -2.99673416e-03, 9.84730201e-06, -9.68129509e-09, 3.24372837e-12, -1063.94356, 3.65767573),
+           (3.28253784, 1.48308754e-03, -7.57966669e-07, 2.09470555e-10, -2.16717794e-14, -1088.45772, 5.45323129)),
+    'CO2': ((2.35677352, 8.98459677e-03, -7.12356269e-06, 2.45919022e-09, -1.43699548e-13, -48371.9697, 9.90105222),
+            (3.85746029, 4.41437026e-03, -2.21481404e-06, 5.23490188e-10, -4.72084164e-14, -48759.166, 2.27163806)),
+    'H2O': ((4.19864056, -2.0364341e-03, 6.52040211e-06, -5.48797062e-09, 1.77197817e-12, -30293.7267, -0.849032208),
+            (3.03399249, 2.17691804e-03, -1.64072518e-07, -9.7041987e-11, 1.68200992e-14, -30004.2971, 4.9667701)),
+    'Ar': ((2.5, 0, 0, 0, 0, -745.375, 4.366),
+           (2.5, 0, 0, 0, 0, -745.375, 4.366)),
+}
+NASA_MID_T = 1000  # K
+
+
+def Current():
+    return os.environ.get('HRSG_GAS_MODEL', DEFAULT)
+
+
+def Use(name):
+    # make name the gas model for this process and the workers it starts
+    if name not in MODELS:
+        raise ValueError("Unknown gas model " + str(name) + ", expected one of " + ", ".join(MODELS))
+    os.environ['HRSG_GAS_MODEL'] = name
+    return name
+
+
+def HotSide(AF):
+    # the FlueGas of the HRSG hot side for an air fuel ratio (scalar or array)
+    # under the current gas model, None for constant cp
+    return FlueGas(AF) if Current() == 'tables' else None
+
+
+def _Species(name, T):
+    # cp [kJ/kgK], sensible h [kJ/kg] and s0 [kJ/kgK] of one species at T [K]
+    def Evaluate(a, T):
+        a1, a2, a3, a4, a5, a6, a7 = a
+        cp = a1 + T * (a2 + T * (a3 + T * (a4 + T * a5)))
+        h = a1 * T + T ** 2 * (a2 / 2 + T * (a3 / 3 + T * (a4 / 4 + T * a5 / 5))) + a6
+        s = a1 * np.log(T) + T * (a2 + T * (a3 / 2 + T * (a4 / 3 + T * a5 / 4))) + a7
+        return np.stack([cp, h, s])
+
+    low, high = NASA[name]
+    values = np.where(T < NASA_MID_T, Evaluate(low, T), Evaluate(high, T))
+    reference = Evaluate(low if REFERENCE_T < NASA_MID_T else high, REFERENCE_T)[1]
+    scale = R / MOLAR_MASS[name]
+    return values[0] * scale, (values[1] - reference) * scale, values[2] * scale
+
+
+def Mixture(moles):
+    # (mass fractions, kmol per kg) of the species of a mixture given as
+    # {species: moles}
+    mass = sum(amount * MOLAR_MASS[name] for name, amount in moles.items())
+    return {name: amount * MOLAR_MASS[name] / mass for name, amount in moles.items()}, {name: amount / mass for name, amount in moles.items()}
+
+
+def StoichiometricProducts():
+    # moles of the products of one mole of methane burnt with just enough air,
+    # and the moles of that air
+    air = 2 / AIR['O2']
+    products = {name: air * fraction for name, fraction in AIR.items() if name != 'O2'}
+    products['CO2'] += 1
+    products['H2O'] = 2
+    return products, air
+
+
+def _StoichiometricAF():
+    air = StoichiometricProducts()[1]
+    return air * sum(fraction * MOLAR_MASS[name] for name, fraction in AIR.items()) / MOLAR_MASS['CH4']
+
+
+STOICHIOMETRIC_AF = _StoichiometricAF()  # kg air / kg methane
+
+
+@functools.lru_cache(maxsize=None)
+def Tables():
+    # T [K], the h, s0 and cp columns of air and the differences of the
+    # stoichiometric products' from them (each with its rise to the next
+    # table point), and both mixtures' kmol of each species per kg
+    T = np.arange(TABLE_RANGE[0], TABLE_RANGE[1] + TABLE_STEP / 2, TABLE_STEP, dtype=float)
+    columns = {}
+    for name, moles in (('air', AIR), ('products', StoichiometricProducts()[0])):
+        fractions, per_kg = Mixture(moles)
+        values = {'cp': 0, 'h': 0, 's': 0, 'moles': per_kg}
+        for species, fraction in fractions.items():
+            for column, value in zip(('cp', 'h', 's'), _Species(species, T)):
+                values[column] = values[column] + fraction * value
+        columns[name] = values
+    air, change = {}, {}
+    for column in ('cp', 'h', 's'):
+        for table, values in ((air, columns['air'][column]), (change, columns['products'][column] - columns['air'][column])):
+            table[column] = values
+            table[column + ' rise'] = np.append(np.diff(values), 0)
+    return types.SimpleNamespace(T=T, air=air, change=change, air_moles=columns['air']['moles'], products_moles=columns['products']['moles'])
+
+
+class FlueGas:
+    # air (AF None) or the products of methane burnt at air fuel ratio AF,
+    # a scalar or an array broadcasting against the states it is used with
+
+    def __init__(self, AF=None):
+        self.AF = AF
+        tables = Tables()
+        if AF is None:
+            self.fraction = 0.0
+        else:
+            AF = np.asarray(AF, dtype=float)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.fraction = np.where(AF >= STOICHIOMETRIC_AF, (1 + STOICHIOMETRIC_AF) / (1 + AF), np.nan)
+        # kmol of each species per kg, for the gas constant and the entropy of mixing
+        moles = [tables.air_moles.get(name, 0) + self.fraction * (tables.products_moles.get(name, 0) - tables.air_moles.get(name, 0))
+                 for name in NASA]
+        total = sum(moles)
+        self.R = R * total  # kJ/kgK
+        self.mixing = -self.R * sum(amount / total * np.log(np.maximum(amount, 1e-300) / total) for amount in moles)
+
+    def _Column(self, name, T):
+        # (value, slope) of column h, s0 or cp at T: linear between the two
+        # table points either side (the grid is uniform, so no search), and
+        # extended from the end intervals outside TABLE_RANGE
+        tables = Tables()
+        position = (T - TABLE_RANGE[0]) / TABLE_STEP
+        index = np.fmin(np.fmax(position, 0), len(tables.T) - 2).astype(np.intp)  # nan to 0, its weight stays nan
+        weight = position - index
+        value = tables.air[name][index] + weight * tables.air[name + ' rise'][index]
+        rise = tables.air[name + ' rise'][index]
+        if self.AF is not None:
+            value = value + self.fraction * (tables.change[name][index] + weight * tables.change[name + ' rise'][index])
+            rise = rise + self.fraction * tables.change[name + ' rise'][index]
+        return value, rise / TABLE_STEP
+
+    def Enthalpy(self, T):
+        # kJ/kg at T [K]
+        return self._Column('h', np.asarray(T, dtype=float))[0]
+
+    def Cp(self, T):
+        # kJ/kgK at T [K]
+        return self._Column('cp', np.asarray(T, dtype=float))[0]
+
+    def Entropy(self, T, P=REFERENCE_P):
+        # kJ/kgK at T [K] and P [bar]
+        return self._Column('s', np.asarray(T, dtype=float))[0] + self.mixing - self.R * np.log(P / REFERENCE_P)
+
+    def Temperature(self, h, guess=None):
+        # T [K] where the enthalpy is h
+        T = np.full(np.shape(h), 1000.0) if guess is None else guess
+        return self._Solve('h', h, T)
+
+    def Isentropic(self, T, ratio):
+        # T [K] reached from T by an isentropic change of pressure by ratio
+        T = np.asarray(T, dtype=float)
+        guess = T * ratio ** (self.R / self.Cp(T))
+        return self._Solve('s', self._Column('s', T)[0] + self.R * np.log(ratio), guess)
+
+    def _Solve(self, name, target, T):
+        # T where column name equals target: Newton steps over whole arrays
+        # on the piecewise linear interpolation, exact once in the right interval
+        T = np.asarray(T, dtype=float)
+        for iteration in range(NEWTON_STEPS):
+            value, slope = self._Column(name, T)
+            change = (value - target) / slope
+            T = T - change
+            if not np.any(np.abs(change) > TOLERANCE):
+                break
+        return T
@@ -1,46 +1,73 @@
-from CoolProp.CoolProp import PropsSI
+import numpy as np
+import functools
 import csv
 
+import backends
+import flue_gas
+import instrument
+import states
+
+# defaults for the GasTurbine inputs of the same names
 T_atm = 8  # Celcius
 P_atm = 1  # bar
 k = 1.4
-cp = 1.004
+cp = None  # kJ/kgK, None for the property backend's gas_cp
+
+CACHE_SIZE = 4096  # (P, T) states remembered by AirProperties
 
 
 class GasTurbine:
 
-    def __init__(self, fuel_in, AF, LHV, P_r, n_t=1, n_c=1):
+    def __init__(self, fuel_in, AF, LHV, P_r, n_t=1, n_c=1, T_atm=None, P_atm=None, cp_gas=None, k_gas=None, gas_properties=True, model=None):
+        # T_atm [C], P_atm [bar], cp_gas [kJ/kgK] and k_gas default to the
+        # module values T_atm, P_atm, cp and k; cp = None leaves cp_gas to the
+        # property backend's gas_cp.
+        # gas_properties=False leaves h and s as nan and skips the backend's air
+        # properties; the works and efficiency only need cp. model is a
+        # flue_gas model name, flue_gas.Current() for None; with 'tables' the
+        # states, h and s come from TableCycle and cp_gas, k_gas and
+        # gas_properties are not used.
+        T_atm, P_atm, cp, k = _Ambient(T_atm, P_atm, cp_gas, k_gas, backends.Current().gas_cp)
         self.m_air = fuel_in * AF
         self.m_f = fuel_in
         self.m_t = fuel_in * (1 + AF)
+        self.model = model or flue_gas.Current()
+
+        # state points 1-4 in one structured array (row 0 unused); T [C], P [bar],
+        # h and s are views of its fields
+        self.states = states.StateTable(5)
+        self.T = self.states['T']
+        self.P = self.states['P']
+        self.h = self.states['h']
+        self.s = self.states['s']
 
-        self.T = [0] * 5
-        self.T[0] = 'Temperature [C]'
+        self.states['x'][1:] = 1
+        if self.model == 'tables':
+            cycle = TableCycle(fuel_in, AF, LHV, P_r, n_t, n_c, T_atm, P_atm)
+            for name in ('T', 'P', 'h', 's'):
+                getattr(self, name)[1:] = cycle[name][1:, 0]
+            self.Ts = {name: float(value[0]) for name, value in cycle['Ts'].items()}
+            self.work = {name: float(value[0]) for name, value in cycle['work'].items()}
+            self.efficiency = float(cycle['efficiency'][0])
+            return
 
         self.Ts = {}
         self.T[1] = T_atm
-        self.Ts['2s'] = isentropic_relation_T(self.T[1], P_r)
+        self.Ts['2s'] = isentropic_relation_T(self.T[1], P_r, k)
         self.T[2] = self.T[1] + (self.Ts['2s']-self.T[1])/n_c
         self.T[3] = ((self.m_f * LHV) / (self.m_t * cp) )+ self.T[2]
-        self.Ts['4s'] = isentropic_relation_T(self.T[3], 1/P_r)
+        self.Ts['4s'] = isentropic_relation_T(self.T[3], 1/P_r, k)
         self.T[4] = self.T[3] - n_t * (self.T[3] - self.Ts['4s'])
 
-        self.P = [0] * 5
-        self.P[0] = 'Pressure [bar]'
         self.P[1] = P_atm
         self.P[2] = P_r * self.P[1]
         self.P[3] = self.P[2]
         self.P[4] = self.P[1]
 
-        self.s = [0] * 5
-        self.s[0] = 'Specific Entropy [kJ/kgK]'
-
-        self.h = [0] * 5
-        self.h[0] = 'Specific Enthalpy [kJ/kg]'
-
-        for index in range(1, len(self.T)):
-            self.s[index] = PropsSI('S','P', BarToPa(self.P[index]),'T',ToKelvin(self.T[index]),'Air') /1000  # convert to kJ/kgK
-            self.h[index] = PropsSI('H','P', BarToPa(self.P[index]),'T',ToKelvin(self.T[index]),'Air') /1000  # convert to kJ/kgK
+        if gas_properties:
+            self.h[1:], self.s[1:] = StateProperties(self.P[1:], self.T[1:])
+        else:
+            self.h[1:] = self.s[1:] = np.nan
 
         self.work = {}
         self.work['turbine'] = self.m_t * cp * (self.T[3]-self.T[4])
@@ -71,9 +98,14 @@ class GasTurbine:
         axes.set_title("T-S Diagram for Gas Turbine" if type == 'ts' else "h-s Diagram for Gas Turbine")
         axes.grid()
 
+    def Result(self):
+        # compact copy of the states and works for keeping many cases
+        return states.GasTurbineResult(self.states.copy(), states.WorkRecord(self.work), self.efficiency)
+
     def SaveResults(self, csv_file_path):
         outputArray = [None] * (len(self.T))
-        for index in range(0,len(self.T)):
+        outputArray[0] = ['Temperature [C]', 'Pressure [bar]', 'Specific Entropy [kJ/kgK]']
+        for index in range(1,len(self.T)):
             outputArray[index] = [self.T[index], self.P[index], self.s[index]]
         try:
             with open(csv_file_path+".csv", 'w') as csvfile:
@@ -87,15 +119,156 @@ class GasTurbine:
                 writer.writerow(["Efficiency",self.efficiency])
             return True
         except IOError:
-            print("I/O error")
+            instrument.Print("I/O error")
             return False
 
 
+class GasTurbineBatch:
+    # GasTurbine over arrays of inputs (broadcast together). T, P, s and h are
+    # (5, N) arrays indexed by state like the scalar lists, row 0 unused.
+
+    def __init__(self, fuel_in, AF, LHV, P_r, n_t=1, n_c=1, T_atm=None, P_atm=None, cp_gas=None, k_gas=None, gas_properties=True, model=None):
+        T_atm, P_atm, cp, k = _Ambient(T_atm, P_atm, cp_gas, k_gas, backends.Current().gas_cp)
+        fuel_in, AF, LHV, P_r, n_t, n_c, T_atm, P_atm, cp, k = [value.reshape(-1) for value in np.broadcast_arrays(
+            *[np.asarray(value, dtype=float) for value in (fuel_in, AF, LHV, P_r, n_t, n_c, T_atm, P_atm, cp, k)])]
+        self.n = len(fuel_in)
+        self.m_air = fuel_in * AF
+        self.m_f = fuel_in
+        self.m_t = fuel_in * (1 + AF)
+        self.model = model or flue_gas.Current()
+        if self.model == 'tables':
+            cycle = TableCycle(fuel_in, AF, LHV, P_r, n_t, n_c, T_atm, P_atm)
+            self.T, self.P, self.h, self.s = cycle['T'], cycle['P'], cycle['h'], cycle['s']
+            self.Ts, self.work, self.efficiency = cycle['Ts'], cycle['work'], cycle['efficiency']
+            return
+
+        T = np.zeros((5, self.n))
+        self.Ts = {}
+        T[1] = T_atm
+        self.Ts['2s'] = isentropic_relation_T(T[1], P_r, k)
+        T[2] = T[1] + (self.Ts['2s'] - T[1]) / n_c
+        T[3] = ((self.m_f * LHV) / (self.m_t * cp)) + T[2]
+        self.Ts['4s'] = isentropic_relation_T(T[3], 1 / P_r, k)
+        T[4] = T[3] - n_t * (T[3] - self.Ts['4s'])
+
+        P = np.zeros((5, self.n))
+        P[1] = P_atm
+        P[2] = P_r * P[1]
+        P[3] = P[2]
+        P[4] = P[1]
+
+        self.T = T
+        self.P = P
+        self.h = np.zeros((5, self.n))
+        self.s = np.zeros((5, self.n))
+        if gas_properties:
+            self.h[1:], self.s[1:] = BatchStateProperties(P[1:], T[1:])
+        else:
+            self.h[1:] = self.s[1:] = np.nan
+
+        self.work = {}
+        self.work['turbine'] = self.m_t * cp * (T[3] - T[4])
+        self.work['compressor'] = self.m_air * cp * (T[2] - T[1])
+        self.work['heat in'] = self.m_t * cp * (T[3] - T[2])
+        self.work['Net Work'] = (self.work['turbine'] - self.work['compressor'])
+
+        self.efficiency = self.work['Net Work'] / self.work['heat in']
+
+    def __len__(self):
+        return self.n
+
+
+def TableCycle(fuel_in, AF, LHV, P_r, n_t, n_c, T_atm, P_atm):
+    # the gas turbine over arrays of inputs (broadcast together) on the
+    # flue_gas tables: compression of air, combustion at constant pressure
+    # to the products of AF, expansion of the products. Returns T [C], P [bar],
+    # h [kJ/kg] and s [kJ/kgK] as (5, N) arrays, row 0 unused, with Ts, work
+    # and efficiency like GasTurbineBatch. Works are enthalpy differences, so
+    # they agree with h, and 'heat in' is fuel_in * LHV.
+    fuel_in, AF, LHV, P_r, n_t, n_c, T_atm, P_atm = [value.reshape(-1) for value in np.broadcast_arrays(
+        *[np.asarray(value, dtype=float) for value in (fuel_in, AF, LHV, P_r, n_t, n_c, T_atm, P_atm)])]
+    m_air = fuel_in * AF
+    m_t = fuel_in * (1 + AF)
+    air = flue_gas.FlueGas()
+    products = flue_gas.FlueGas(AF)
+
+    n = len(fuel_in)
+    T, P, h, s = np.zeros((5, n)), np.zeros((5, n)), np.zeros((5, n)), np.zeros((5, n))
+    P[1] = P_atm
+    P[2] = P_r * P[1]
+    P[3] = P[2]
+    P[4] = P[1]
+
+    T[1] = ToKelvin(T_atm)
+    h[1] = air.Enthalpy(T[1])
+    T_2s = air.Isentropic(T[1], P_r)
+    h[2] = h[1] + (air.Enthalpy(T_2s) - h[1]) / n_c
+    T[2] = air.Temperature(h[2], T_2s)
+    h[3] = (m_air * h[2] + fuel_in * LHV) / m_t  # fuel enters at flue_gas.REFERENCE_T
+    T[3] = products.Temperature(h[3], T[2] + LHV / ((1 + AF) * products.Cp(T[2])))
+    T_4s = products.Isentropic(T[3], 1 / P_r)
+    h[4] = h[3] - n_t * (h[3] - products.Enthalpy(T_4s))
+    T[4] = products.Temperature(h[4], T_4s)
+    s[1:3] = air.Entropy(T[1:3], P[1:3])
+    s[3:] = products.Entropy(T[3:], P[3:])
+
+    work = {}
+    work['turbine'] = m_t * (h[3] - h[4])
+    work['compressor'] = m_air * (h[2] - h[1])
+    work['heat in'] = fuel_in * LHV
+    work['Net Work'] = work['turbine'] - work['compressor']
+    T[1:] = T[1:] - 273.15
+    return {'T': T, 'P': P, 'h': h, 's': s, 'Ts': {'2s': T_2s - 273.15, '4s': T_4s - 273.15}, 'work': work,
+            'efficiency': work['Net Work'] / work['heat in']}
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def AirProperties(P, T, backend=None):
+    # specific enthalpy [kJ/kg] and entropy [kJ/kgK] at P [Pa] and T [K] from
+    # the named property backend (the current one for None)
+    return backends.Get(backend).AirProperties(P, T)
+
+
+def StateProperties(P, T):
+    # lists of h and s for states given in bar and Celcius, one cached
+    # AirProperties call per state. The scalar GasTurbine stays on this path:
+    # for its four states one array call to the backend is about three times
+    # slower, and the cache keeps the inlet state (the same for most cases)
+    # across cases. BatchStateProperties is the array path for batches.
+    h = []
+    s = []
+    for pressure, temperature in zip(P, T):
+        state = AirProperties(float(BarToPa(pressure)), float(ToKelvin(temperature)), backends.Current().name)
+        h.append(state[0])
+        s.append(state[1])
+    return h, s
+
+
+def BatchStateProperties(P, T):
+    # h and s arrays for states given in bar and Celcius, from one array call
+    # to the backend. Repeated states (the compressor inlet is the same in
+    # every case) are only evaluated once.
+    pairs = np.stack([BarToPa(np.ravel(P)), ToKelvin(np.ravel(T))], axis=1)
+    unique, inverse = np.unique(pairs, axis=0, return_inverse=True)
+    h, s = backends.Current().AirProperties(unique[:, 0], unique[:, 1])
+    inverse = inverse.reshape(-1)
+    return np.asarray(h)[inverse].reshape(np.shape(P)), np.asarray(s)[inverse].reshape(np.shape(P))
+
+
 def BarToPa(p):
         return p * (10 ** 5)
 
 def ToKelvin(t):
         return t + 273.15
 
-def isentropic_relation_T(T_ref, P_ratio):
-        return ToKelvin(T_ref) * (P_ratio) ** ((k - 1) / k) - 273.15
+def isentropic_relation_T(T_ref, P_ratio, k_gas=None):
+        k_gas = k if k_gas is None else k_gas
+        return ToKelvin(T_ref) * (P_ratio) ** ((k_gas - 1) / k_gas) - 273.15
+
+
+def _Ambient(T_in, P_in, cp_in, k_in, gas_cp):
+    # GasTurbine inputs left as None take the module defaults, cp the property
+    # backend's gas_cp while the module cp is None
+    if cp_in is None:
+        cp_in = gas_cp if cp is None else cp
+    return [T_atm if T_in is None else T_in, P_atm if P_in is None else P_in, cp_in, k if k_in is None else k_in]
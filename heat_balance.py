@@ -0,0 +1,136 @@
+import numpy as np
+
+import flue_gas
+import gas_turbine as gt
+import plant
+import steam_3_pressure_with_reheat as steam
+
+# Coupled gas turbine, HRSG and steam cycle heat balance.
+#
+#     balance = heat_balance.Solve(pinch=10)
+#     balance.inputs['m1'], balance.results['net_work'], balance.converged
+#     arrays = heat_balance.SolveBatch({'P_r': np.linspace(15, 25, 101)}, pinch=10)
+#
+# main.py fixes the steam mass flows and the flue gas mass flow by hand. Here
+# the flue gas is the gas turbine exhaust (fuel_in * (1 + AF)) and the steam
+# flows of the three pressure levels are solved for so that each evaporator's
+# pinch, flue gas out minus saturation temperature, is the given value:
+#     m1 -> LP Evaporator, m2 -> IP Evaporator, m3 -> HP Evaporator
+# The solve is Newton's method on the three pinches. The Jacobian is taken by
+# forward differences, with the base point and the three perturbed points of
+# every case evaluated together in one HRSG batch, so a whole sweep is solved
+# at once. The steam states do not depend on the flows, so the gas turbine,
+# the steam cycle and the HRSG's water/steam enthalpies are evaluated once and
+# each iteration only reruns the HRSG with rescaled flows
+# (SteamCycleBatch.WithFlows). The pinches are linear in the flows for fixed
+# states, so Newton converges in two iterations (the second only confirms).
+# The returned residual is that of the returned flows, evaluated after the
+# last step.
+#
+# Only the evaporator pinches are solved for. The approach at the other
+# exchanger ends is not a constraint of the solve: a converged case is
+# feasible if every flow is positive, the LP steam covers the amine take-off
+# (m1 > ma) and no other exchanger end comes closer than the pinch, and is
+# reported as infeasible otherwise.
+
+EVAPORATORS = ('LP Evaporator', 'IP Evaporator', 'HP Evaporator')
+UNKNOWNS = ('m1', 'm2', 'm3')
+
+
+class HeatBalance:
+
+    def __init__(self, inputs, results, converged, feasible, iterations, residual):
+        self.inputs = inputs  # plant inputs with the solved m1, m2, m3 and flue gas flow
+        self.results = results  # plant.RESULTS
+        self.converged = converged
+        self.feasible = feasible
+        self.iterations = iterations
+        self.residual = residual  # K, largest pinch error
+
+
+def Solve(inputs=None, pinch=10, tol=1e-6, maxiter=20, step=1e-3, segments=1, **overrides):
+    # heat balance of one case as a HeatBalance. The approach at the other
+    # exchanger ends is only checked, through feasible, never solved for.
+    solved = SolveBatch(inputs, pinch, tol, maxiter, step, segments, **overrides)
+    return HeatBalance({name: float(solved['inputs'][name][0]) for name in plant.INPUTS},
+                       {name: float(solved['results'][name][0]) for name in plant.RESULTS},
+                       bool(solved['converged'][0]), bool(solved['feasible'][0]), int(solved['iterations']),
+                       float(solved['residual'][0]))
+
+
+def SolveBatch(inputs=None, pinch=10, tol=1e-6, maxiter=20, step=1e-3, segments=1, **overrides):
+    # heat balance of arrays of cases (inputs broadcast together). Returns a
+    # dict of 'inputs' and 'results' (dicts of arrays), 'converged',
+    # 'feasible', 'residual' (K) per case and the Newton 'iterations' taken.
+    # tol: K on the pinches. step: kg/s for the finite differences.
+    # m1, m2 and m3 in the inputs are the starting point. Only the evaporator
+    # pinches are solved; min_approach only goes into 'feasible'.
+    values = dict(plant.DEFAULTS)
+    values.update(inputs or {})
+    values.update(overrides)
+    values = dict(zip(values, [value.reshape(-1) for value in np.broadcast_arrays(
+        *[np.asarray(value, dtype=float) for value in values.values()])]))
+    values['fluegas_massflow'] = values['fuel_in'] * (1 + values['AF'])
+    n = len(values['hp'])
+    flows = np.stack([values[name] for name in UNKNOWNS], axis=1)  # (n, 3)
+
+    # everything that does not depend on the steam flows, once
+    gasTurbine = gt.GasTurbineBatch(values['fuel_in'], values['AF'], values['LHV'], values['P_r'], values['n_t'], values['n_c'],
+                                    values['T_atm'], values['P_atm'], values['cp_gas'], values['k_gas'], False)
+    steamCycle = steam.SteamCycleBatch(values['hp'], values['ip'], values['lp'], values['m1'], values['m2'], values['m3'], values['ma'],
+                                       values['steam_high_temp'], values['water_low_temp'])
+    inlet_temp = gt.ToKelvin(gasTurbine.T[4])
+    h_cold = plant.BuildHRSGBatch(steamCycle, inlet_temp, values['fluegas_massflow'], segments=segments).ColdEnthalpies()
+
+    def HRSG(index, flows):
+        # steam cycle and calculated HRSG of cases `index` (repeats allowed)
+        # with the given steam flows
+        cycle = steamCycle.WithFlows(index, *flows.T)
+        hrsg = plant.BuildHRSGBatch(cycle, inlet_temp[index], values['fluegas_massflow'][index], segments=segments,
+                                    fluegas=flue_gas.HotSide(values['AF'][index]))
+        hrsg.Calculate([h[:, index] for h in h_cold])
+        return cycle, hrsg
+
+    active = np.ones(n, dtype=bool)
+    iterations = 0
+    while iterations < maxiter and active.any():
+        iterations += 1
+        index = np.flatnonzero(active)
+        # base point then one perturbed flow at a time, all in one batch
+        trial = np.repeat(flows[index][None], len(UNKNOWNS) + 1, axis=0)
+        for k in range(len(UNKNOWNS)):
+            trial[k + 1, :, k] += step
+        pinches = _Pinches(HRSG(np.tile(index, len(UNKNOWNS) + 1), trial.reshape(-1, len(UNKNOWNS)))[1]).reshape(len(UNKNOWNS) + 1, len(index), -1)
+        error = pinches[0] - pinch
+        jacobian = np.stack([(pinches[k + 1] - pinches[0]) / step for k in range(len(UNKNOWNS))], axis=2)
+
+        converged = np.all(np.abs(error) <= tol, axis=1)
+        solvable = ~converged & np.all(np.isfinite(error), axis=1) & (np.abs(np.linalg.det(jacobian)) > 1e-300)
+        update = np.zeros_like(error)
+        if solvable.any():
+            update[solvable] = np.linalg.solve(jacobian[solvable], -error[solvable][:, :, None])[:, :, 0]
+        flows[index] += update
+        active[index[converged | ~solvable]] = False
+
+    for k, name in enumerate(UNKNOWNS):
+        values[name] = flows[:, k]
+    cycle, hrsg = HRSG(np.arange(n), flows)
+    residual = _Pinches(hrsg) - pinch
+    converged = np.all(np.abs(residual) <= tol, axis=1)
+    results = plant.ResultsBatch(gasTurbine, cycle, hrsg)
+    feasible = (converged & np.all(flows > 0, axis=1) & (values['m1'] > values['ma']) &
+                (results['min_approach'] >= pinch - tol))
+    return {
+        'inputs': values,
+        'results': results,
+        'converged': converged,
+        'feasible': feasible,
+        'residual': np.max(np.abs(residual), axis=1),
+        'iterations': iterations,
+    }
+
+
+def _Pinches(hrsg):
+    # evaporator pinches (cases, 3) of a calculated HRSGBatch
+    exchangers = {exchanger.name: exchanger for exchanger in hrsg.exchangers}
+    return np.stack([exchangers[name].t['hot out'] - exchangers[name].t['cold in'] for name in EVAPORATORS], axis=1)
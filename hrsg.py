@@ -1,10 +1,14 @@
-import iapws.iapws97 as steam
 import numpy as np
 import csv
 
+import backends
+import instrument
+import states
+
 
 class HeatExchanger:
-    def __init__(self, t_c_in, t_c_out, m_h_in, m_c_in, exchanger_type, operating_pressure, t_h_in=0, quality_in=0, quality_out=1):
+    def __init__(self, t_c_in, t_c_out, m_h_in, m_c_in, exchanger_type, operating_pressure, t_h_in=0, quality_in=0, quality_out=1, properties=None, segments=1,
+                 fluegas=None):
         self.t = {
             'hot in': t_h_in,
             'cold in': t_c_in,
@@ -15,7 +19,7 @@ class HeatExchanger:
             'cold': m_c_in
         }
         self.cp = {
-            'hot': 1.004,
+            'hot': backends.Current().gas_cp,
             'cold': 2.1
         }
         self.h = {}
@@ -23,6 +27,10 @@ class HeatExchanger:
         self.type = exchanger_type  # determine whether economiser, evaporator or superheater
         self.quality_in = quality_in
         self.quality_out = quality_out
+        self.properties = properties  # iapws97 replacement, e.g. property_tables.Load()
+        self.segments = segments  # pieces the temperature profiles are split into
+        # hot side gas, a flue_gas.FlueGas (flue_gas.HotSide(AF)); None for constant cp['hot']
+        self.fluegas = fluegas
 
     def set_h_in(self, t_h_in):
         self.t['hot in'] = t_h_in
@@ -33,26 +41,78 @@ class HeatExchanger:
     def set_name(self, name: str):
         self.name = name
 
-    def Calculate(self):
+    def set_segments(self, segments: int):
+        self.segments = segments
+
+    def Calculate(self, h_profile=None):
+        # h_profile: water/steam enthalpies at the interior segment points, if
+        # already evaluated (HRSG.Calculate does all exchangers together)
+        props = instrument.Properties(*backends.Steam(self.properties))
         if self.type == 'economiser':
             self.cp['cold'] = 4.2
-            self.h['cold in'] = steam._Region1(self.t['cold in'], self.operating_pressure)['h']
-            self.h['cold out'] = steam._Region1(self.t['cold out'], self.operating_pressure)['h']
+            self.h['cold in'] = props._Region1(self.t['cold in'], self.operating_pressure)['h']
+            self.h['cold out'] = props._Region1(self.t['cold out'], self.operating_pressure)['h']
             self.t['hot out'] = self.t['hot in'] - ((self.m['cold']) / (self.m['hot'] * self.cp['hot'])) * (self.h['cold out'] - self.h['cold in'])
         elif self.type == 'superheater':
             self.cp['cold'] = 2.1
-            self.h['cold in'] = steam._Region2(self.t['cold in'], self.operating_pressure)['h']
-            self.h['cold out'] = steam._Region2(self.t['cold out'], self.operating_pressure)['h']
+            self.h['cold in'] = props._Region2(self.t['cold in'], self.operating_pressure)['h']
+            self.h['cold out'] = props._Region2(self.t['cold out'], self.operating_pressure)['h']
             self.t['hot out'] = self.t['hot in'] - ((self.m['cold']) / (self.m['hot'] * self.cp['hot'])) * (self.h['cold out'] - self.h['cold in'])
         elif self.type == 'evaporator':  # liquid-vapor mixture then we need to work out enthalpies
-            self.h['cold in'] = steam._Region4(self.operating_pressure, self.quality_in)['h']
-            self.h['cold out'] = steam._Region4(self.operating_pressure, self.quality_out)['h']
+            self.h['cold in'] = props._Region4(self.operating_pressure, self.quality_in)['h']
+            self.h['cold out'] = props._Region4(self.operating_pressure, self.quality_out)['h']
             self.t['hot out'] = self.t['hot in'] - ((self.m['cold']) / (self.m['hot'] * self.cp['hot'])) * (self.h['cold out'] - self.h['cold in'])
+        if self.fluegas is not None:
+            self.t['hot out'] = HotTemperature(self.fluegas, self.t['hot in'], -self.m['cold'] * (self.h['cold out'] - self.h['cold in']) / self.m['hot'],
+                                               self.t['hot out'])
+            self.cp['hot'] = float(self.fluegas.Cp((self.t['hot in'] + self.t['hot out']) / 2))
         # heat usage
         self.Q = self.m['cold'] * (self.h['cold out'] - self.h['cold in'])
+        self.Discretise(h_profile)
+
+    def ColdProfile(self):
+        # water/steam temperatures at the interior segment points and the
+        # vectorised kernel giving their enthalpies (None if linear in quality)
+        fraction = np.linspace(0, 1, self.segments + 1)[1:-1]
+        t_cold = self.t['cold in'] + fraction * (self.t['cold out'] - self.t['cold in'])
+        if self.type not in ('economiser', 'superheater'):
+            return t_cold, None
+        props = backends.Steam(self.properties)[0]
+        if not hasattr(props, 'Region1'):  # an iapws.iapws97 style module
+            props = backends.Get('iapws').steam
+        return t_cold, props.Region1 if self.type == 'economiser' else props.Region2
+
+    def Discretise(self, h_profile=None):
+        # both streams' temperatures at segments + 1 points evenly spaced in
+        # water/steam temperature (in quality for evaporators), counter flow.
+        # Interior enthalpies come from one vectorised property call. Sets
+        # profile, min_approach and pinch (where the smallest difference is).
+        fraction = np.linspace(0, 1, self.segments + 1)
+        t_cold = self.t['cold in'] + fraction * (self.t['cold out'] - self.t['cold in'])
+        h_cold = self.h['cold in'] + fraction * (self.h['cold out'] - self.h['cold in'])
+        if h_profile is not None:
+            h_cold[1:-1] = h_profile
+        elif self.segments > 1 and self.type in ('economiser', 'superheater'):
+            t_profile, kernel = self.ColdProfile()
+            h_cold[1:-1] = kernel(t_profile, np.full(self.segments - 1, self.operating_pressure), derivatives=False)['h']
+        heat = self.m['cold'] * (h_cold - self.h['cold in'])
+        t_hot = self.t['hot out'] + heat / (self.m['hot'] * self.cp['hot'])
+        if self.fluegas is not None:
+            t_hot = HotTemperature(self.fluegas, self.t['hot out'], heat / self.m['hot'], t_hot)
+        self.profile = {'fraction': fraction, 'heat': heat, 't cold': t_cold, 't hot': t_hot}
+
+        approach = t_hot - t_cold
+        index = int(np.argmin(approach))
+        self.min_approach = approach[index]
+        self.pinch = {'fraction': fraction[index], 'heat': heat[index], 't cold': t_cold[index], 't hot': t_hot[index]}
 
 #TODO
 
+def HotTemperature(fluegas, t, heat, guess=None):
+    # flue gas temperature [K] after heat [kJ/kg] is added to it at t [K]
+    return fluegas.Temperature(fluegas.Enthalpy(t) + heat, t if guess is None else guess)
+
+
 class HRSG:
     # an HRSG is assumed to be a chain of heat exchnagers whose outputs feed into the input of the next exchanger in the array
     def __init__(self, exchanger_list=[], inlet_temp=273):
@@ -67,23 +127,66 @@ class HRSG:
         self.calculated = False
 
     def Calculate(self):
-        self.heatDuty = 0
+        profiles = self._ColdProfiles()
         for index, exchanger in enumerate(self.exchangers):
             if index == 0:  # first exchanger will have hot inlet temp of hrsg nlet temp
                 exchanger.set_h_in(self.inlet_temp)
             else:   # else inlet temp is outlet of previous exchanger
                 inlet = self.exchangers[index-1].t['hot out']
                 exchanger.set_h_in(inlet)
-            exchanger.Calculate()
+            exchanger.Calculate(profiles.get(index))
+        self.Totals()
+
+    def Totals(self):
+        # heat duty, outlet temperature and pinch of already calculated exchangers
+        self.heatDuty = 0
+        for exchanger in self.exchangers:
             self.heatDuty += exchanger.Q
 
         #now we've run calculate on each exchanger it's time to get the output temp of the HRSG
         self.outlet_temp = self.exchangers[-1].t['hot out']
+
+        # smallest flue gas to water/steam temperature difference and where it is
+        pinch = min(self.exchangers, key=lambda exchanger: exchanger.min_approach)
+        self.min_approach = pinch.min_approach
+        self.pinch = dict(pinch.pinch, exchanger=getattr(pinch, 'name', self.exchangers.index(pinch)))
         self.calculated = True
 
+    def set_segments(self, segments: int):
+        # discretise every exchanger into this many segments
+        for exchanger in self.exchangers:
+            exchanger.set_segments(segments)
+        self.calculated = False
+
+    def Result(self):
+        # compact copy of the exchanger ends and totals for keeping many cases
+        exchangers = np.empty(len(self.exchangers), dtype=states.EXCHANGER_DTYPE)
+        for index, exchanger in enumerate(self.exchangers):
+            exchangers[index] = (exchanger.t['hot in'], exchanger.t['hot out'], exchanger.t['cold in'], exchanger.t['cold out'],
+                                 exchanger.m['cold'], exchanger.Q, exchanger.min_approach)
+        return states.HRSGResult(exchangers, self.inlet_temp, self.outlet_temp, self.heatDuty, self.min_approach)
+
+    def _ColdProfiles(self):
+        # interior enthalpy profiles of the discretised economisers and
+        # superheaters, one property call per kernel for the whole HRSG
+        profiles = {}
+        groups = {}
+        for index, exchanger in enumerate(self.exchangers):
+            t_cold, kernel = exchanger.ColdProfile()
+            if kernel is not None and len(t_cold):
+                label = backends.Steam(exchanger.properties)[1]
+                groups.setdefault((kernel, label), []).append((index, t_cold, np.full(len(t_cold), exchanger.operating_pressure)))
+        for (kernel, label), group in groups.items():
+            start = instrument.Start()
+            h = kernel(np.concatenate([t for index, t, P in group]), np.concatenate([P for index, t, P in group]), derivatives=False)['h']
+            instrument.Stop(label + ' ' + kernel.__name__, start)
+            for (index, t, P), profile in zip(group, np.split(h, np.cumsum([len(t) for index, t, P in group])[:-1])):
+                profiles[index] = profile
+        return profiles
+
     def SaveResults(self, hrsg_filename):
         if not self.calculated:
-            print("Unable to save hrsg results as hrsg has not been calculated.\nTry running the Calculate function of the HRSG object")
+            instrument.Print("Unable to save hrsg results as hrsg has not been calculated.\nTry running the Calculate function of the HRSG object")
             return False
         # generate HRSG table
         # HE, FGin, FGout, STEAMin, STEAM,out, Heat Duty
@@ -101,14 +204,14 @@ class HRSG:
                 writer.writerows(hrsgsOutputTableRows)
                 return True
         except IOError:
-            print("I/O error")
+            instrument.Print("I/O error")
             return False
 
 
     def PlotPinchgraph(self, axes, padding=5, title="pinch plot", difference_threshold=50,unit="c"):
         # check calculated
         if not self.calculated:
-            print("Cannot Plot results as HRSG has not been calculated\nPlease run the Calculate method on the HRSG\nE.g. your_hrsg.Calculate()")
+            instrument.Print("Cannot Plot results as HRSG has not been calculated\nPlease run the Calculate method on the HRSG\nE.g. your_hrsg.Calculate()")
 
         # create x axis
         array_of_exchangers = self.exchangers
@@ -138,7 +241,15 @@ class HRSG:
                 axes.text(x[i][0], cold_temps[0] + padding, str(diff_1))
             if diff_2 < difference_threshold:
                 axes.text(x[i][1], cold_temps[1] + padding, str(diff_2))
-            axes.plot(x[i], cold_temps)
+
+            # water/steam curve through the segment points, so a pinch inside
+            # the exchanger shows up (a straight line for one segment)
+            profile = exchanger.profile
+            curve = profile['t cold'] - 273.15 if unit == "c" else profile['t cold']
+            axes.plot(x[i][0] + profile['heat'] / 1000, curve)
+            if 0 < exchanger.pinch['fraction'] < 1 and exchanger.min_approach < difference_threshold:
+                axes.text(x[i][0] + exchanger.pinch['heat'] / 1000, exchanger.pinch['t cold'] - (273.15 if unit == "c" else 0) + padding,
+                          str(np.round(exchanger.min_approach)))
 
         # add flue gas temperature
         x = [0, self.heatDuty / 1000]  # convert to MW
@@ -152,3 +263,161 @@ class HRSG:
         axes.set_xlabel("Heat Consumption [MW]")
         axes.set_ylabel("Temperature [C]" if unit == "c" else "Temperature [K]")
         axes.set_title(title)
+
+
+class HeatExchangerBatch:
+    # HeatExchanger over arrays of operating points. Temperatures, mass flows
+    # and pressures broadcast against each other; t, h and Q hold arrays and the
+    # profile arrays have a leading axis of segments + 1 points.
+
+    def __init__(self, t_c_in, t_c_out, m_h_in, m_c_in, exchanger_type, operating_pressure, t_h_in=0, quality_in=0, quality_out=1, properties=None, segments=1,
+                 fluegas=None):
+        self.t = {
+            'hot in': np.asarray(t_h_in, dtype=float),
+            'cold in': np.asarray(t_c_in, dtype=float),
+            'cold out': np.asarray(t_c_out, dtype=float)
+        }
+        self.m = {
+            'hot': np.asarray(m_h_in, dtype=float),
+            'cold': np.asarray(m_c_in, dtype=float)
+        }
+        self.cp = {
+            'hot': backends.Current().gas_cp
+        }
+        self.h = {}
+        self.operating_pressure = np.asarray(operating_pressure, dtype=float)
+        self.type = exchanger_type
+        self.quality_in = quality_in
+        self.quality_out = quality_out
+        self.properties = properties  # defaults to the current backend's
+        self.segments = segments
+        self.fluegas = fluegas  # as HeatExchanger's, AF broadcasting against the operating points
+
+    def set_h_in(self, t_h_in):
+        self.t['hot in'] = t_h_in
+
+    def set_name(self, name: str):
+        self.name = name
+
+    def set_segments(self, segments: int):
+        self.segments = segments
+
+    def ColdProfile(self, shape=None):
+        # water/steam temperatures at the segment points and the property call
+        # that gives their enthalpies: (t_cold, kernel) where kernel is None for
+        # evaporators, whose enthalpy is linear in quality
+        fraction = np.linspace(0, 1, self.segments + 1).reshape((-1,) + (1,) * len(shape or ()))
+        t_in = np.broadcast_to(self.t['cold in'], shape or np.shape(self.t['cold in']))
+        t_out = np.broadcast_to(self.t['cold out'], shape or np.shape(self.t['cold out']))
+        t_cold = t_in + fraction * (t_out - t_in)
+        props = backends.Steam(self.properties)[0]
+        kernel = {'economiser': props.Region1, 'superheater': props.Region2}.get(self.type)
+        return t_cold, kernel
+
+    def Calculate(self, h_cold=None):
+        # h_cold: water/steam enthalpies at the segment points if already known
+        t_cold, kernel = self.ColdProfile(np.broadcast_shapes(self.t['cold in'].shape, self.t['cold out'].shape, self.operating_pressure.shape))
+        if h_cold is None:
+            if kernel is None:
+                props = instrument.Properties(*backends.Steam(self.properties))
+                liquid, vapour = props.Saturation(self.operating_pressure)
+                h_cold = self.Quality(liquid['h'], vapour['h'])
+            else:
+                start = instrument.Start()
+                h_cold = kernel(t_cold, np.broadcast_to(self.operating_pressure, t_cold.shape), derivatives=False)['h']
+                instrument.Stop(backends.Steam(self.properties)[1] + ' ' + kernel.__name__, start)
+        self.h['cold in'] = h_cold[0]
+        self.h['cold out'] = h_cold[-1]
+        self.t['hot out'] = self.t['hot in'] - (self.m['cold'] / (self.m['hot'] * self.cp['hot'])) * (self.h['cold out'] - self.h['cold in'])
+        if self.fluegas is not None:
+            self.t['hot out'] = HotTemperature(self.fluegas, self.t['hot in'], -self.m['cold'] * (self.h['cold out'] - self.h['cold in']) / self.m['hot'],
+                                               self.t['hot out'])
+            self.cp['hot'] = self.fluegas.Cp((self.t['hot in'] + self.t['hot out']) / 2)
+        self.Q = self.m['cold'] * (self.h['cold out'] - self.h['cold in'])
+
+        heat = self.m['cold'] * (h_cold - self.h['cold in'])
+        t_hot = self.t['hot out'] + heat / (self.m['hot'] * self.cp['hot'])
+        if self.fluegas is not None:
+            t_hot = HotTemperature(self.fluegas, self.t['hot out'], heat / self.m['hot'], t_hot)
+        self.profile = {'heat': heat, 't cold': t_cold, 't hot': t_hot}
+        approach = t_hot - t_cold
+        index = np.argmin(approach, axis=0)[None]
+        self.min_approach = np.take_along_axis(approach, index, axis=0)[0]
+        self.pinch = {
+            'fraction': index[0] / self.segments,
+            'heat': np.take_along_axis(heat, index, axis=0)[0],
+            't cold': np.take_along_axis(t_cold, index, axis=0)[0],
+            't hot': np.take_along_axis(t_hot, index, axis=0)[0],
+        }
+
+    def Quality(self, h_liquid, h_vapour):
+        # evaporator enthalpies at the segment points from the saturation line
+        quality = np.linspace(self.quality_in, self.quality_out, self.segments + 1).reshape((-1,) + (1,) * np.ndim(h_liquid))
+        return h_liquid + quality * (h_vapour - h_liquid)
+
+
+class HRSGBatch:
+    # HRSG chain of HeatExchangerBatch objects, one value per operating point
+
+    def __init__(self, exchanger_list=None, inlet_temp=273):
+        self.exchangers = [] if exchanger_list is None else exchanger_list
+        self.inlet_temp = np.asarray(inlet_temp, dtype=float)
+        self.outlet_temp = None
+        self.calculated = False
+
+    def AddExchanger(self, exchanger: HeatExchangerBatch):
+        self.exchangers.append(exchanger)
+        self.calculated = False
+
+    def set_segments(self, segments: int):
+        for exchanger in self.exchangers:
+            exchanger.set_segments(segments)
+        self.calculated = False
+
+    def Calculate(self, h_cold=None):
+        # h_cold: each exchanger's water/steam enthalpy profile if already
+        # known, as ColdEnthalpies() gives them
+        h_cold = self.ColdEnthalpies() if h_cold is None else h_cold
+        self.heatDuty = 0
+        inlet = self.inlet_temp
+        for exchanger, h in zip(self.exchangers, h_cold):
+            exchanger.set_h_in(inlet)
+            exchanger.Calculate(h)
+            self.heatDuty = self.heatDuty + exchanger.Q
+            inlet = exchanger.t['hot out']
+        self.outlet_temp = inlet
+
+        # smallest approach over all exchangers; pinch['exchanger'] is its index
+        approach = np.stack(np.broadcast_arrays(*[exchanger.min_approach for exchanger in self.exchangers]))
+        index = np.argmin(approach, axis=0)
+        self.min_approach = np.take_along_axis(approach, index[None], axis=0)[0]
+        self.pinch = {'exchanger': index}
+        for key in ('fraction', 'heat', 't cold', 't hot'):
+            values = np.stack(np.broadcast_arrays(*[exchanger.pinch[key] for exchanger in self.exchangers]))
+            self.pinch[key] = np.take_along_axis(values, index[None], axis=0)[0]
+        self.calculated = True
+
+    def ColdEnthalpies(self):
+        # water/steam enthalpy profiles of every exchanger with one property
+        # call per region rather than one per exchanger
+        h_cold = [None] * len(self.exchangers)
+        shape = np.broadcast_shapes(*[np.shape(value) for exchanger in self.exchangers
+                                      for value in (exchanger.t['cold in'], exchanger.t['cold out'], exchanger.operating_pressure)])
+        for exchanger_type in ('economiser', 'superheater', 'evaporator'):
+            group = [index for index, exchanger in enumerate(self.exchangers) if exchanger.type == exchanger_type]
+            if not group:
+                continue
+            props = instrument.Properties(*backends.Steam(self.exchangers[group[0]].properties))
+            if exchanger_type == 'evaporator':
+                P = np.stack([np.broadcast_to(self.exchangers[index].operating_pressure, shape) for index in group])
+                liquid, vapour = props.Saturation(P)
+                for row, index in enumerate(group):
+                    h_cold[index] = self.exchangers[index].Quality(liquid['h'][row], vapour['h'][row])
+                continue
+            T = [self.exchangers[index].ColdProfile(shape)[0] for index in group]
+            P = [np.broadcast_to(self.exchangers[index].operating_pressure, t.shape) for index, t in zip(group, T)]
+            kernel = props.Region1 if exchanger_type == 'economiser' else props.Region2
+            h = kernel(np.concatenate(T), np.concatenate(P), derivatives=False)['h']
+            for index, profile in zip(group, np.split(h, np.cumsum([len(t) for t in T])[:-1])):
+                h_cold[index] = profile
+        return h_cold
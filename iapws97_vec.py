@@ -0,0 +1,399 @@
+import numpy as np
+
+# NumPy-vectorised versions of the iapws.iapws97 kernels used by the steam cycle.
+# Every function takes floats or arrays (broadcast together) and returns arrays,
+# so a whole batch of operating points costs one call instead of one per point.
+# Coefficients are the IAPWS-IF97 tables (same as iapws.iapws97).
+
+R = 0.461526  # kJ/kgK
+Tc = 647.096  # K
+Pc = 22.064  # MPa
+Pmin = 0.000611212677444  # MPa
+
+_BLOCK = 8192  # points per kernel evaluation, see _InBlocks
+
+_Region1_Li = np.array([
+    0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 4, 4, 4,
+    5, 8, 8, 21, 23, 29, 30, 31, 32
+])
+_Region1_Lj = np.array([
+    -2, -1, 0, 1, 2, 3, 4, 5, -9, -7, -1, 0, 1, 3, -3, 0, 1, 3, 17, -4, 0, 6,
+    -5, -2, 10, -8, -11, -6, -29, -31, -38, -39, -40, -41
+])
+_Region1_n = np.array([
+    0.14632971213167, -0.84548187169114, -3.756360367204, 3.3855169168385,
+    -0.95791963387872, 0.15772038513228, -0.016616417199501,
+    0.00081214629983568, 0.00028319080123804, -0.00060706301565874,
+    -0.018990068218419, -0.032529748770505, -0.021841717175414,
+    -5.283835796993e-05, -0.00047184321073267, -0.00030001780793026,
+    4.7661393906987e-05, -4.4141845330846e-06, -7.2694996297594e-16,
+    -3.1679644845054e-05, -2.8270797985312e-06, -8.5205128120103e-10,
+    -2.2425281908e-06, -6.5171222895601e-07, -1.4341729937924e-13,
+    -4.0516996860117e-07, -1.2734301741641e-09, -1.7424871230634e-10,
+    -6.8762131295531e-19, 1.4478307828521e-20, 2.6335781662795e-23,
+    -1.1947622640071e-23, 1.8228094581404e-24, -9.3537087292458e-26
+])
+_Backward1_T_Ps_Li = np.array([
+    0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 4
+])
+_Backward1_T_Ps_Lj = np.array([
+    0, 1, 2, 3, 11, 31, 0, 1, 2, 3, 12, 31, 0, 1, 2, 9, 31, 10, 32, 32
+])
+_Backward1_T_Ps_n = np.array([
+    174.78268058307, 34.806930892873, 6.5292584978455, 0.33039981775489,
+    -1.9281382923196e-07, -2.4909197244573e-23, -0.26107636489332,
+    0.22592965981586, -0.064256463395226, 0.0078876289270526,
+    3.5672110607366e-10, 1.7332496994895e-24, 0.00056608900654837,
+    -0.00032635483139717, 4.4778286690632e-05, -5.1322156908507e-10,
+    -4.2522657042207e-26, 2.6400441360689e-13, 7.8124600459723e-29,
+    -3.0732199903668e-31
+])
+_Region2_Li = np.array([
+    1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 4, 4, 4, 5, 6, 6, 6, 7, 7, 7,
+    8, 8, 9, 10, 10, 10, 16, 16, 18, 20, 20, 20, 21, 22, 23, 24, 24, 24
+])
+_Region2_Lj = np.array([
+    0, 1, 2, 3, 6, 1, 2, 4, 7, 36, 0, 1, 3, 6, 35, 1, 2, 3, 7, 3, 16, 35, 0,
+    11, 25, 8, 36, 13, 4, 10, 14, 29, 50, 57, 20, 35, 48, 21, 53, 39, 26, 40,
+    58
+])
+_Region2_n = np.array([
+    -0.0017731742473213, -0.017834862292358, -0.045996013696365,
+    -0.057581259083432, -0.05032527872793, -3.3032641670203e-05,
+    -0.00018948987516315, -0.0039392777243355, -0.043797295650573,
+    -2.6674547914087e-05, 2.0481737692309e-08, 4.3870667284435e-07,
+    -3.227767723857e-05, -0.0015033924542148, -0.040668253562649,
+    -7.8847309559367e-10, 1.2790717852285e-08, 4.8225372718507e-07,
+    2.2922076337661e-06, -1.6714766451061e-11, -0.0021171472321355,
+    -23.895741934104, -5.905956432427e-18, -1.2621808899101e-06,
+    -0.038946842435739, 1.1256211360459e-11, -8.2311340897998,
+    1.9809712802088e-08, 1.0406965210174e-19, -1.0234747095929e-13,
+    -1.0018179379511e-09, -8.0882908646985e-11, 0.10693031879409,
+    -0.33662250574171, 8.9185845355421e-25, 3.0629316876232e-13,
+    -4.2002467698208e-06, -5.9056029685639e-26, 3.7826947613457e-06,
+    -1.2768608934681e-15, 7.3087610595061e-29, 5.5414715350778e-17,
+    -9.436970724121e-07
+])
+_Region2_cp0_Jo = np.array([
+    0, 1, -5, -4, -3, -2, -1, 2, 3
+])
+_Region2_cp0_no = np.array([
+    -9.6927686500217, 10.086655968018, -0.005608791128302, 0.071452738081455,
+    -0.40710498223928, 1.4240819171444, -4.383951131945, -0.28408632460772,
+    0.021268463753307
+])
+_Backward2a_T_Ps_Li = np.array([
+    -1.5, -1.5, -1.5, -1.5, -1.5, -1.5, -1.25, -1.25, -1.25, -1.0, -1.0, -1.0,
+    -1.0, -1.0, -1.0, -0.75, -0.75, -0.5, -0.5, -0.5, -0.5, -0.25, -0.25,
+    -0.25, -0.25, 0.25, 0.25, 0.25, 0.25, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5,
+    0.75, 0.75, 0.75, 0.75, 1.0, 1.0, 1.25, 1.25, 1.5, 1.5
+])
+_Backward2a_T_Ps_Lj = np.array([
+    -24, -23, -19, -13, -11, -10, -19, -15, -6, -26, -21, -17, -16, -9, -8,
+    -15, -14, -26, -13, -9, -7, -27, -25, -11, -6, 1, 4, 8, 11, 0, 1, 5, 6,
+    10, 14, 16, 0, 4, 9, 17, 7, 18, 3, 15, 5, 18
+])
+_Backward2a_T_Ps_n = np.array([
+    -392359.83861984, 515265.7382727, 40482.443161048, -321.93790923902,
+    96.961424218694, -22.867846371773, -449429.14124357, -5011.8336020166,
+    0.35684463560015, 44235.33584819, -13673.388811708, 421632.60207864,
+    22516.925837475, 474.42144865646, -149.31130797647, -197811.26320452,
+    -23554.39947076, -19070.616302076, 55375.669883164, 3829.3691437363,
+    -603.91860580567, 1936.3102620331, 4266.064369861, -5978.0638872718,
+    -704.01463926862, 338.36784107553, 20.862786635187, 0.033834172656196,
+    -4.3124428414893e-05, 166.53791356412, -139.86292055898,
+    -0.78849547999872, 0.072132411753872, -0.0059754839398283,
+    -1.2141358953904e-05, 2.3227096733871e-07, -10.538463566194,
+    2.0718925496502, -0.072193155260427, 2.074988708112e-07,
+    -0.018340657911379, 2.9036272348696e-07, 0.21037527893619,
+    0.00025681239729999, -0.012799002933781, -8.2198102652018e-06
+])
+_Backward2b_T_Ps_Li = np.array([
+    -6, -6, -5, -5, -4, -4, -4, -3, -3, -3, -3, -2, -2, -2, -2, -1, -1, -1,
+    -1, -1, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 5,
+    5, 5
+])
+_Backward2b_T_Ps_Lj = np.array([
+    0, 11, 0, 11, 0, 1, 11, 0, 1, 11, 12, 0, 1, 6, 10, 0, 1, 5, 8, 9, 0, 1, 2,
+    4, 5, 6, 9, 0, 1, 2, 3, 7, 8, 0, 1, 5, 0, 1, 3, 0, 1, 0, 1, 2
+])
+_Backward2b_T_Ps_n = np.array([
+    316876.65083497, 20.864175881858, -398593.99803599, -21.816058518877,
+    223697.85194242, -2784.1703445817, 9.920743607148, -75197.512299157,
+    2970.8605951158, -3.4406878548526, 0.38815564249115, 17511.29508575,
+    -1423.7112854449, 1.0943803364167, 0.89971619308495, -3375.9740098958,
+    471.62885818355, -1.9188241993679, 0.41078580492196, -0.33465378172097,
+    1387.0034777505, -406.63326195838, 41.72734715961, 2.1932549434532,
+    -1.0320050009077, 0.35882943516703, 0.0052511453726066, 12.838916450705,
+    -2.8642437219381, 0.56912683664855, -0.099962954584931,
+    -0.0032632037778459, 0.00023320922576723, -0.1533480985745,
+    0.029072288239902, 0.00037534702741167, 0.0017296691702411,
+    -0.00038556050844504, -3.5017712292608e-05, -1.4566393631492e-05,
+    5.6420857267269e-06, 4.1286150074605e-08, -2.0684671118824e-08,
+    1.6409393674725e-09
+])
+_Backward2c_T_Ps_Li = np.array([
+    -2, -2, -1, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4, 5, 5, 5, 6,
+    6, 7, 7, 7, 7, 7
+])
+_Backward2c_T_Ps_Lj = np.array([
+    0, 1, 0, 0, 1, 2, 3, 0, 1, 3, 4, 0, 1, 2, 0, 1, 5, 0, 1, 4, 0, 1, 2, 0, 1,
+    0, 1, 3, 4, 5
+])
+_Backward2c_T_Ps_n = np.array([
+    909.68501005365, 2404.566708842, -591.6232638713, 541.45404128074,
+    -270.98308411192, 979.76525097926, -469.66772959435, 14.399274604723,
+    -19.104204230429, 5.3299167111971, -21.252975375934, -0.3114733441376,
+    0.60334840894623, -0.042764839702509, 0.0058185597255259,
+    -0.014597008284753, 0.0056631175631027, -7.6155864584577e-05,
+    0.00022440342919332, -1.2561095013413e-05, 6.3323132660934e-07,
+    -2.0541989675375e-06, 3.6405370390082e-08, -2.9759897789215e-09,
+    1.0136618529763e-08, 5.9925719692351e-12, -2.0677870105164e-11,
+    -2.0874278181886e-11, 1.0162166825089e-10, -1.6429828281347e-10
+])
+
+
+_Sat_n = (0, 0.11670521452767E+04, -0.72421316703206E+06, -0.17073846940092E+02,
+          0.12020824702470E+05, -0.32325550322333E+07, 0.14915108613530E+02,
+          -0.48232657361591E+04, 0.40511340542057E+06, -0.23855557567849E+00,
+          0.65017534844798E+03)
+
+
+class _Polynomial:
+    # sum(n * x**I * y**J) regrouped as sum_i x**i * (M @ y**J)[i] so that the
+    # bulk of the work is one small matrix product per batch instead of a pow()
+    # per term and point. J must be integers, I integer multiples of step_i.
+
+    def __init__(self, n, I, J, step_i=1):
+        self.step_i = step_i
+        I = np.rint(np.asarray(I) / step_i).astype(int)
+        self.I, i = np.unique(I, return_inverse=True)
+        self.J, j = np.unique(np.asarray(J, dtype=int), return_inverse=True)
+        self.M = np.zeros((len(self.I), len(self.J)))
+        np.add.at(self.M, (i, j), n)
+        # scaled copies for d/dy and d2/dy2
+        self.M_y = self.M * self.J
+        self.M_yy = self.M_y * (self.J - 1)
+
+    def Powers(self, x, y):
+        if self.step_i != 1:
+            x = x ** self.step_i
+        return _Powers(x, self.I), _Powers(y, self.J)
+
+    def __call__(self, x, y):
+        x_i, y_j = self.Powers(x, y)
+        return np.einsum('ij,ij->j', x_i, self.M @ y_j)
+
+
+def _Powers(base, exponents):
+    # base ** exponents for sorted integer exponents as a (terms, points) array,
+    # built by a running product over the exponent range
+    low = exponents[0]
+    table = np.empty((exponents[-1] - low + 1, len(base)))
+    table[0] = base ** low
+    for row in range(1, len(table)):
+        np.multiply(table[row - 1], base, out=table[row])
+    return table[exponents - low]
+
+
+def _InBlocks(kernel, T, P, derivatives):
+    # the power tables are (terms, points); past a few thousand points they
+    # fall out of cache, so long inputs are evaluated block by block
+    if len(T) <= _BLOCK:
+        return kernel(T, P, derivatives)
+    blocks = [kernel(T[i:i + _BLOCK], P[i:i + _BLOCK], derivatives) for i in range(0, len(T), _BLOCK)]
+    return {key: np.concatenate([block[key] for block in blocks]) for key in blocks[0]}
+
+
+def _Flat(*values):
+    # broadcast inputs together and flatten them, keeping the shape to restore
+    values = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in values])
+    return values[0].shape, [value.reshape(-1) for value in values]
+
+
+_Region1_poly = _Polynomial(_Region1_n, _Region1_Li, _Region1_Lj)
+_Region2_poly = _Polynomial(_Region2_n, _Region2_Li, _Region2_Lj)
+_Region2_ideal_poly = _Polynomial(_Region2_cp0_no, np.zeros(len(_Region2_cp0_Jo)), _Region2_cp0_Jo)
+_Backward1_T_Ps_poly = _Polynomial(_Backward1_T_Ps_n, _Backward1_T_Ps_Li, _Backward1_T_Ps_Lj)
+_Backward2a_T_Ps_poly = _Polynomial(_Backward2a_T_Ps_n, _Backward2a_T_Ps_Li, _Backward2a_T_Ps_Lj, step_i=0.25)
+_Backward2b_T_Ps_poly = _Polynomial(_Backward2b_T_Ps_n, _Backward2b_T_Ps_Li, _Backward2b_T_Ps_Lj)
+_Backward2c_T_Ps_poly = _Polynomial(_Backward2c_T_Ps_n, _Backward2c_T_Ps_Li, _Backward2c_T_Ps_Lj)
+
+
+def PSat_T(T):
+    T = np.asarray(T, dtype=float)
+    n = _Sat_n
+    tita = T + n[9] / (T - n[10])
+    A = tita ** 2 + n[1] * tita + n[2]
+    B = n[3] * tita ** 2 + n[4] * tita + n[5]
+    C = n[6] * tita ** 2 + n[7] * tita + n[8]
+    return (2 * C / (-B + np.sqrt(B ** 2 - 4 * A * C))) ** 4
+
+
+def TSat_P(P):
+    P = np.asarray(P, dtype=float)
+    n = _Sat_n
+    beta = P ** 0.25
+    E = beta ** 2 + n[3] * beta + n[6]
+    F = n[1] * beta ** 2 + n[4] * beta + n[7]
+    G = n[2] * beta ** 2 + n[5] * beta + n[8]
+    D = 2 * G / (-F - np.sqrt(F ** 2 - 4 * E * G))
+    return (n[10] + D - np.sqrt((n[10] + D) ** 2 - 4 * (n[9] + n[10] * D))) / 2
+
+
+def Region1(T, P, derivatives=True):
+    # T, P, v, h and s like iapws97._Region1, plus cp and alfav unless
+    # derivatives is False (they cost two more polynomial sums)
+    shape, (T, P) = _Flat(T, P)
+    props = _InBlocks(_Region1Block, T, P, derivatives)
+    return {key: value.reshape(shape) for key, value in props.items()}
+
+
+def _Region1Block(T, P, derivatives):
+    P = np.maximum(P, Pmin)
+
+    Tr = 1386 / T
+    Pr = P / 16.53
+    pi = 7.1 - Pr
+    tau = Tr - 1.222
+    poly = _Region1_poly
+    pi_i, tau_j = poly.Powers(pi, tau)
+    dpi_i = poly.I[:, None] * pi_i / pi  # d(pi**i)/dpi
+    A = poly.M @ tau_j
+    A_t = poly.M_y @ (tau_j / tau)
+
+    g = np.einsum('ij,ij->j', pi_i, A)
+    gp = -np.einsum('ij,ij->j', dpi_i, A)
+    gt = np.einsum('ij,ij->j', pi_i, A_t)
+
+    props = {
+        'T': T,
+        'P': P,
+        'v': Pr * gp * R * T / P / 1000,
+        'h': Tr * gt * R * T,
+        's': R * (Tr * gt - g),
+        'region': np.full(T.shape, 1),
+        'x': np.zeros(T.shape),
+    }
+    if derivatives:
+        gtt = np.einsum('ij,ij->j', pi_i, poly.M_yy @ (tau_j / tau ** 2))
+        gpt = -np.einsum('ij,ij->j', dpi_i, A_t)
+        props['cp'] = -R * Tr ** 2 * gtt
+        props['alfav'] = (1 - Tr * gpt / gp) / T
+    return props
+
+
+def Region2(T, P, derivatives=True):
+    # T, P, v, h and s like iapws97._Region2, plus cp and alfav unless
+    # derivatives is False
+    shape, (T, P) = _Flat(T, P)
+    props = _InBlocks(_Region2Block, T, P, derivatives)
+    return {key: value.reshape(shape) for key, value in props.items()}
+
+
+def _Region2Block(T, P, derivatives):
+    P = np.maximum(P, Pmin)
+
+    Tr = 540 / T
+    Pr = P
+
+    # ideal gas part
+    ideal = _Region2_ideal_poly
+    Tr_o = _Powers(Tr, ideal.J)
+    no = ideal.M[0]
+    go = np.log(Pr) + no @ Tr_o
+    got = ideal.M_y[0] @ (Tr_o / Tr)
+    gop = 1 / Pr
+
+    # residual part
+    poly = _Region2_poly
+    tau = Tr - 0.5
+    pi_i, tau_j = poly.Powers(Pr, tau)
+    A = poly.M @ tau_j
+    A_t = poly.M_y @ (tau_j / tau)
+    dpi_i = poly.I[:, None] * pi_i / Pr
+
+    gr = np.einsum('ij,ij->j', pi_i, A)
+    grp = np.einsum('ij,ij->j', dpi_i, A)
+    grt = np.einsum('ij,ij->j', pi_i, A_t)
+
+    props = {
+        'T': T,
+        'P': P,
+        'v': Pr * (gop + grp) * R * T / P / 1000,
+        'h': Tr * (got + grt) * R * T,
+        's': R * (Tr * (got + grt) - (go + gr)),
+        'region': np.full(T.shape, 2),
+        'x': np.ones(T.shape),
+    }
+    if derivatives:
+        gott = ideal.M_yy[0] @ (Tr_o / Tr ** 2)
+        grtt = np.einsum('ij,ij->j', pi_i, poly.M_yy @ (tau_j / tau ** 2))
+        grpt = np.einsum('ij,ij->j', dpi_i, A_t)
+        props['cp'] = -R * Tr ** 2 * (gott + grtt)
+        props['alfav'] = (1 + Pr * grp - Tr * Pr * grpt) / (1 + Pr * grp) / T
+    return props
+
+
+def Saturation(P):
+    # saturated liquid and vapour at P as two region-style dicts (T, P, v, h, s).
+    # Points above 623.15 K need region 3 and are handed to iapws one by one.
+    shape, (P,) = _Flat(P)
+    T = TSat_P(P)
+    liquid = Region1(T, P, derivatives=False)
+    vapour = Region2(T, P, derivatives=False)
+
+    region3 = np.nonzero(T > 623.15)[0]
+    if len(region3):
+        import iapws.iapws97 as steam
+        for i in region3:
+            for x, props in ((0, liquid), (1, vapour)):
+                exact = steam._Region4(P[i], x)
+                for key in ('v', 'h', 's'):
+                    props[key][i] = exact[key]
+    return ({key: value.reshape(shape) for key, value in liquid.items()},
+            {key: value.reshape(shape) for key, value in vapour.items()})
+
+
+def Region4(P, x):
+    # T, P, x, v, h and s of a saturated mixture like iapws97._Region4
+    shape, (P, x) = _Flat(P, x)
+    liquid, vapour = Saturation(P)
+    props = {
+        'T': liquid['T'],
+        'P': P,
+        'v': liquid['v'] + x * (vapour['v'] - liquid['v']),
+        'h': liquid['h'] + x * (vapour['h'] - liquid['h']),
+        's': liquid['s'] + x * (vapour['s'] - liquid['s']),
+        'region': np.full(P.shape, 4),
+        'x': x,
+    }
+    return {key: value.reshape(shape) for key, value in props.items()}
+
+
+def Backward1_T_Ps(P, s):
+    shape, (P, s) = _Flat(P, s)
+    return _Backward1_T_Ps_poly(P, s + 2).reshape(shape)
+
+
+def Backward2_T_Ps(P, s, clamp=True):
+    # clamp=False skips the final max() with the saturation temperature
+    shape, (P, s) = _Flat(P, s)
+    T = np.empty(P.shape)
+
+    # sub-region 2a below 4 MPa, 2b/2c split on the s = 5.85 kJ/kgK line
+    a = P <= 4
+    b = ~a & (s >= 5.85)
+    c = ~a & ~b
+    if a.any():
+        T[a] = _Backward2a_T_Ps_poly(P[a], s[a] / 2 - 2)
+    if b.any():
+        T[b] = _Backward2b_T_Ps_poly(P[b], 10 - s[b] / 0.7853)
+    if c.any():
+        T[c] = _Backward2c_T_Ps_poly(P[c], 2 - s[c] / 2.9251)
+
+    # never return a temperature below saturation
+    if clamp:
+        sub = P <= Pc
+        T[sub] = np.maximum(T[sub], TSat_P(P[sub]))
+    return T.reshape(shape)
@@ -0,0 +1,170 @@
+import contextlib
+import json
+import re
+import time
+
+# Console output, call counts and stage timings for the models.
+#
+#     instrument.Enable()
+#     plant.Plant()
+#     instrument.Profile()          # {'stages': ..., 'calls': ..., 'regions': ...}
+#     instrument.SaveProfile('profile')
+#
+#     with instrument.Quiet():      # no console output from the models
+#         sweep.Sweep(...)
+#
+# Disabled by default. Then Stage() hands back one shared do-nothing context
+# and Properties() returns the property module itself, so instrumented code
+# costs an attribute check per call site. When enabled:
+#     stages   wall time of each named stage (gas turbine, steam cycle, HRSG,
+#              plotting ...), with how many times it ran
+#     calls    every IAPWS-97 function called through Properties() ('iapws
+#              _Region1', 'coolprop Region2' ...) and air property call
+#              ('iapws air'), under the property backend's name, counted and
+#              timed
+#     regions  each backend's steam calls summed by IAPWS-97 region ('iapws
+#              region 1', 'approximate region 4' ...)
+# Times are seconds. Nested stages are each timed in full.
+
+enabled = False
+quiet = False
+
+_stages = {}  # name -> [count, seconds]
+_calls = {}
+
+_OFF = contextlib.nullcontext()
+
+LABELS = ('iapws', 'coolprop', 'approximate')  # the property backends' call prefixes, backends.BACKENDS
+
+
+def Enable(on=True):
+    global enabled
+    enabled = on
+
+
+def Reset():
+    # clear the counts and timings
+    _stages.clear()
+    _calls.clear()
+
+
+def Print(*args):
+    # print unless in quiet mode
+    if not quiet:
+        print(*args)
+
+
+@contextlib.contextmanager
+def Quiet(on=True):
+    # quiet mode for the duration of a with block
+    global quiet
+    previous = quiet
+    quiet = on
+    try:
+        yield
+    finally:
+        quiet = previous
+
+
+def Stage(name):
+    # with instrument.Stage('steam cycle'): ... times the block when enabled
+    return _Stage(name) if enabled else _OFF
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exception):
+        Record(_stages, self.name, time.perf_counter() - self.start)
+
+
+def Start():
+    # start time for Stop, None when disabled
+    return time.perf_counter() if enabled else None
+
+
+def Stop(name, start):
+    # count and time one call that began at Start()
+    if start is not None:
+        Record(_calls, name, time.perf_counter() - start)
+
+
+def Record(table, name, seconds):
+    entry = table.get(name)
+    if entry is None:
+        table[name] = [1, seconds]
+    else:
+        entry[0] += 1
+        entry[1] += seconds
+
+
+def Properties(properties, label='iapws'):
+    # the property module (iapws.iapws97, iapws97_vec, property_tables ...) with
+    # its functions counted and timed when enabled
+    return _CountedProperties(properties, label) if enabled else properties
+
+
+class _CountedProperties:
+
+    def __init__(self, properties, label):
+        self._properties = properties
+        self._label = label
+
+    def __getattr__(self, name):
+        function = getattr(self._properties, name)
+        if not callable(function):
+            return function
+        key = self._label + ' ' + name
+
+        def Counted(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                Record(_calls, key, time.perf_counter() - start)
+        return Counted
+
+
+def Region(name):
+    # IAPWS-97 region of a property function, from its name: _Region1,
+    # Backward2_T_Ps ... Saturation functions are region 4.
+    digits = re.search(r'(Region|Backward)(\d)', name)
+    return digits.group(2) if digits else '4'
+
+
+def Profile():
+    # the counts and timings so far as plain dicts and numbers
+    regions = {}
+    for name, (count, seconds) in _calls.items():
+        label, _, function = name.partition(' ')
+        if label in LABELS and function != 'air':
+            entry = regions.setdefault(label + ' region ' + Region(function), [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+    return {
+        'enabled': enabled,
+        'stages': _Table(_stages),
+        'calls': _Table(_calls),
+        'regions': _Table(regions),
+    }
+
+
+def _Table(table):
+    return {name: {'count': count, 'seconds': seconds} for name, (count, seconds) in sorted(table.items())}
+
+
+def SaveProfile(filename):
+    # Profile() as filename.json
+    try:
+        with open(filename + ".json", 'w') as f:
+            json.dump(Profile(), f, indent=1)
+        return True
+    except IOError:
+        Print("I/O error")
+        return False
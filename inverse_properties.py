@@ -0,0 +1,181 @@
+import numpy as np
+
+import iapws97_vec as iapws
+import instrument
+
+# Inverse IAPWS-97 property functions for regions 1 and 2:
+#     PFromTS(T, s)  TFromPH(P, h)  TFromPS(P, s)  PFromTH(T, h)
+# Units follow iapws97: T [K], P [MPa], h [kJ/kg], s [kJ/kgK].
+#
+# Each is a safeguarded Newton iteration on the forward equation using its
+# analytic derivative (cp, v and the expansion coefficient come out of the same
+# kernel call). The root is kept bracketed between the region limits and any
+# Newton step leaving the bracket is replaced by bisection, so the iteration
+# always converges; from the default starting points it reaches rtol = 1e-9 in
+# 2-5 iterations. Inputs may be floats or arrays (solved together, each point
+# stopping when it converges). `guess` warm-starts the iteration, e.g. from the
+# previous solution in a sweep. Points that do not converge within maxiter
+# come back as nan, or as the last iterate with last=True. Nothing is printed
+# unless verbose is True.
+#
+# All four are monotonic except PFromTH in region 1: above about 500 K h(P) at
+# constant T has a turning point, so a liquid enthalpy can have two pressures.
+# The solver then returns whichever root the bracket holds (or nan), so pass a
+# guess near the wanted branch.
+
+Tmin = 273.15  # K
+T13 = 623.15  # K, region 1/3 boundary
+Tmax = 1073.15  # K
+Pmax = 100  # MPa
+
+
+def P23_T(T):
+    # region 2/3 boundary pressure [MPa] for 623.15 K <= T <= 863.15 K
+    return 0.34805185628969e3 - 0.11671859879975e1 * T + 0.10192970039326e-2 * T ** 2
+
+
+def PFromTS(T, s, region=2, guess=None, rtol=1e-9, maxiter=50, verbose=False, last=False):
+    T, s = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(s, dtype=float))
+    low, high = _PressureLimits(T, region)
+    if guess is None:
+        # region 2: ideal gas scaling from the lower limit, s ~ s0 - R ln(P / P0);
+        # region 1: entropy barely depends on pressure, start mid-bracket in ln P
+        if region == 2:
+            s0 = iapws.Region2(T, low, derivatives=False)['s']
+            guess = low * np.exp((s0 - s) / iapws.R)
+        else:
+            guess = np.sqrt(low * high)
+
+    kernel = _Kernel(region)
+
+    def Evaluate(P, index):
+        props = kernel(T.reshape(-1)[index], P)
+        # (ds/dP)_T = -(dv/dT)_P, with 1 MPa m3 = 1000 kJ
+        return props['s'], -1000 * props['v'] * props['alfav']
+
+    return _Solve(Evaluate, s, guess, low, high, rtol, maxiter, verbose, "PFromTS", last)
+
+
+def PFromTH(T, h, region=1, guess=None, rtol=1e-9, maxiter=50, verbose=False, last=False):
+    T, h = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(h, dtype=float))
+    low, high = _PressureLimits(T, region)
+    if guess is None:
+        guess = np.sqrt(low * high)
+
+    kernel = _Kernel(region)
+
+    def Evaluate(P, index):
+        props = kernel(T.reshape(-1)[index], P)
+        # (dh/dP)_T = v - T (dv/dT)_P
+        return props['h'], 1000 * props['v'] * (1 - props['T'] * props['alfav'])
+
+    return _Solve(Evaluate, h, guess, low, high, rtol, maxiter, verbose, "PFromTH", last)
+
+
+def TFromPH(P, h, region=1, guess=None, rtol=1e-9, maxiter=50, verbose=False, last=False):
+    P, h = np.broadcast_arrays(np.asarray(P, dtype=float), np.asarray(h, dtype=float))
+    low, high = _TemperatureLimits(P, region)
+    if guess is None:
+        # one secant step across the bracket; h(T) is close to linear
+        kernel = _Kernel(region)
+        h_low = kernel(low, P)['h']
+        h_high = kernel(high, P)['h']
+        guess = low + (high - low) * (h - h_low) / (h_high - h_low)
+
+    kernel = _Kernel(region)
+
+    def Evaluate(T, index):
+        props = kernel(T, P.reshape(-1)[index])
+        return props['h'], props['cp']
+
+    return _Solve(Evaluate, h, guess, low, high, rtol, maxiter, verbose, "TFromPH", last)
+
+
+def TFromPS(P, s, region=1, guess=None, rtol=1e-9, maxiter=50, verbose=False, last=False):
+    P, s = np.broadcast_arrays(np.asarray(P, dtype=float), np.asarray(s, dtype=float))
+    low, high = _TemperatureLimits(P, region)
+    if guess is None:
+        # the IF97 backward equation is within a few mK of the answer
+        backward = iapws.Backward1_T_Ps if region == 1 else iapws.Backward2_T_Ps
+        guess = backward(P, s)
+
+    kernel = _Kernel(region)
+
+    def Evaluate(T, index):
+        props = kernel(T, P.reshape(-1)[index])
+        return props['s'], props['cp'] / T
+
+    return _Solve(Evaluate, s, guess, low, high, rtol, maxiter, verbose, "TFromPS", last)
+
+
+def _Kernel(region):
+    if region == 1:
+        return iapws.Region1
+    if region == 2:
+        return iapws.Region2
+    raise ValueError("Inverse properties are only available for regions 1 and 2, not " + str(region))
+
+
+def _PressureLimits(T, region):
+    # pressure range of the region at each temperature
+    below_13 = np.minimum(T, iapws.Tc)
+    saturation = np.where(T <= iapws.Tc, iapws.PSat_T(below_13), Pmax)
+    if region == 1:
+        return np.maximum(saturation, iapws.Pmin), np.full(T.shape, float(Pmax))
+    boundary = np.where(T <= T13, saturation, np.minimum(P23_T(T), Pmax))
+    return np.full(T.shape, iapws.Pmin), boundary
+
+
+def _TemperatureLimits(P, region):
+    # temperature range of the region at each pressure
+    saturation = np.where(P <= iapws.Pc, iapws.TSat_P(np.minimum(P, iapws.Pc)), T13)
+    if region == 1:
+        return np.full(P.shape, Tmin), np.minimum(saturation, T13)
+    return np.maximum(saturation, Tmin), np.full(P.shape, Tmax)
+
+
+def _Solve(evaluate, target, guess, low, high, rtol, maxiter, verbose, name, last=False):
+    # Safeguarded Newton on evaluate(x)[0] = target for monotonic functions.
+    # last: give unconverged points their last iterate instead of nan.
+    # evaluate(x, index) gets only the unconverged points, selected by index.
+    shape = np.shape(target)
+    target = np.asarray(target, dtype=float).reshape(-1)
+    low = np.array(np.broadcast_to(np.ravel(low), target.shape), dtype=float)
+    high = np.array(np.broadcast_to(np.ravel(high), target.shape), dtype=float)
+    x = np.clip(np.broadcast_to(np.ravel(guess).astype(float), target.shape), low, high)
+    result = np.full(target.shape, np.nan)
+    start = instrument.Start()
+
+    active = np.arange(len(target))
+    for iteration in range(1, maxiter + 1):
+        value, slope = evaluate(x, active)
+        f = value - target[active]
+
+        # root lies on the side the function has to move towards
+        above = f * slope > 0
+        high[active] = np.where(above, x, high[active])
+        low[active] = np.where(above, low[active], x)
+
+        step = np.where(slope != 0, f / np.where(slope != 0, slope, 1), np.inf)
+        new = x - step
+        outside = ~((new >= low[active]) & (new <= high[active]))
+        new = np.where(outside, 0.5 * (low[active] + high[active]), new)
+
+        # only an accepted Newton step counts as converged, so a bracket that
+        # collapses onto a region limit (target out of range) ends up as nan
+        done = (f == 0) | (~outside & (np.abs(new - x) <= rtol * np.abs(x)))
+        result[active[done]] = np.where(f[done] == 0, x[done], new[done])
+        if verbose:
+            instrument.Print(name + " iteration " + str(iteration) + ": " + str(np.count_nonzero(~done)) + " unconverged, largest residual " + str(np.max(np.abs(f))))
+
+        active = active[~done]
+        x = new[~done]
+        if len(active) == 0:
+            break
+
+    instrument.Stop('solve ' + name, start)
+    if last:
+        result[active] = x
+    if verbose and len(active):
+        instrument.Print(name + ": " + str(len(active)) + " points did not converge in " + str(maxiter) + " iterations")
+    return float(result[0]) if shape == () else result.reshape(shape)
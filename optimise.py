@@ -0,0 +1,154 @@
+import concurrent.futures
+
+import numpy as np
+
+import plant
+import sweep
+
+# Constrained design optimisation of the combined cycle.
+#
+#     best = optimise.Optimise('net_work', min_approach=10, stack_temp=70)
+#     best.inputs, best.results
+#
+# Maximises a plant.RESULTS column (net work or overall efficiency) over the
+# pressure levels and steam mass flows, subject to every HRSG exchanger keeping
+# at least min_approach K between flue gas and water/steam at both ends, and
+# the flue gas leaving the HRSG at no less than stack_temp C.
+#
+# The search is differential evolution (rand/1/bin) with feasibility rules for
+# the constraints: a feasible point beats an infeasible one, two infeasible
+# points compare by how far they break the constraints. Each generation's
+# trial points are evaluated together with plant.EvaluatePlantBatch, split over
+# worker processes if workers > 1, and points seen before come from a cache.
+
+# search range of each variable, bar and kg/s
+BOUNDS = {
+    'hp': (100, 165),  # drums stay below IAPWS region 3
+    'ip': (6, 20),
+    'lp': (2, 6),
+    'm1': (40, 70),  # LP steam has to cover the amine plant take-off (ma)
+    'm2': (2, 20),
+    'm3': (30, 70),
+}
+
+OBJECTIVES = ('net_work', 'overall_efficiency')
+
+
+class OptimisationResult:
+
+    def __init__(self, objective, inputs, results, feasible, violation, evaluations, cache_hits, generations, history):
+        self.objective = objective
+        self.inputs = inputs  # variables and fixed inputs of the best point
+        self.results = results  # plant.RESULTS at the best point
+        self.value = results[objective]
+        self.feasible = feasible
+        self.violation = violation  # K by which the constraints are broken, 0 if feasible
+        self.evaluations = evaluations  # plant evaluations actually run
+        self.cache_hits = cache_hits
+        self.generations = generations
+        self.history = history  # best objective value after each generation
+
+
+class _Evaluator:
+    # cached batch evaluation of rows of the optimisation variables
+
+    def __init__(self, names, fixed, workers, executor, segments):
+        self.names = tuple(names) + tuple(fixed)
+        self.fixed = np.array(list(fixed.values()), dtype=float)
+        self.workers = workers
+        self.executor = executor
+        self.segments = segments
+        self.cache = {}
+        self.evaluations = 0
+        self.hits = 0
+
+    def __call__(self, X):
+        keys = [tuple(row) for row in X.tolist()]
+        missing = list(dict.fromkeys(key for key in keys if key not in self.cache))
+        self.hits += len(keys) - len(missing)
+        if missing:
+            rows = np.hstack([np.array(missing), np.tile(self.fixed, (len(missing), 1))])
+            table = sweep.Sweep((self.names, rows), workers=self.workers, batch=True, executor=self.executor, segments=self.segments)
+            results = np.stack([table[name] for name in plant.RESULTS], axis=1)
+            self.cache.update(zip(missing, results))
+            self.evaluations += len(missing)
+        return np.array([self.cache[key] for key in keys])
+
+
+def Optimise(objective='net_work', bounds=None, fixed=None, min_approach=10, stack_temp=70, population=30, generations=300,
+             tol=1e-6, mutation=0.5, crossover=0.9, seed=0, workers=1, progress=None, segments=1):
+    # objective: column of plant.RESULTS to maximise, normally one of OBJECTIVES.
+    # bounds: {input: (low, high)} of the variables, default BOUNDS. Any
+    #   plant.DEFAULTS input can be a variable.
+    # fixed: {input: value} for other plant inputs, the rest are plant.DEFAULTS.
+    # min_approach: K. stack_temp: lowest HRSG flue gas outlet temperature, C.
+    # segments: exchanger discretisation for the approach constraint; above 1
+    #   pinches inside the superheaters and economisers are caught as well.
+    # Stops once the feasible population's objective values agree to within tol
+    # (relative) or after `generations`. progress(generation, best) is called
+    # after every generation.
+    if objective not in plant.RESULTS:
+        raise ValueError("Unknown objective " + str(objective) + ", expected one of " + ", ".join(plant.RESULTS))
+    if generations < 1:
+        raise ValueError("Optimise needs at least one generation, not " + str(generations))
+    if population < 4:
+        raise ValueError("Optimise needs a population of at least 4 (each member mixes three others), not " + str(population))
+    bounds = dict(BOUNDS if bounds is None else bounds)
+    fixed = {name: value for name, value in (fixed or {}).items() if name not in bounds}
+    names = tuple(bounds)
+    low = np.array([bounds[name][0] for name in names], dtype=float)
+    high = np.array([bounds[name][1] for name in names], dtype=float)
+    column = plant.RESULTS.index(objective)
+    approach_column = plant.RESULTS.index('min_approach')
+    stack_column = plant.RESULTS.index('hrsg_outlet_temp')
+    stack_floor = stack_temp + 273.15
+
+    def Score(results):
+        # objective (nan -> -inf) and constraint violation (nan -> inf)
+        value = np.where(np.isnan(results[:, column]), -np.inf, results[:, column])
+        violation = np.maximum(min_approach - results[:, approach_column], 0) + np.maximum(stack_floor - results[:, stack_column], 0)
+        return value, np.where(np.isnan(violation), np.inf, violation)
+
+    rng = np.random.default_rng(seed)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        evaluate = _Evaluator(names, fixed, workers, executor, segments)
+
+        # stratified start so each variable's range is covered evenly
+        strata = np.argsort(rng.random((population, len(names))), axis=0)
+        X = low + (high - low) * (strata + rng.random((population, len(names)))) / population
+        value, violation = Score(evaluate(X))
+
+        history = []
+        for generation in range(1, generations + 1):
+            # three distinct partners per member, none of them the member itself
+            partners = np.argsort(rng.random((population, population - 1)), axis=1)[:, :3]
+            partners += partners >= np.arange(population)[:, None]
+            mutant = X[partners[:, 0]] + mutation * (X[partners[:, 1]] - X[partners[:, 2]])
+            cross = rng.random(X.shape) < crossover
+            cross[np.arange(population), rng.integers(len(names), size=population)] = True
+            trial = np.clip(np.where(cross, mutant, X), low, high)
+
+            trial_value, trial_violation = Score(evaluate(trial))
+            better = np.where((trial_violation == 0) & (violation == 0), trial_value >= value, trial_violation <= violation)
+            X[better] = trial[better]
+            value[better] = trial_value[better]
+            violation[better] = trial_violation[better]
+
+            feasible = violation == 0
+            history.append(float(value[feasible].max()) if feasible.any() else float('nan'))
+            if progress is not None:
+                progress(generation, history[-1])
+            if feasible.all() and np.ptp(value) <= tol * np.abs(value).max():
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    feasible = violation == 0
+    best = int(np.argmax(np.where(feasible, value, -np.inf))) if feasible.any() else int(np.argmin(violation))
+    results = dict(zip(plant.RESULTS, evaluate(X[best:best + 1])[0].tolist()))
+    inputs = dict(zip(names, X[best].tolist()))
+    inputs.update(fixed)
+    return OptimisationResult(objective, inputs, results, bool(feasible[best]), float(violation[best]),
+                              evaluate.evaluations, evaluate.hits, generation, history)
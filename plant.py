@@ -0,0 +1,215 @@
+import functools
+
+import numpy as np
+
+import flue_gas
+import gas_turbine as gt
+import hrsg as HRSG
+import instrument
+import steam_3_pressure_with_reheat as steam
+
+# The combined cycle from main.py as a function of its inputs, so it can be
+# evaluated many times (sweeps, optimisation) without plotting or saving.
+
+# design point used in main.py
+DEFAULTS = {
+    'hp': 165,  # bar
+    'ip': 8,  # bar
+    'lp': 4,  # bar
+    'm1': 48,  # kg/s
+    'm2': 6,  # kg/s
+    'm3': 54,  # kg/s
+    'ma': 39.68,  # kg/s, steam required for CCS
+    'steam_high_temp': 565,  # C
+    'water_low_temp': 15,  # C
+    'fuel_in': 14.2,  # kg/s
+    'AF': 50,
+    'LHV': 50000,  # kJ/kg
+    'P_r': 20.1,
+    'n_t': .85,
+    'n_c': .85,
+    'T_atm': 8,  # C, gas turbine inlet
+    'P_atm': 1,  # bar
+    'cp_gas': 1.004,  # kJ/kgK, gas turbine working fluid
+    'k_gas': 1.4,
+    'fluegas_massflow': 724,  # kg/s
+}
+
+INPUTS = tuple(DEFAULTS)
+
+# scalar results returned by EvaluatePlant, in table order
+RESULTS = (
+    'gas_turbine_efficiency',
+    'steam_cycle_efficiency',
+    'overall_efficiency',
+    'gas_turbine_work',  # kW
+    'steam_cycle_work',  # kW
+    'net_work',  # kW
+    'steam_heat_input',  # kW
+    'hrsg_inlet_temp',  # K
+    'hrsg_outlet_temp',  # K
+    'hrsg_heat_duty',  # kW
+    'min_approach',  # K, smallest hot - cold difference at any exchanger end
+)
+
+
+# HRSG exchangers in flue gas order: name, cold inlet and outlet states of the
+# steam cycle, SteamCycle mass flow attribute, exchanger type. The operating
+# pressure is that of the cold inlet state.
+EXCHANGERS = (
+    ("HP Superheater", 13, 14, 'superheater_3_mass_flow', 'superheater'),
+    ("IP Superheater", 15, 10, 'superheater_2_mass_flow', 'superheater'),
+    ("LP Superheater", 4, 5, 'superheater_1_mass_flow', 'superheater'),
+    ("HP Evaporator", 12, 13, 'evaporator_3_mass_flow', 'evaporator'),
+    ("HP Economiser", 11, 12, 'economiser_3_mass_flow', 'economiser'),
+    ("IP Evaporator", 8, 9, 'evaporator_2_mass_flow', 'evaporator'),
+    ("IP Economiser", 7, 8, 'economiser_2_mass_flow', 'economiser'),
+    ("LP Evaporator", 3, 4, 'evaporator_1_mass_flow', 'evaporator'),
+    ("LP Economiser", 2, 3, 'economiser_1_mass_flow', 'economiser'),
+)
+
+
+def BuildHRSG(steamCycle, inlet_temp, fluegas_massflow, properties=None, segments=1, fluegas=None):
+    # the nine exchangers of main.py from a calculated SteamCycle. fluegas: the
+    # hot side gas, flue_gas.HotSide(AF); None for constant cp
+    hrsg = HRSG.HRSG(exchanger_list=[], inlet_temp=inlet_temp)
+    for name, cold_in, cold_out, mass_flow, exchanger_type in EXCHANGERS:
+        exchanger = HRSG.HeatExchanger(steamCycle.T[cold_in], steamCycle.T[cold_out], fluegas_massflow, getattr(steamCycle, mass_flow),
+                                       exchanger_type, steamCycle.P[cold_in], quality_in=0, quality_out=1, properties=properties, segments=segments,
+                                       fluegas=fluegas)
+        exchanger.set_name(name)
+        hrsg.AddExchanger(exchanger)
+    return hrsg
+
+
+def BuildHRSGBatch(steamCycle, inlet_temp, fluegas_massflow, properties=None, segments=1, fluegas=None):
+    # BuildHRSG for a SteamCycleBatch
+    hrsg = HRSG.HRSGBatch(inlet_temp=inlet_temp)
+    for name, cold_in, cold_out, mass_flow, exchanger_type in EXCHANGERS:
+        exchanger = HRSG.HeatExchangerBatch(steamCycle.T[cold_in], steamCycle.T[cold_out], fluegas_massflow, getattr(steamCycle, mass_flow),
+                                            exchanger_type, steamCycle.P[cold_in], quality_in=0, quality_out=1, properties=properties, segments=segments,
+                                            fluegas=fluegas)
+        exchanger.set_name(name)
+        hrsg.AddExchanger(exchanger)
+    return hrsg
+
+
+def Plant(inputs=None, properties=None, segments=1, gas_properties=True, **overrides):
+    # build and calculate the gas turbine, steam cycle and HRSG for one case.
+    # inputs/overrides replace entries of DEFAULTS. segments > 1 discretises the
+    # exchangers so min_approach includes pinches inside them. gas_properties=False
+    # skips the gas turbine's CoolProp h and s, which no RESULTS need. Runs in
+    # instrument quiet mode, timed as the 'gas turbine', 'steam cycle' and
+    # 'hrsg' stages.
+    values = dict(DEFAULTS)
+    values.update(inputs or {})
+    values.update(overrides)
+
+    with instrument.Quiet():
+        with instrument.Stage('gas turbine'):
+            gasTurbine = gt.GasTurbine(values['fuel_in'], values['AF'], values['LHV'], values['P_r'], values['n_t'], values['n_c'],
+                                       values['T_atm'], values['P_atm'], values['cp_gas'], values['k_gas'], gas_properties)
+        with instrument.Stage('steam cycle'):
+            steamCycle = steam.SteamCycle(values['hp'], values['ip'], values['lp'], values['m1'], values['m2'], values['m3'], values['ma'],
+                                          values['steam_high_temp'], values['water_low_temp'], properties=properties, keep_properties=False)
+        with instrument.Stage('hrsg'):
+            hrsg = BuildHRSG(steamCycle, gt.ToKelvin(gasTurbine.T[4]), values['fluegas_massflow'], properties=properties, segments=segments,
+                             fluegas=flue_gas.HotSide(values['AF']))
+            hrsg.Calculate()
+    return gasTurbine, steamCycle, hrsg
+
+
+def EvaluatePlant(inputs=None, properties=None, segments=1, **overrides):
+    # dict of the RESULTS for one case
+    return Results(*Plant(inputs, properties, segments, False, **overrides))
+
+
+def Results(gasTurbine, steamCycle, hrsg):
+    # RESULTS of calculated scalar GasTurbine, SteamCycle and HRSG objects
+    overall = (steamCycle.efficiency + gasTurbine.efficiency) - (steamCycle.efficiency * gasTurbine.efficiency)
+    results = {
+        'gas_turbine_efficiency': gasTurbine.efficiency,
+        'steam_cycle_efficiency': steamCycle.efficiency,
+        'overall_efficiency': overall,
+        'gas_turbine_work': gasTurbine.work['Net Work'],
+        'steam_cycle_work': steamCycle.w_net,
+        'net_work': gasTurbine.work['Net Work'] + steamCycle.w_net,
+        'steam_heat_input': steamCycle.q_in,
+        'hrsg_inlet_temp': hrsg.inlet_temp,
+        'hrsg_outlet_temp': hrsg.outlet_temp,
+        'hrsg_heat_duty': hrsg.heatDuty,
+        'min_approach': hrsg.min_approach,
+    }
+    return {name: float(value) for name, value in results.items()}
+
+
+def PlantBatch(inputs=None, properties=None, segments=1, gas_properties=True, **overrides):
+    # Plant for arrays of inputs (broadcast together) using the vectorised
+    # GasTurbineBatch, SteamCycleBatch and HRSGBatch
+    values = dict(DEFAULTS)
+    values.update(inputs or {})
+    values.update(overrides)
+    values = dict(zip(values, [value.reshape(-1) for value in np.broadcast_arrays(
+        *[np.asarray(value, dtype=float) for value in values.values()])]))
+
+    with instrument.Stage('gas turbine batch'):
+        gasTurbine = gt.GasTurbineBatch(values['fuel_in'], values['AF'], values['LHV'], values['P_r'], values['n_t'], values['n_c'],
+                                        values['T_atm'], values['P_atm'], values['cp_gas'], values['k_gas'], gas_properties)
+    with instrument.Stage('steam cycle batch'):
+        steamCycle = steam.SteamCycleBatch(values['hp'], values['ip'], values['lp'], values['m1'], values['m2'], values['m3'], values['ma'],
+                                           values['steam_high_temp'], values['water_low_temp'], properties=properties)
+    with instrument.Stage('hrsg batch'):
+        hrsg = BuildHRSGBatch(steamCycle, gt.ToKelvin(gasTurbine.T[4]), values['fluegas_massflow'], properties=properties, segments=segments,
+                              fluegas=flue_gas.HotSide(values['AF']))
+        hrsg.Calculate()
+    return gasTurbine, steamCycle, hrsg
+
+
+def EvaluatePlantBatch(inputs=None, properties=None, segments=1, **overrides):
+    # dict of RESULTS arrays, one value per case
+    return ResultsBatch(*PlantBatch(inputs, properties, segments, False, **overrides))
+
+
+def ResultsBatch(gasTurbine, steamCycle, hrsg):
+    # Results for calculated GasTurbineBatch, SteamCycleBatch and HRSGBatch
+    return {
+        'gas_turbine_efficiency': gasTurbine.efficiency,
+        'steam_cycle_efficiency': steamCycle.efficiency,
+        'overall_efficiency': (steamCycle.efficiency + gasTurbine.efficiency) - (steamCycle.efficiency * gasTurbine.efficiency),
+        'gas_turbine_work': gasTurbine.work['Net Work'],
+        'steam_cycle_work': steamCycle.w_net,
+        'net_work': gasTurbine.work['Net Work'] + steamCycle.w_net,
+        'steam_heat_input': steamCycle.q_in,
+        'hrsg_inlet_temp': hrsg.inlet_temp,
+        'hrsg_outlet_temp': hrsg.outlet_temp,
+        'hrsg_heat_duty': hrsg.heatDuty,
+        'min_approach': hrsg.min_approach,
+    }
+
+
+def EvaluateRows(rows, names=INPUTS, batch=False, segments=1, cache=None):
+    # RESULTS for each row of a 2D input array whose columns are `names`.
+    # Cases that raise (e.g. states outside the IAPWS-97 range) come back as nan.
+    # batch=True evaluates all rows with EvaluatePlantBatch, falling back to one
+    # row at a time if any of them fails.
+    # cache: a disk_cache.DiskCache; rows are then looked up and evaluated one
+    # at a time through it (batch is ignored).
+    rows = np.asarray(rows, dtype=float)
+    evaluate = EvaluatePlant
+    if cache is not None:
+        import disk_cache
+        evaluate = functools.partial(disk_cache.EvaluatePlant, cache=cache)
+    elif batch and len(rows):
+        try:
+            results = EvaluatePlantBatch(dict(zip(names, rows.T)), segments=segments)
+            return np.stack([np.broadcast_to(results[name], len(rows)) for name in RESULTS], axis=1)
+        except (ValueError, ZeroDivisionError, NotImplementedError, OverflowError):
+            pass
+    out = np.full((len(rows), len(RESULTS)), np.nan)
+    for i, row in enumerate(rows):
+        try:
+            results = evaluate(dict(zip(names, row.tolist())), segments=segments)
+        except (ValueError, ZeroDivisionError, NotImplementedError, OverflowError):
+            continue
+        out[i] = [results[name] for name in RESULTS]
+    return out
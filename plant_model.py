@@ -0,0 +1,163 @@
+import flue_gas
+import gas_turbine as gt
+import hrsg as HRSG
+import instrument
+import plant
+import steam_3_pressure_with_reheat as steam
+
+# The combined cycle as a dependency graph, for what-if work and finite
+# differences where only a small part of the plant changes between runs.
+#
+#     model = plant_model.PlantModel()
+#     model.Calculate()                       # everything
+#     model.Set(m3=55)                        # steam mass flows, HRSG, results
+#     model.SetExchanger('LP Economiser', m_cold=110)
+#     model.Calculate()                       # LP Economiser, HRSG totals, results
+#     model.recomputed                        # nodes run by the last Calculate
+#
+# Nodes, in evaluation order, and what they depend on:
+#     gas_turbine     fuel_in, AF, LHV, P_r, n_t, n_c, T_atm, P_atm, cp_gas, k_gas
+#     steam_states    hp, ip, lp, steam_high_temp, water_low_temp
+#     steam_flows     steam_states, m1, m2, m3, ma (SteamCycle.SetMassFlows)
+#     <exchanger>     steam_states, steam_flows, fluegas_massflow, its own
+#                     parameters and the hot inlet: gas_turbine for the first
+#                     exchanger, the previous exchanger after that
+#     hrsg            every exchanger (HRSG.Totals)
+#     results         gas_turbine, steam_flows, hrsg (plant.Results)
+# Set marks everything downstream of the changed inputs; Calculate reruns just
+# those nodes. Exchanger names and order are plant.EXCHANGERS.
+
+GAS_TURBINE_INPUTS = ('fuel_in', 'AF', 'LHV', 'P_r', 'n_t', 'n_c', 'T_atm', 'P_atm', 'cp_gas', 'k_gas')
+STEAM_STATE_INPUTS = ('hp', 'ip', 'lp', 'steam_high_temp', 'water_low_temp')
+STEAM_FLOW_INPUTS = ('m1', 'm2', 'm3', 'ma')
+
+# per exchanger values that replace the ones taken from the steam cycle
+EXCHANGER_PARAMETERS = ('t_cold_in', 't_cold_out', 'm_cold', 'operating_pressure', 'segments')
+
+
+class PlantModel:
+
+    def __init__(self, inputs=None, properties=None, segments=1, gas_properties=True, **overrides):
+        # gas_properties=False skips the gas turbine's h and s (see plant.Plant)
+        self.inputs = dict(plant.DEFAULTS)
+        self.inputs.update(inputs or {})
+        self.inputs.update(overrides)
+        self.properties = properties
+        self.gas_properties = gas_properties
+        self.exchanger_parameters = {name: {'segments': segments} for name, *spec in plant.EXCHANGERS}
+
+        self.gasTurbine = None
+        self.steamCycle = None
+        self.exchangers = [None] * len(plant.EXCHANGERS)
+        self.hrsg = None
+        self.results = None
+
+        # node name -> (dependencies, function), kept in evaluation order
+        self.nodes = {}
+        self._Node('gas_turbine', GAS_TURBINE_INPUTS, self._GasTurbine)
+        self._Node('steam_states', STEAM_STATE_INPUTS, self._SteamStates)
+        self._Node('steam_flows', ('steam_states',) + STEAM_FLOW_INPUTS, self._SteamFlows)
+        hot_inlet = 'gas_turbine'
+        for index, (name, *spec) in enumerate(plant.EXCHANGERS):
+            self._Node(name, ('steam_states', 'steam_flows', 'fluegas_massflow', name + ' parameters', hot_inlet),
+                       lambda index=index: self._Exchanger(index))
+            hot_inlet = name
+        self._Node('hrsg', tuple(name for name, *spec in plant.EXCHANGERS), self._HRSG)
+        self._Node('results', ('gas_turbine', 'steam_flows', 'hrsg'), self._Results)
+
+        self.dependents = {}
+        for node, (dependencies, function) in self.nodes.items():
+            for dependency in dependencies:
+                self.dependents.setdefault(dependency, []).append(node)
+
+        self.dirty = set(self.nodes)
+        self.recomputed = []
+        self.counts = dict.fromkeys(self.nodes, 0)  # runs of each node so far
+
+    def _Node(self, name, dependencies, function):
+        self.nodes[name] = (dependencies, function)
+
+    def Set(self, **inputs):
+        # change plant inputs (any of plant.INPUTS)
+        for name, value in inputs.items():
+            if name not in self.inputs:
+                raise ValueError("Unknown plant input " + name + ", expected one of " + ", ".join(self.inputs))
+            if value != self.inputs[name]:
+                self.inputs[name] = value
+                self._Invalidate(name)
+
+    def SetExchanger(self, name, **parameters):
+        # override one exchanger's EXCHANGER_PARAMETERS; None goes back to the
+        # steam cycle value
+        if name not in self.exchanger_parameters:
+            raise ValueError("Unknown exchanger " + name)
+        for parameter, value in parameters.items():
+            if parameter not in EXCHANGER_PARAMETERS:
+                raise ValueError("Unknown exchanger parameter " + parameter + ", expected one of " + ", ".join(EXCHANGER_PARAMETERS))
+            if value is None:
+                self.exchanger_parameters[name].pop(parameter, None)
+            else:
+                self.exchanger_parameters[name][parameter] = value
+        self._Invalidate(name + ' parameters')
+
+    def _Invalidate(self, name):
+        # mark everything downstream of an input or node
+        stack = list(self.dependents.get(name, []))
+        while stack:
+            node = stack.pop()
+            if node not in self.dirty:
+                self.dirty.add(node)
+                stack.extend(self.dependents.get(node, []))
+
+    def Calculate(self):
+        # rerun the out of date nodes and return the plant.RESULTS dict
+        self.recomputed = []
+        for node, (dependencies, function) in self.nodes.items():
+            if node in self.dirty:
+                with instrument.Stage('model ' + node):
+                    function()
+                self.dirty.discard(node)
+                self.counts[node] += 1
+                self.recomputed.append(node)
+        return self.results
+
+    def _GasTurbine(self):
+        values = self.inputs
+        self.gasTurbine = gt.GasTurbine(values['fuel_in'], values['AF'], values['LHV'], values['P_r'], values['n_t'], values['n_c'],
+                                        values['T_atm'], values['P_atm'], values['cp_gas'], values['k_gas'], self.gas_properties)
+
+    def _SteamStates(self):
+        values = self.inputs
+        with instrument.Quiet():
+            self.steamCycle = steam.SteamCycle(values['hp'], values['ip'], values['lp'], values['m1'], values['m2'], values['m3'], values['ma'],
+                                               values['steam_high_temp'], values['water_low_temp'], properties=self.properties,
+                                               keep_properties=False)
+
+    def _SteamFlows(self):
+        values = self.inputs
+        with instrument.Quiet():
+            self.steamCycle.SetMassFlows(values['m1'], values['m2'], values['m3'], values['ma'])
+
+    def _Exchanger(self, index):
+        name, cold_in, cold_out, mass_flow, exchanger_type = plant.EXCHANGERS[index]
+        parameters = self.exchanger_parameters[name]
+        steamCycle = self.steamCycle
+        exchanger = HRSG.HeatExchanger(parameters.get('t_cold_in', steamCycle.T[cold_in]), parameters.get('t_cold_out', steamCycle.T[cold_out]),
+                                       self.inputs['fluegas_massflow'], parameters.get('m_cold', getattr(steamCycle, mass_flow)), exchanger_type,
+                                       parameters.get('operating_pressure', steamCycle.P[cold_in]), quality_in=0, quality_out=1,
+                                       properties=self.properties, segments=parameters.get('segments', 1),
+                                       fluegas=flue_gas.HotSide(self.inputs['AF']))
+        exchanger.set_name(name)
+        if index == 0:
+            exchanger.set_h_in(gt.ToKelvin(self.gasTurbine.T[4]))
+        else:
+            exchanger.set_h_in(self.exchangers[index - 1].t['hot out'])
+        exchanger.Calculate()
+        self.exchangers[index] = exchanger
+
+    def _HRSG(self):
+        self.hrsg = HRSG.HRSG(exchanger_list=list(self.exchangers), inlet_temp=self.exchangers[0].t['hot in'])
+        self.hrsg.Totals()
+
+    def _Results(self):
+        self.results = plant.Results(self.gasTurbine, self.steamCycle, self.hrsg)
@@ -0,0 +1,240 @@
+import concurrent.futures
+import os
+
+import numpy as np
+
+import plant
+
+# Headless plots of many cases: the pinch, steam T-s/h-s and gas turbine T-s/h-s
+# diagrams of main.py for a whole sweep, in place of calling PlotPinchgraph and
+# PlotResults once per case.
+#
+#     data = plots.PlotData(*plant.PlantBatch(inputs))      # no matplotlib
+#     data['pinch']['water'], data['steam_ts']['lines'] ...
+#     plots.SavePlots(inputs, 'runs/plots', per_figure=100, workers=4)
+#
+# The data functions take scalar objects (or their Result() records) or the
+# batch classes and return plain arrays with a leading case axis, built
+# without a loop over cases:
+#     pinch    'water'    (cases, exchangers, points, 2) heat MW, T for each
+#                         exchanger in legend order (LP Economiser first)
+#              'fluegas'  (cases, 2, 2) the straight flue gas line
+#              'approach' (cases, exchangers, 2) hot - cold at the cold and hot end
+#     cycles   'points'   (cases, states, 2) s and T (C) or h of states 1..
+#              'lines'    list of (cases, len(level), 2) arrays, one per line
+# so they are cheap enough to keep for every case of a sweep. Rendering draws
+# each line of all the cases in a figure as one matplotlib LineCollection, as
+# an overlay on one axes or as small multiples (Tile: one cell per case on a
+# shared scale, still a single axes). There is no per point text, the
+# approaches are in the data. Figures are rendered by worker processes on the
+# Agg backend, a chunk of cases per figure.
+
+KINDS = ('pinch', 'steam_ts', 'steam_hs', 'gas_turbine_ts', 'gas_turbine_hs')
+
+# state sequences drawn as lines, from SteamCycle.PlotResults
+STEAM_LINES = ((1, 2, 3, 4, 5, 6, 1), (3, 7, 8, 9, 10, 5), (3, 11, 12, 13, 14, 15))
+STEAM_LABELS = ("Low Pressure", "Intermediate Pressure", "High Pressure")
+GAS_TURBINE_LINES = ((1, 2, 3, 4),)
+
+TITLES = {
+    'pinch': "Heat Consumption versus Temperature diagram for the HRSG",
+    'steam_ts': "T-S Diagram for Steam Cycle",
+    'steam_hs': "h-S Diagram for Steam Cycle",
+    'gas_turbine_ts': "T-S Diagram for Gas Turbine",
+    'gas_turbine_hs': "h-s Diagram for Gas Turbine",
+}
+
+
+def _Cases(value, points):
+    # (points, cases) view of a scalar object's (points,) or a batch object's
+    # (points, cases) array
+    return np.asarray(value, dtype=float).reshape(points, -1)
+
+
+def PinchData(hrsg, unit='c'):
+    # HRSG.PlotPinchgraph's curves for calculated HRSG or HRSGBatch objects
+    offset = 273.15 if unit == 'c' else 0
+    exchangers = hrsg.exchangers[::-1]  # LP Economiser, at zero heat, first
+    n = np.asarray(hrsg.heatDuty).size
+    points = np.asarray(exchangers[0].profile['heat']).shape[0]
+    water = np.empty((n, len(exchangers), points, 2))
+    approach = np.empty((n, len(exchangers), 2))
+    start = np.zeros(n)
+    for index, exchanger in enumerate(exchangers):
+        heat = _Cases(exchanger.profile['heat'], points).T / 1000
+        water[:, index, :, 0] = start[:, None] + heat
+        water[:, index, :, 1] = _Cases(exchanger.profile['t cold'], points).T - offset
+        approach[:, index, 0] = np.broadcast_to(exchanger.t['hot out'] - exchanger.t['cold in'], n)
+        approach[:, index, 1] = np.broadcast_to(exchanger.t['hot in'] - exchanger.t['cold out'], n)
+        start = start + np.broadcast_to(exchanger.Q, n) / 1000
+    fluegas = np.empty((n, 2, 2))
+    fluegas[:, :, 0] = np.stack([np.zeros(n), np.broadcast_to(hrsg.heatDuty, n) / 1000], axis=1)
+    fluegas[:, :, 1] = np.stack([np.broadcast_to(hrsg.exchangers[-1].t['hot out'], n),
+                                 np.broadcast_to(hrsg.exchangers[0].t['hot in'], n)], axis=1) - offset
+    labels = [getattr(exchanger, 'name', str(index)) for index, exchanger in enumerate(exchangers)] + ["Fluegas Temperature"]
+    return {'water': water, 'fluegas': fluegas, 'approach': approach, 'labels': labels,
+            'xlabel': "Heat Consumption [MW]", 'ylabel': "Temperature [C]" if unit == 'c' else "Temperature [K]"}
+
+
+def CycleData(cycle, type='ts', lines=STEAM_LINES, labels=STEAM_LABELS, offset=273.15):
+    # state points and lines of a calculated cycle (scalar, Result() record or
+    # batch). type 'ts' plots T - offset, 'hs' plots h, against s.
+    if type not in ('ts', 'hs'):
+        raise ValueError("Invalid graph type " + str(type) + ", options are 'ts' or 'hs'")
+    count = np.asarray(cycle.s).shape[0]
+    s = _Cases(cycle.s, count).T
+    y = _Cases(cycle.T, count).T - offset if type == 'ts' else _Cases(cycle.h, count).T
+    points = np.stack([s[:, 1:], y[:, 1:]], axis=2)
+    return {'points': points, 'lines': [np.stack([s[:, list(line)], y[:, list(line)]], axis=2) for line in lines],
+            'labels': list(labels), 'xlabel': "Specific Entropy [kJ/kgK]",
+            'ylabel': "Temperature [C]" if type == 'ts' else "Specific Enthalpy [kJ/kg]"}
+
+
+def PlotData(gasTurbine, steamCycle, hrsg, kinds=KINDS, unit='c'):
+    # {kind: data} for the calculated objects of plant.Plant or plant.PlantBatch.
+    # The gas turbine kinds need its h and s (gas_properties=True).
+    data = {}
+    for kind in kinds:
+        if kind == 'pinch':
+            data[kind] = PinchData(hrsg, unit)
+        elif kind.startswith('steam_'):
+            data[kind] = CycleData(steamCycle, kind[-2:])
+        elif kind.startswith('gas_turbine_'):  # its T is already in C
+            data[kind] = CycleData(gasTurbine, kind[-2:], GAS_TURBINE_LINES, ("Gas Turbine",), offset=0)
+        else:
+            raise ValueError("Unknown plot " + str(kind) + ", expected one of " + ", ".join(KINDS))
+    return data
+
+
+def Select(data, cases):
+    # the same data for a subset (slice or index array) of its cases
+    selected = dict(data)
+    for name in ('water', 'fluegas', 'approach', 'points'):
+        if name in data:
+            selected[name] = data[name][cases]
+    if 'lines' in data:
+        selected['lines'] = [line[cases] for line in data['lines']]
+    return selected
+
+
+def Tile(kind, data, columns=10):
+    # data with each case moved into its own cell of a grid, `columns` to a
+    # row in case order, all on the same scale, so small multiples draw as one
+    # set of collections on a single axes. Adds the cell 'frames' and a 'scale'
+    # note of the shared axis ranges.
+    names = ('water', 'fluegas') if kind == 'pinch' else ('points',)
+    arrays = [data[name] for name in names] + list(data.get('lines', []))
+    n = len(arrays[0])
+    xy = np.concatenate([array.reshape(n, -1, 2) for array in arrays], axis=1)
+    low = np.nanmin(xy, axis=(0, 1))
+    span = np.nanmax(xy, axis=(0, 1)) - low
+    span[span == 0] = 1
+    cell = np.stack([np.arange(n) % columns, -(np.arange(n) // columns)], axis=1).astype(float)
+
+    def Move(array):
+        shape = (n,) + (1,) * (array.ndim - 2) + (2,)
+        return cell.reshape(shape) + 0.05 + 0.9 * (array - low) / span
+
+    tiles = Select(data, slice(None))
+    for name in names:
+        tiles[name] = Move(data[name])
+    if 'lines' in data:
+        tiles['lines'] = [Move(line) for line in data['lines']]
+    corners = np.array([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]], dtype=float)
+    tiles['frames'] = cell[:, None, :] + corners
+    tiles['scale'] = (data['xlabel'] + " " + format(low[0], '.4g') + " to " + format(low[0] + span[0], '.4g') + ", " +
+                      data['ylabel'] + " " + format(low[1], '.4g') + " to " + format(low[1] + span[1], '.4g'))
+    return tiles
+
+
+def Draw(axes, kind, data, alpha=None, legend=True, title=None):
+    # one kind's data for all its cases on one axes, a LineCollection per line.
+    # Returns the legend handles.
+    from matplotlib.collections import LineCollection
+    from matplotlib.lines import Line2D
+
+    colours = ['C' + str(index % 10) for index in range(len(data['labels']))]
+    n = len(data['water'] if kind == 'pinch' else data['points'])
+    alpha = alpha if alpha is not None else max(0.05, min(1.0, 5.0 / max(n, 1)))
+    handles = []
+    if kind == 'pinch':
+        for index, label in enumerate(data['labels'][:-1]):
+            axes.add_collection(LineCollection(data['water'][:, index], colors=colours[index], alpha=alpha, linewidths=1))
+            handles.append(Line2D([], [], color=colours[index], label=label))
+        axes.add_collection(LineCollection(data['fluegas'], colors='r', linestyles='dashed', alpha=alpha, linewidths=1))
+        handles.append(Line2D([], [], color='r', linestyle='dashed', label=data['labels'][-1]))
+    else:
+        points = data['points'].reshape(-1, 2)
+        axes.plot(points[:, 0], points[:, 1], 'r+', markersize=10 if n == 1 else 4, alpha=min(1.0, alpha * 2))
+        for index, (line, label) in enumerate(zip(data['lines'], data['labels'])):
+            axes.add_collection(LineCollection(line, colors=colours[index], alpha=alpha, linewidths=1))
+            handles.append(Line2D([], [], color=colours[index], label=label))
+        if 'frames' not in data:
+            axes.grid()
+    if 'frames' in data:
+        axes.add_collection(LineCollection(data['frames'], colors='0.8', linewidths=0.5))
+    axes.autoscale_view()
+    axes.set_xlabel(data['xlabel'])
+    axes.set_ylabel(data['ylabel'])
+    if title:
+        axes.set_title(title)
+    if legend:
+        axes.legend(handles=handles, fontsize='small')
+    return handles
+
+
+def Render(kind, data, filename, layout='overlay', columns=10, dpi=100):
+    # one figure of every case in data saved to filename (the extension picks
+    # the format). layout 'overlay' draws the cases over each other, 'grid' as
+    # small multiples, `columns` to a row.
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot as plt
+
+    n = len(data['water'] if kind == 'pinch' else data['points'])
+    if layout == 'overlay':
+        figure, axes = plt.subplots(1, 1, figsize=(8, 6))
+        Draw(axes, kind, data, title=TITLES.get(kind, kind) + (" (" + str(n) + " cases)" if n > 1 else ""))
+    elif layout == 'grid':
+        columns = min(columns, n)
+        rows = -(-n // columns)
+        figure, axes = plt.subplots(1, 1, figsize=(2 * columns, 1.6 * rows + 1))
+        tiles = Tile(kind, data, columns)
+        handles = Draw(axes, kind, tiles, alpha=1, legend=False, title=TITLES.get(kind, kind) + "\n" + tiles['scale'])
+        figure.legend(handles=handles, loc='lower center', ncol=5, fontsize='small')
+        axes.set_axis_off()
+    else:
+        raise ValueError("Unknown layout " + str(layout) + ", expected 'overlay' or 'grid'")
+    figure.savefig(filename, dpi=dpi)
+    plt.close(figure)
+    return filename
+
+
+def RenderMany(jobs, workers=None):
+    # Render(*job) for each (kind, data, filename, layout) job, over a process
+    # pool if workers > 1. Returns the filenames in job order.
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [Render(*job) for job in jobs]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_Render, jobs))
+
+
+def _Render(job):
+    return Render(*job)
+
+
+def SavePlots(inputs, folder, kinds=KINDS, per_figure=100, layout='overlay', workers=None, segments=1, format='png'):
+    # evaluate the cases of `inputs` (arrays broadcast together, as for
+    # plant.PlantBatch) and save each kind of plot, per_figure cases at a time,
+    # as folder/<kind>-<first case>.<format>. Returns the filenames.
+    with_gas = any(kind.startswith('gas_turbine_') for kind in kinds)
+    data = PlotData(*plant.PlantBatch(inputs, segments=segments, gas_properties=with_gas), kinds=kinds)
+    os.makedirs(folder, exist_ok=True)
+    jobs = []
+    for kind, values in data.items():
+        n = len(values['water'] if kind == 'pinch' else values['points'])
+        for start in range(0, n, per_figure):
+            filename = os.path.join(folder, kind + "-" + str(start).zfill(6) + "." + format)
+            jobs.append((kind, Select(values, slice(start, start + per_figure)), filename, layout))
+    return RenderMany(jobs, workers)
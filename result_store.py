@@ -0,0 +1,286 @@
+import glob
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+import instrument
+import plant
+import states
+
+# Append-only columnar store for many plant cases, in place of the per-run CSV
+# files (steam_data.csv, work_data.csv, gas_turbine.csv, hrsg.csv) that
+# overwrite each other and are slow to read back.
+#
+#     with result_store.ResultStore('runs/study') as store:
+#         for inputs in cases:
+#             store.Append(*plant.Plant(inputs), inputs=inputs)
+#     store = result_store.ResultStore('runs/study')
+#     store.Read('cases')['net_work']             # memory-mapped
+#     store.ExportCSV('exchangers', 'hrsg_case_0', case=0)
+#
+# A store is a directory holding schema.json and one structured array per
+# table, written as numbered .npy chunks (cases-000000.npy, ...) of up to
+# chunk_cases cases. Appending only ever adds chunk files, and reads
+# memory-map them. Every row carries the number of the case it belongs to.
+# Tables and their columns:
+#     cases               case, plant.INPUTS, plant.RESULTS
+#     steam_states        case, state, states.STATE_DTYPE fields (states 1-15)
+#     gas_turbine_states  case, state, states.STATE_DTYPE fields (states 1-4)
+#     steam_works         case, SteamCycle.total_works and massflows numbers
+#     gas_turbine_works   case, GasTurbine.work and Efficiency
+#     exchangers          case, exchanger (index into schema['exchangers']),
+#                         EXCHANGER_FIELDS
+# Batch cases have no quality or region, their x is nan and region 0. A sweep
+# only fills the cases table (AppendTable, or sweep.Sweep(..., store=store)).
+
+TABLES = ('cases', 'steam_states', 'gas_turbine_states', 'steam_works', 'gas_turbine_works', 'exchangers')
+
+CASE_DTYPE = np.dtype([('case', np.int64)] + [(name, np.float64) for name in plant.INPUTS + plant.RESULTS])
+
+STATE_ROW_DTYPE = np.dtype([('case', np.int64), ('state', np.int8)] +
+                           [(name, states.STATE_DTYPE[name]) for name in states.STATE_DTYPE.names])
+
+# per exchanger columns, K, kg/s and kW
+EXCHANGER_FIELDS = states.EXCHANGER_FIELDS
+EXCHANGER_DTYPE = np.dtype([('case', np.int64), ('exchanger', np.int8)] + [(name, np.float64) for name in EXCHANGER_FIELDS])
+
+# row types of the tables; the works columns are the works dicts' own keys,
+# fixed by the first case appended
+DTYPES = {
+    'cases': CASE_DTYPE,
+    'steam_states': STATE_ROW_DTYPE,
+    'gas_turbine_states': STATE_ROW_DTYPE,
+    'steam_works': np.dtype([('case', np.int64)]),
+    'gas_turbine_works': np.dtype([('case', np.int64)]),
+    'exchangers': EXCHANGER_DTYPE,
+}
+
+SCHEMA_VERSION = 1
+
+
+def WorksType(names):
+    # dtype of a works table with the given columns
+    return np.dtype([('case', np.int64)] + [(name, np.float64) for name in names])
+
+
+class ResultStore:
+
+    def __init__(self, path, chunk_cases=10000):
+        # open the store at path, creating it if needed. Rows are kept in
+        # memory until chunk_cases cases are buffered, then written as a chunk.
+        self.path = path
+        self.chunk_cases = chunk_cases
+        os.makedirs(path, exist_ok=True)
+        schema_file = os.path.join(path, 'schema.json')
+        if os.path.exists(schema_file):
+            with open(schema_file) as f:
+                self.schema = json.load(f)
+            if self.schema['version'] != SCHEMA_VERSION:
+                raise ValueError("Result store " + path + " has schema version " + str(self.schema['version']) +
+                                 ", expected " + str(SCHEMA_VERSION))
+        else:
+            self.schema = {'version': SCHEMA_VERSION, 'exchangers': None, 'tables': {}}
+            self._SaveSchema()
+        self.buffers = {table: [] for table in TABLES}
+        self.buffered = 0
+        cases = self.Read('cases')
+        self.cases = int(cases['case'].max()) + 1 if len(cases) else 0  # next case number
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.Flush()
+
+    def __len__(self):
+        # cases written or buffered so far
+        return self.cases
+
+    def Append(self, gasTurbine, steamCycle, hrsg, inputs=None):
+        # one calculated case from plant.Plant (or the objects of main.py).
+        # inputs: the plant inputs it was run with, the rest are plant.DEFAULTS.
+        # Returns the case number.
+        results = plant.Results(gasTurbine, steamCycle, hrsg)
+        return self._Append(1, inputs, {name: [value] for name, value in results.items()}, gasTurbine, steamCycle, hrsg)[0]
+
+    def AppendBatch(self, gasTurbine, steamCycle, hrsg, inputs=None):
+        # every case of plant.PlantBatch at once, returns their case numbers
+        results = plant.ResultsBatch(gasTurbine, steamCycle, hrsg)
+        return self._Append(len(steamCycle), inputs, results, gasTurbine, steamCycle, hrsg)
+
+    def AppendTable(self, names, rows, results, cases=None):
+        # inputs and plant.RESULTS rows of a sweep, cases table only.
+        # cases: their case numbers, by default the next len(rows) numbers.
+        rows = np.asarray(rows, dtype=float).reshape(len(rows), -1)
+        results = np.asarray(results, dtype=float).reshape(len(rows), -1)
+        cases = self._Cases(len(rows), cases)
+        table = np.empty(len(rows), dtype=CASE_DTYPE)
+        table['case'] = cases
+        for name in plant.INPUTS:
+            table[name] = rows[:, names.index(name)] if name in names else plant.DEFAULTS[name]
+        for index, name in enumerate(plant.RESULTS):
+            table[name] = results[:, index]
+        self._Buffer('cases', table, len(rows))
+        return cases
+
+    def _Cases(self, n, cases=None):
+        # case numbers for n new cases
+        cases = np.arange(self.cases, self.cases + n) if cases is None else np.asarray(cases, dtype=np.int64).reshape(-1)
+        if len(cases):
+            self.cases = max(self.cases, int(cases.max()) + 1)
+        return cases
+
+    def _Append(self, n, inputs, results, gasTurbine, steamCycle, hrsg):
+        names = [exchanger.name for exchanger in hrsg.exchangers]
+        if self.schema['exchangers'] is None:
+            self.schema['exchangers'] = names
+            self._SaveSchema()
+        elif names != self.schema['exchangers']:
+            raise ValueError("HRSG exchangers " + ", ".join(names) + " do not match the store's " + ", ".join(self.schema['exchangers']))
+
+        values = dict(plant.DEFAULTS)
+        values.update(inputs or {})
+        cases = self._Cases(n)
+        table = np.empty(n, dtype=CASE_DTYPE)
+        table['case'] = cases
+        for name in plant.INPUTS:
+            table[name] = values[name]
+        for name in plant.RESULTS:
+            table[name] = results[name]
+        self._Buffer('steam_states', _StateRows(cases, steamCycle))
+        self._Buffer('gas_turbine_states', _StateRows(cases, gasTurbine))
+        self._Buffer('steam_works', _WorkRows(cases, steamCycle.total_works, steamCycle.massflows))
+        self._Buffer('gas_turbine_works', _WorkRows(cases, gasTurbine.work, {'Efficiency': gasTurbine.efficiency}))
+        self._Buffer('exchangers', _ExchangerRows(cases, hrsg.exchangers))
+        self._Buffer('cases', table, n)  # last, so a flush writes whole cases
+        return cases
+
+    def _Buffer(self, table, rows, cases=0):
+        self.buffers[table].append(rows)
+        self.buffered += cases
+        if self.buffered >= self.chunk_cases:
+            self.Flush()
+
+    def Flush(self):
+        # write the buffered rows of each table as one new chunk
+        for table, buffer in self.buffers.items():
+            if not buffer:
+                continue
+            rows = np.concatenate(buffer)
+            descr = [list(field) for field in np.lib.format.dtype_to_descr(rows.dtype)]
+            known = self.schema['tables'].get(table)
+            if known is None:
+                self.schema['tables'][table] = descr
+                self._SaveSchema()
+            elif known != descr:
+                raise ValueError("Rows for table " + table + " do not match the store's schema")
+            # written to a temporary (not *.npy, so never read as a chunk) and
+            # linked in under the next free number: unlike os.replace a link
+            # fails rather than overwrite a chunk another writer just added
+            descriptor, temporary = tempfile.mkstemp(prefix=table + ".", suffix=".tmp", dir=self.path)
+            try:
+                with os.fdopen(descriptor, 'wb') as f:
+                    np.save(f, rows)
+                while True:
+                    filename = os.path.join(self.path, table + "-" + str(self._NextIndex(table)).zfill(6) + ".npy")
+                    try:
+                        os.link(temporary, filename)
+                        break
+                    except FileExistsError:
+                        continue
+            finally:
+                os.remove(temporary)
+            buffer.clear()
+        self.buffered = 0
+
+    def _SaveSchema(self):
+        filename = os.path.join(self.path, 'schema.json')
+        with open(filename + ".tmp", 'w') as f:
+            json.dump(self.schema, f, indent=1)
+        os.replace(filename + ".tmp", filename)
+
+    def _Files(self, table):
+        # the table's chunk files, table-NNNNNN.npy, in order
+        return [filename for index, filename in sorted(self._Numbered(table))]
+
+    def _Numbered(self, table):
+        chunk = re.compile(re.escape(table) + r"-(\d+)\.npy")
+        for filename in glob.glob(os.path.join(glob.escape(self.path), table + "-*.npy")):
+            match = chunk.fullmatch(os.path.basename(filename))
+            if match:
+                yield int(match.group(1)), filename
+
+    def _NextIndex(self, table):
+        # one past the highest chunk number, so gaps are never refilled
+        return max((index for index, filename in self._Numbered(table)), default=-1) + 1
+
+    def Chunks(self, table):
+        # the table's chunks on disk, each memory-mapped
+        if table not in TABLES:
+            raise ValueError("Unknown table " + str(table) + ", expected one of " + ", ".join(TABLES))
+        return [np.load(filename, mmap_mode='r') for filename in self._Files(table)]
+
+    def Read(self, table, case=None):
+        # the whole table (memory-mapped if it is a single chunk, otherwise a
+        # copy), or only the rows of one case. Buffered rows are not included
+        # until Flush.
+        chunks = self.Chunks(table)
+        if case is not None:
+            chunks = [chunk[chunk['case'] == case] for chunk in chunks]
+        if not chunks:
+            descr = self.schema['tables'].get(table)
+            return np.empty(0, dtype=np.lib.format.descr_to_dtype([tuple(field) for field in descr]) if descr else DTYPES[table])
+        return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+
+    def ExportCSV(self, table, filename, case=None):
+        # a table, or one case of it, as filename.csv with a header row
+        rows = self.Read(table, case)
+        try:
+            np.savetxt(filename + ".csv", np.stack([rows[name].astype(float) for name in rows.dtype.names], axis=1).reshape(len(rows), -1),
+                       delimiter=',', header=','.join(rows.dtype.names), comments='')
+            return True
+        except IOError:
+            instrument.Print("I/O error")
+            return False
+
+
+def _StateRows(cases, cycle):
+    # states 1.. of a scalar or batch cycle, case by case
+    count = len(cycle.T) - 1
+    rows = np.empty(len(cases) * count, dtype=STATE_ROW_DTYPE)
+    rows['case'] = np.repeat(cases, count)
+    rows['state'] = np.tile(np.arange(1, count + 1), len(cases))
+    if hasattr(cycle, 'states'):
+        for name in states.STATE_DTYPE.names:
+            rows[name] = cycle.states[name][1:]
+    else:
+        for name in ('T', 'P', 'h', 's'):
+            rows[name] = np.broadcast_to(np.asarray(getattr(cycle, name), dtype=float)[1:].T, (len(cases), count)).reshape(-1)
+        rows['x'] = np.nan
+        rows['region'] = 0
+    return rows
+
+
+def _WorkRows(cases, *works):
+    # numeric entries of the works dicts, one row per case
+    values = {name: value for work in works for name, value in work.items() if not isinstance(value, str)}
+    rows = np.empty(len(cases), dtype=WorksType(tuple(values)))
+    rows['case'] = cases
+    for name, value in values.items():
+        rows[name] = value
+    return rows
+
+
+def _ExchangerRows(cases, exchangers):
+    # one row per exchanger per case, in HRSG order within each case
+    rows = np.empty((len(cases), len(exchangers)), dtype=EXCHANGER_DTYPE)
+    rows['case'] = np.asarray(cases)[:, None]
+    rows['exchanger'] = np.arange(len(exchangers))
+    for index, exchanger in enumerate(exchangers):
+        for name, value in zip(EXCHANGER_FIELDS, (exchanger.t['hot in'], exchanger.t['hot out'], exchanger.t['cold in'], exchanger.t['cold out'],
+                                                  exchanger.m['cold'], exchanger.Q, exchanger.min_approach)):
+            rows[name][:, index] = value
+    return rows.reshape(-1)
@@ -0,0 +1,152 @@
+import types
+
+import numpy as np
+
+import flue_gas
+import gas_turbine as gt
+import plant
+import plant_model
+import steam_3_pressure_with_reheat as steam
+
+# Jacobian of the plant results with respect to its inputs.
+#
+#     result = sensitivity.Jacobian()                      # about the main.py design point
+#     result.jacobian                                      # (outputs, inputs) array
+#     result.Indices()['overall_efficiency']['P_r']        # d ln(output) / d ln(input)
+#     result.Ranked('steam_cycle_work')                    # inputs by |index|
+#
+# Outputs are plant.RESULTS (steam_cycle_efficiency, steam_cycle_work = w_net,
+# hrsg_outlet_temp, overall_efficiency ...). Derivatives are central
+# differences (or forward, method='forward') with a relative step. All the
+# perturbed cases are evaluated together and each only reruns the components
+# its input reaches: a gas turbine input gives a GasTurbineBatch case, a steam
+# input a SteamCycleBatch case, and every case shares the base point's results
+# for the component it leaves alone; fluegas_massflow only reaches the HRSG.
+# The HRSGs of all cases are then one HRSGBatch. A full Jacobian over the 20
+# inputs costs about as much as one batch of 41 cases.
+#
+# Normalised indices are elasticities, dy/dx * x / y: the relative change in
+# the output for a relative change in the input (nan where y or x is 0).
+
+GAS_TURBINE_INPUTS = plant_model.GAS_TURBINE_INPUTS
+STEAM_INPUTS = plant_model.STEAM_STATE_INPUTS + plant_model.STEAM_FLOW_INPUTS
+
+# SteamCycle mass flow attributes the HRSG exchangers use
+EXCHANGER_FLOWS = tuple(mass_flow for name, cold_in, cold_out, mass_flow, exchanger_type in plant.EXCHANGERS)
+
+
+class SensitivityResult:
+
+    def __init__(self, inputs, wrt, outputs, base, jacobian, steps):
+        self.inputs = inputs  # values at the base point
+        self.wrt = wrt  # inputs differentiated with respect to, the columns
+        self.outputs = outputs  # the rows
+        self.base = base  # output values at the base point
+        self.jacobian = jacobian  # d output / d input, (outputs, wrt)
+        self.steps = steps  # perturbation of each input
+
+    def Derivatives(self):
+        # {output: {input: d output / d input}}
+        return {output: dict(zip(self.wrt, row.tolist())) for output, row in zip(self.outputs, self.jacobian)}
+
+    def IndexArray(self):
+        # elasticities as an (outputs, wrt) array
+        x = np.array([self.inputs[name] for name in self.wrt], dtype=float)
+        y = np.array([self.base[name] for name in self.outputs], dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            indices = self.jacobian * x[None, :] / y[:, None]
+        indices[~np.isfinite(indices)] = np.nan
+        return indices
+
+    def Indices(self):
+        # {output: {input: d ln(output) / d ln(input)}}
+        return {output: dict(zip(self.wrt, row.tolist())) for output, row in zip(self.outputs, self.IndexArray())}
+
+    def Ranked(self, output):
+        # (input, index) pairs of one output, largest |index| first
+        indices = self.Indices()[output]
+        return sorted(((name, value) for name, value in indices.items() if not np.isnan(value)), key=lambda item: -abs(item[1]))
+
+
+def Jacobian(inputs=None, wrt=plant.INPUTS, outputs=plant.RESULTS, step=1e-5, method='central', segments=1, **overrides):
+    # SensitivityResult at the case inputs/overrides (replacing plant.DEFAULTS).
+    # step: relative perturbation, absolute for inputs that are 0.
+    values = dict(plant.DEFAULTS)
+    values.update(inputs or {})
+    values.update(overrides)
+    unknown = [name for name in wrt if name not in plant.DEFAULTS] + [name for name in outputs if name not in plant.RESULTS]
+    if unknown:
+        raise ValueError("Unknown plant inputs or results " + ", ".join(unknown))
+    if method not in ('central', 'forward'):
+        raise ValueError("Unknown method " + str(method) + ", expected 'central' or 'forward'")
+
+    steps = np.array([step * abs(values[name]) if values[name] else step for name in wrt])
+    signs = (1, -1) if method == 'central' else (1,)
+    perturbations = [(index, sign) for index in range(len(wrt)) for sign in signs]  # case 0 is the base point
+    results = Perturbed(values, [(wrt[index], sign * steps[index]) for index, sign in perturbations], segments)
+
+    table = np.stack([np.asarray(results[name], dtype=float) for name in outputs])  # (outputs, cases)
+    jacobian = np.empty((len(outputs), len(wrt)))
+    for index in range(len(wrt)):
+        if method == 'central':
+            jacobian[:, index] = (table[:, 1 + 2 * index] - table[:, 2 + 2 * index]) / (2 * steps[index])
+        else:
+            jacobian[:, index] = (table[:, 1 + index] - table[:, 0]) / steps[index]
+    base = {name: float(table[row, 0]) for row, name in enumerate(outputs)}
+    return SensitivityResult(values, tuple(wrt), tuple(outputs), base, jacobian, dict(zip(wrt, steps.tolist())))
+
+
+def Perturbed(values, perturbations, segments=1):
+    # plant.RESULTS arrays of the base case followed by one case per
+    # (input, change) perturbation, each component evaluated only for the cases
+    # that change its inputs
+    n = len(perturbations) + 1
+    gas_index = np.zeros(n, dtype=int)
+    steam_index = np.zeros(n, dtype=int)
+    gas_cases = [dict(values)]
+    steam_cases = [dict(values)]
+    fluegas = np.full(n, float(values['fluegas_massflow']))
+    for case, (name, change) in enumerate(perturbations, 1):
+        changed = dict(values)
+        changed[name] = values[name] + change
+        if name in GAS_TURBINE_INPUTS:
+            gas_index[case] = len(gas_cases)
+            gas_cases.append(changed)
+        elif name in STEAM_INPUTS:
+            steam_index[case] = len(steam_cases)
+            steam_cases.append(changed)
+        elif name == 'fluegas_massflow':
+            fluegas[case] = changed[name]
+        else:
+            raise ValueError("No component takes the input " + str(name))
+
+    gas = {name: np.array([case[name] for case in gas_cases], dtype=float) for name in GAS_TURBINE_INPUTS}
+    gasTurbine = gt.GasTurbineBatch(gas['fuel_in'], gas['AF'], gas['LHV'], gas['P_r'], gas['n_t'], gas['n_c'],
+                                    gas['T_atm'], gas['P_atm'], gas['cp_gas'], gas['k_gas'], False)
+    cycle = {name: np.array([case[name] for case in steam_cases], dtype=float) for name in STEAM_INPUTS}
+    steamCycle = steam.SteamCycleBatch(cycle['hp'], cycle['ip'], cycle['lp'], cycle['m1'], cycle['m2'], cycle['m3'], cycle['ma'],
+                                       cycle['steam_high_temp'], cycle['water_low_temp'])
+
+    gasTurbine = _TakeGasTurbine(gasTurbine, gas_index, len(gas_cases))
+    steamCycle = _TakeSteamCycle(steamCycle, steam_index, len(steam_cases))
+    hrsg = plant.BuildHRSGBatch(steamCycle, gt.ToKelvin(gasTurbine.T[4]), fluegas, segments=segments, fluegas=flue_gas.HotSide(gas['AF'][gas_index]))
+    hrsg.Calculate()
+    return plant.ResultsBatch(gasTurbine, steamCycle, hrsg)
+
+
+def _Take(value, index, count):
+    # the cases `index` of a per case array (last axis count long) or scalar
+    value = np.asarray(value, dtype=float)
+    return np.broadcast_to(value, value.shape[:-1] + (count,) if value.ndim else (count,))[..., index]
+
+
+def _TakeGasTurbine(gasTurbine, index, count):
+    # what BuildHRSGBatch and plant.ResultsBatch use of a GasTurbineBatch, per case
+    return types.SimpleNamespace(T=_Take(gasTurbine.T, index, count), efficiency=_Take(gasTurbine.efficiency, index, count),
+                                 work={'Net Work': _Take(gasTurbine.work['Net Work'], index, count)})
+
+
+def _TakeSteamCycle(steamCycle, index, count):
+    # the same for a SteamCycleBatch
+    taken = {name: _Take(getattr(steamCycle, name), index, count) for name in ('T', 'P', 'efficiency', 'w_net', 'q_in') + EXCHANGER_FLOWS}
+    return types.SimpleNamespace(**taken)
@@ -0,0 +1,340 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import socket
+import sys
+
+import numpy as np
+
+import instrument
+import plant
+
+# Long running local evaluation service, so a stream of plant configurations
+# pays process start up and the iapws warm up once instead of per case.
+#
+#     python service.py --socket /tmp/hrsg.sock --workers 4
+#     python service.py --port 8765
+#
+#     client = service.Client('/tmp/hrsg.sock')         # or Client(port=8765)
+#     client.Evaluate({'hp': 150})                     # plant.RESULTS dict
+#     client.EvaluateMany([{'hp': hp} for hp in range(140, 166)])
+#
+# The protocol is JSON lines over a Unix socket or a localhost TCP port, one
+# request object per line and one response line each, e.g.
+#     {"id": 7, "inputs": {"hp": 150, "P_r": 18}, "segments": 1}
+#     {"id": 7, "results": {"net_work": ...}, "cached": false}
+#     {"id": 8, "error": "..."}
+#     {"id": 9, "stats": true}  ->  {"id": 9, "stats": {"requests": ...}}
+# A line that is not JSON, or longer than LINE_LIMIT, gets an error with id null.
+# Requests on a connection are handled concurrently, so a client can pipeline
+# thousands of them; responses come back as they finish, matched by id.
+#
+# A configuration is plant.DEFAULTS with the given inputs replaced, and the
+# full set of values and segments is its cache key. Results are cached (least
+# recently used dropped past cache_size), a request for a configuration already
+# being evaluated waits on that evaluation instead of starting another, and the
+# new configurations that arrive together are sent to the worker processes as
+# batches of up to `batch` rows for plant.EvaluateRows(batch=True). Workers run
+# a design point when they start so the property code is loaded and warm.
+# Everything is the standard library plus the plant's own dependencies.
+
+DEFAULT_PORT = 8765
+LINE_LIMIT = 2 ** 20  # bytes, longest request line
+
+
+def Warm():
+    # worker initialiser: load and exercise the scalar and batch models once
+    with instrument.Quiet():
+        row = np.array([[plant.DEFAULTS[name] for name in plant.INPUTS]], dtype=float)
+        plant.EvaluateRows(row, plant.INPUTS)
+        plant.EvaluateRows(row, plant.INPUTS, batch=True)
+
+
+def _EvaluateRows(rows, segments):
+    with instrument.Quiet():
+        return plant.EvaluateRows(rows, plant.INPUTS, batch=True, segments=segments)
+
+
+def Key(inputs, segments=1):
+    # cache key of a configuration: every plant input as a float, then segments
+    unknown = [name for name in inputs if name not in plant.DEFAULTS]
+    if unknown:
+        raise ValueError("Unknown plant inputs " + ", ".join(unknown))
+    values = dict(plant.DEFAULTS)
+    values.update(inputs)
+    try:
+        return tuple(float(values[name]) for name in plant.INPUTS) + (int(segments),)
+    except (TypeError, ValueError):
+        raise ValueError("Plant inputs must be numbers")
+
+
+class Service:
+
+    def __init__(self, workers=None, batch=256, cache_size=100000, executor=None):
+        # workers: processes in the pool (default os.cpu_count()).
+        # executor: an existing executor to use instead of starting a pool.
+        self.workers = workers or os.cpu_count() or 1
+        self.batch = batch
+        self.cache_size = cache_size
+        self.executor = executor
+        self.own_executor = executor is None
+        self.cache = collections.OrderedDict()  # key -> results
+        self.pending = {}  # key -> future of a queued or running evaluation
+        self.queue = []
+        self.stats = {'requests': 0, 'cached': 0, 'deduplicated': 0, 'evaluated': 0, 'batches': 0, 'errors': 0}
+
+    def Start(self):
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, initializer=Warm)
+
+    def Close(self):
+        if self.own_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    async def Evaluate(self, inputs, segments=1):
+        # plant.RESULTS of a configuration and whether it came from the cache
+        key = Key(inputs, segments)
+        self.stats['requests'] += 1
+        results = self.cache.get(key)
+        if results is not None:
+            self.cache.move_to_end(key)
+            self.stats['cached'] += 1
+            return results, True
+        future = self.pending.get(key)
+        if future is not None:
+            self.stats['deduplicated'] += 1
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self.pending[key] = future
+            if not self.queue:
+                loop.call_soon(self._Dispatch)  # after the rest of this read's requests are queued
+            self.queue.append(key)
+        return await asyncio.shield(future), False
+
+    def _Dispatch(self):
+        # send the queued keys to the pool, `batch` rows of one segments value at a time
+        self.Start()
+        keys, self.queue = self.queue, []
+        groups = {}
+        for key in keys:
+            groups.setdefault(key[-1], []).append(key)
+        for segments, group in groups.items():
+            for start in range(0, len(group), self.batch):
+                chunk = group[start:start + self.batch]
+                rows = np.array([key[:-1] for key in chunk], dtype=float)
+                task = asyncio.get_running_loop().run_in_executor(self.executor, _EvaluateRows, rows, segments)
+                task.add_done_callback(lambda task, chunk=chunk: self._Finish(chunk, task))
+                self.stats['batches'] += 1
+
+    def _Finish(self, keys, task):
+        try:
+            rows = task.result()
+        except Exception as error:  # a broken pool; fail the waiting requests
+            for key in keys:
+                self._Resolve(key, exception=RuntimeError("Evaluation failed: " + repr(error)))
+            return
+        for key, row in zip(keys, rows.tolist()):
+            if np.all(np.isnan(row)):
+                self._Resolve(key, exception=ValueError("The plant could not be evaluated for these inputs"))
+                continue
+            results = dict(zip(plant.RESULTS, row))
+            self.cache[key] = results
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+            self.stats['evaluated'] += 1
+            self._Resolve(key, results)
+
+    def _Resolve(self, key, results=None, exception=None):
+        future = self.pending.pop(key)
+        if future.cancelled():
+            return
+        if exception is None:
+            future.set_result(results)
+        else:
+            self.stats['errors'] += 1
+            future.set_exception(exception)
+
+    async def Respond(self, request):
+        # the response object for one decoded request line
+        response = {'id': request.get('id')} if isinstance(request, dict) else {'id': None}
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("Requests must be JSON objects")
+            if request.get('stats'):
+                response['stats'] = dict(self.stats, cache=len(self.cache), pending=len(self.pending))
+                return response
+            inputs = request.get('inputs', {})
+            if not isinstance(inputs, dict):
+                raise ValueError("inputs must be an object of plant inputs")
+            response['results'], response['cached'] = await self.Evaluate(inputs, request.get('segments', 1))
+        except (ValueError, RuntimeError) as error:
+            response['error'] = str(error)
+        return response
+
+    async def Handle(self, reader, writer):
+        # one client connection: a task per request line, written back as each finishes
+        tasks = set()
+
+        async def Send(response):
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+
+        async def Reply(line):
+            try:
+                request = json.loads(line)
+            except ValueError:
+                await Send({'id': None, 'error': "Invalid JSON"})
+            else:
+                await Send(await self.Respond(request))
+
+        async def ReadLine():
+            # the next request line, b"" at the end of the stream and None for
+            # a line over the stream limit, which is read up to its end and dropped
+            try:
+                return await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as error:
+                return error.partial
+            except asyncio.LimitOverrunError as error:
+                consumed = error.consumed
+            while True:
+                await reader.readexactly(consumed)
+                try:
+                    await reader.readuntil(b"\n")
+                    return None
+                except asyncio.IncompleteReadError:
+                    return None
+                except asyncio.LimitOverrunError as error:
+                    consumed = error.consumed
+
+        try:
+            while True:
+                line = await ReadLine()
+                if line is None:
+                    task = asyncio.ensure_future(Send({'id': None, 'error': "Request too long"}))
+                elif not line:
+                    break
+                elif line.strip():
+                    task = asyncio.ensure_future(Reply(line))
+                else:
+                    continue
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def Serve(self, path=None, host='127.0.0.1', port=DEFAULT_PORT, started=None):
+        # serve on the Unix socket at path, or on host:port, until cancelled.
+        # started: an asyncio.Event set once connections are accepted.
+        self.Start()
+        if path is not None:
+            if os.path.exists(path):
+                os.remove(path)
+            server = await asyncio.start_unix_server(self.Handle, path=path, limit=LINE_LIMIT)
+        else:
+            server = await asyncio.start_server(self.Handle, host=host, port=port, limit=LINE_LIMIT)
+        instrument.Print("Serving on " + (path or host + ":" + str(port)))
+        if started is not None:
+            started.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.Close()
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+
+class Client:
+    # blocking client for scripts: Evaluate one configuration or pipeline many
+
+    def __init__(self, path=None, host='127.0.0.1', port=DEFAULT_PORT, timeout=None):
+        if path is not None:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(path)
+        else:
+            self.socket = socket.create_connection((host, port))
+        self.socket.settimeout(timeout)
+        self.file = self.socket.makefile('rwb')
+        self.next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.Close()
+
+    def Close(self):
+        self.file.close()
+        self.socket.close()
+
+    def Evaluate(self, inputs=None, segments=1):
+        # plant.RESULTS of one configuration, ValueError if the service refused it
+        return self.EvaluateMany([inputs or {}], segments)[0]
+
+    def EvaluateMany(self, configurations, segments=1):
+        # results of every configuration in order; all requests are sent before
+        # the responses are read, so the service evaluates them together
+        responses = self.Requests([{'inputs': inputs, 'segments': segments} for inputs in configurations])
+        errors = [response['error'] for response in responses if 'error' in response]
+        if errors:
+            raise ValueError(str(len(errors)) + " configurations failed, first: " + errors[0])
+        return [response['results'] for response in responses]
+
+    def Stats(self):
+        return self.Requests([{'stats': True}])[0]['stats']
+
+    def Requests(self, requests):
+        # send request objects and return their responses in the same order.
+        # Every line gets one reply, so all of them are read before a
+        # ValueError for any the service could not read (replies with no id).
+        ids = []
+        for request in requests:
+            ids.append(self.next_id)
+            self.file.write(json.dumps(dict(request, id=self.next_id)).encode() + b"\n")
+            self.next_id += 1
+        self.file.flush()
+        responses = {}
+        unreadable = []
+        for _ in ids:
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("Service closed the connection")
+            response = json.loads(line)
+            if response.get('id') is None:
+                unreadable.append(response.get('error', "Request not understood"))
+            else:
+                responses[response['id']] = response
+        if unreadable:
+            raise ValueError(unreadable[0])
+        return [responses[i] for i in ids]
+
+
+def Main(argv=None):
+    parser = argparse.ArgumentParser(description="Local plant evaluation service")
+    parser.add_argument('--socket', help="Unix socket path (default: TCP on localhost)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, help="worker processes, default one per core")
+    parser.add_argument('--batch', type=int, default=256, help="most configurations per work unit")
+    parser.add_argument('--cache-size', type=int, default=100000, help="results kept")
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+    instrument.quiet = args.quiet
+    service = Service(args.workers, args.batch, args.cache_size)
+    try:
+        asyncio.run(service.Serve(args.socket, port=args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(Main())
@@ -0,0 +1,106 @@
+import functools
+
+import numpy as np
+
+# Compact storage for cycle state points and results.
+#
+# A cycle keeps its state points in one structured array (StateTable) and its
+# T, P, h and s attributes are views of its fields, so cycle.T[3] and
+# cycle.states[3]['T'] are the same number. The result classes hold just what a
+# sweep needs to keep per case, with __slots__ so there is no per-object dict.
+
+STATE_DTYPE = np.dtype([
+    ('T', np.float64),
+    ('P', np.float64),
+    ('h', np.float64),
+    ('s', np.float64),
+    ('x', np.float64),  # quality, iapws convention: 0 liquid, 1 vapour or gas
+    ('region', np.int8),  # IAPWS-97 region, 0 if not a water/steam state
+])
+
+
+# per exchanger values of an HRSG, K, kg/s and kW
+EXCHANGER_FIELDS = ('hot_in', 'hot_out', 'cold_in', 'cold_out', 'm_cold', 'heat_duty', 'min_approach')
+EXCHANGER_DTYPE = np.dtype([(name, np.float64) for name in EXCHANGER_FIELDS])
+
+
+def StateTable(n):
+    # n zeroed state points
+    return np.zeros(n, dtype=STATE_DTYPE)
+
+
+def WorkRecord(works):
+    # dict of numbers as a single record, still indexed by key: record['Net Work']
+    names = tuple(name for name, value in works.items() if not isinstance(value, str))
+    return np.array(tuple(float(works[name]) for name in names), dtype=_RecordType(names))
+
+
+@functools.lru_cache(maxsize=None)
+def _RecordType(names):
+    # one dtype shared by every record with the same keys; a dtype per record
+    # would cost more than the values it holds
+    return np.dtype([(name, np.float64) for name in names])
+
+
+class SteamCycleResult:
+    __slots__ = ('states', 'works', 'massflows', 'q_in', 'w_net', 'efficiency')
+
+    def __init__(self, states, works, massflows, q_in, w_net, efficiency):
+        self.states = states  # StateTable, row 0 unused
+        self.works = works  # WorkRecord of SteamCycle.total_works
+        self.massflows = massflows  # WorkRecord of SteamCycle.massflows
+        self.q_in = q_in
+        self.w_net = w_net
+        self.efficiency = efficiency
+
+    @property
+    def T(self):
+        return self.states['T']
+
+    @property
+    def P(self):
+        return self.states['P']
+
+    @property
+    def h(self):
+        return self.states['h']
+
+    @property
+    def s(self):
+        return self.states['s']
+
+
+class GasTurbineResult:
+    __slots__ = ('states', 'work', 'efficiency')
+
+    def __init__(self, states, work, efficiency):
+        self.states = states  # StateTable, row 0 unused
+        self.work = work  # WorkRecord of GasTurbine.work
+        self.efficiency = efficiency
+
+    @property
+    def T(self):
+        return self.states['T']
+
+    @property
+    def P(self):
+        return self.states['P']
+
+    @property
+    def h(self):
+        return self.states['h']
+
+    @property
+    def s(self):
+        return self.states['s']
+
+
+class HRSGResult:
+    __slots__ = ('exchangers', 'inlet_temp', 'outlet_temp', 'heatDuty', 'min_approach')
+
+    def __init__(self, exchangers, inlet_temp, outlet_temp, heatDuty, min_approach):
+        self.exchangers = exchangers  # EXCHANGER_DTYPE array, one row per exchanger in flue gas order
+        self.inlet_temp = inlet_temp
+        self.outlet_temp = outlet_temp
+        self.heatDuty = heatDuty
+        self.min_approach = min_approach
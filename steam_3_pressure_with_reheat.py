@@ -1,7 +1,12 @@
-import iapws.iapws97 as steam
 import numpy as np
+import copy
 import csv
 
+import backends
+import instrument
+import inverse_properties
+import states
+
 # Utility Functions
 
 
@@ -22,24 +27,12 @@ def BarToMP(pressure):
 
 
 def PFromTS(t, s, p0, precision, maxNoOfIters):
-    print("finding pressure at\nEntropy: "+str(s)+"\nTemperature: "+str(t))
-    p = p0
-    i = 0
-    currentConditions = steam._Region2(t, p)
-    print("Entropy at starting position: "+str(currentConditions['s']))
-    while currentConditions['s'] < s:
-        print("iteration: "+str(i))
-        print("CurrentEntropy: "+str(currentConditions['s']))
-        print("current pressure: "+str(p))
-        if i >= maxNoOfIters:
-            print("Ran out of iterations! Got to P="+str(p))
-            return p
-        p -= precision
-        currentConditions = steam._Region2(t, p)
-        i += 1
-    print("Conditions at T="+str(t)+" and s="+str(s))
-    print("Found pressure P="+str(p))
-    return p
+    # region 2 pressure [MPa] at t [K] and s [kJ/kgK], starting from p0.
+    # Solved by inverse_properties.PFromTS to a relative tolerance of 1e-9;
+    # precision is no longer used as a step size and is kept for existing callers.
+    # As before, running out of iterations returns the last pressure reached
+    # rather than failing.
+    return inverse_properties.PFromTS(t, s, region=2, guess=p0, maxiter=maxNoOfIters, last=True)
 
 
 k = 273.15
@@ -49,63 +42,36 @@ k = 273.15
 
 class SteamCycle:
 
-    def __init__(self, hp, ip, lp, m1, m2, m3, ma, steam_high_temp, water_low_temp):
+    def __init__(self, hp, ip, lp, m1, m2, m3, ma, steam_high_temp, water_low_temp, properties=None, keep_properties=True):
+        # properties: anything with the iapws97 interface, e.g. property_tables.Load(),
+        # or a backends name or Backend; the current backend by default
+        # keep_properties=False drops the full iapws result dicts (SpecificValues)
+        # once T, P, h, s, x and region are in the state table
+        props = instrument.Properties(*backends.Steam(properties))
+
         # Input Parameters
         self.HP = hp  # Bar
         self.IP = ip   # Bar
         self.LP = lp    # Bar
 
-        mass_flow_1 = m1
-        mass_flow_2 = m2
-        mass_flow_3 = m3
-        mass_flow_amine = ma
-
-        self.massflows = {
-            'mass flow 1': mass_flow_1,
-            'mass flow 2': mass_flow_2,
-            'mass flow 3': mass_flow_3,
-            'mass flow to amine': mass_flow_amine
-        }
-
-        # total mass flow
-        total_mass_flow = mass_flow_1 + mass_flow_2 + mass_flow_3
-
-        # Turbine Mass Flows
-        HPT_mass_flow = mass_flow_3
-        IPT_mass_flow = HPT_mass_flow + mass_flow_2
-        LPT_mass_flow = IPT_mass_flow + mass_flow_1 - mass_flow_amine
-
-        # Pump Mass Flows
-        HPP_mass_flow = mass_flow_3
-        IPP_mass_flow = mass_flow_2
-        LPP_mass_flow = IPP_mass_flow + HPP_mass_flow + mass_flow_1
-
-        # HRSG Mass Flows
-        self.economiser_1_mass_flow = total_mass_flow
-        self.economiser_2_mass_flow = mass_flow_2
-        self.economiser_3_mass_flow = mass_flow_3
-
-        self.evaporator_1_mass_flow = mass_flow_1
-        self.evaporator_2_mass_flow = mass_flow_2
-        self.evaporator_3_mass_flow = mass_flow_3
-
-        self.superheater_1_mass_flow = mass_flow_1 - mass_flow_amine
-        self.superheater_2_mass_flow = mass_flow_2 + mass_flow_3
-        self.superheater_3_mass_flow = mass_flow_3
-
         self.SteamHighTemp = steam_high_temp  # Celcius
 
         WaterLowTemp = water_low_temp  # Celcius
 
         quality = 0.9  # at turbine outlet
 
-        self.T = [0]*16
+        # state points 1-15 in one structured array (row 0 unused); T, P, h and
+        # s are views of its fields
+        self.states = states.StateTable(16)
+        self.T = self.states['T']
+        self.P = self.states['P']
+        self.h = self.states['h']
+        self.s = self.states['s']
 
         self.T[1] = ToKelvin(WaterLowTemp)
 
         # Pressures
-        self.P = [0]*16
-        self.P[1] = steam._PSat_T(self.T[1])
+        self.P[1] = props._PSat_T(self.T[1])
 
         # low pressure
         self.P[2] = BarToMP(self.LP)  # bar
@@ -128,62 +94,106 @@ class SteamCycle:
 
         # Temperatures in kelvin
 
-        self.T[3] = steam._TSat_P(self.P[3])
+        self.T[3] = props._TSat_P(self.P[3])
         self.T[4] = self.T[3]
 
         self.T[6] = self.T[1]
 
-        self.T[8] = steam._TSat_P(self.P[8])
+        self.T[8] = props._TSat_P(self.P[8])
         self.T[9] = self.T[8]
 
-        self.T[12] = steam._TSat_P(self.P[12])
+        self.T[12] = props._TSat_P(self.P[12])
         self.T[13] = self.T[12]
         self.T[14] = ToKelvin(self.SteamHighTemp)
 
         # Begin going around cycle working out available values
         self.SpecificValues = [0] * 16
 
-        self.SpecificValues[1] = steam._Region1(self.T[1], self.P[1])
+        self.SpecificValues[1] = props._Region1(self.T[1], self.P[1])
 
-        self.T[2] = steam._Backward1_T_Ps(self.P[2], self.SpecificValues[1]['s'])
-        self.SpecificValues[2] = steam._Region1(self.T[2], self.P[2])
+        self.T[2] = props._Backward1_T_Ps(self.P[2], self.SpecificValues[1]['s'])
+        self.SpecificValues[2] = props._Region1(self.T[2], self.P[2])
 
-        self.SpecificValues[3] = steam._Region4(self.P[3], 0)
-        self.SpecificValues[4] = steam._Region4(self.P[3], 1)
+        self.SpecificValues[3] = props._Region4(self.P[3], 0)
+        self.SpecificValues[4] = props._Region4(self.P[3], 1)
 
-        self.SpecificValues[6] = steam._Region4(self.P[1], quality)
-        self.T[5] = steam._Backward2_T_Ps(self.P[5], self.SpecificValues[6]['s'])
-        self.SpecificValues[5] = steam._Region2(self.T[5], self.P[5])
+        self.SpecificValues[6] = props._Region4(self.P[1], quality)
+        self.T[5] = props._Backward2_T_Ps(self.P[5], self.SpecificValues[6]['s'])
+        self.SpecificValues[5] = props._Region2(self.T[5], self.P[5])
 
-        self.T[7] = steam._Backward1_T_Ps(self.P[7], self.SpecificValues[3]['s'])
-        self.SpecificValues[7] = steam._Region1(self.T[7], self.P[7])
-        self.SpecificValues[8] = steam._Region4(self.P[8], 0)
-        self.SpecificValues[9] = steam._Region4(self.P[8], 1)
-        self.T[10] = steam._Backward2_T_Ps(self.P[10], self.SpecificValues[5]['s'])
-        self.SpecificValues[10] = steam._Region2(self.T[10], self.P[10])
-        self.T[11] = steam._Backward1_T_Ps(self.P[11], self.SpecificValues[3]['s'])
-        self.SpecificValues[11] = steam._Region1(self.T[11], self.P[11])
-        self.SpecificValues[12] = steam._Region4(self.P[12], 0)
-        self.SpecificValues[13] = steam._Region4(self.P[13], 1)
-        self.SpecificValues[14] = steam._Region2(self.T[14], self.P[14])
-        self.T[15] = steam._Backward2_T_Ps(self.P[15], self.SpecificValues[14]['s'])
-        self.SpecificValues[15] = steam._Region2(self.T[15], self.P[15])
-
-        self.s = [0] * 16
-        self.h = [0] * 16
+        self.T[7] = props._Backward1_T_Ps(self.P[7], self.SpecificValues[3]['s'])
+        self.SpecificValues[7] = props._Region1(self.T[7], self.P[7])
+        self.SpecificValues[8] = props._Region4(self.P[8], 0)
+        self.SpecificValues[9] = props._Region4(self.P[8], 1)
+        self.T[10] = props._Backward2_T_Ps(self.P[10], self.SpecificValues[5]['s'])
+        self.SpecificValues[10] = props._Region2(self.T[10], self.P[10])
+        self.T[11] = props._Backward1_T_Ps(self.P[11], self.SpecificValues[3]['s'])
+        self.SpecificValues[11] = props._Region1(self.T[11], self.P[11])
+        self.SpecificValues[12] = props._Region4(self.P[12], 0)
+        self.SpecificValues[13] = props._Region4(self.P[13], 1)
+        self.SpecificValues[14] = props._Region2(self.T[14], self.P[14])
+        self.T[15] = props._Backward2_T_Ps(self.P[15], self.SpecificValues[14]['s'])
+        self.SpecificValues[15] = props._Region2(self.T[15], self.P[15])
 
         for i in range(0, len(self.SpecificValues)):
             if i == 0:
                 continue
             self.s[i] = self.SpecificValues[i]['s']
             self.h[i] = self.SpecificValues[i]['h']
+            self.states['x'][i] = self.SpecificValues[i]['x']
+            self.states['region'][i] = self.SpecificValues[i]['region']
+        if not keep_properties:
+            self.SpecificValues = None
 
         #Printing T-P conditions at each point
-        print("-------------------------------------------------------")
-        print("\nCycle Conditions:")
+        instrument.Print("-------------------------------------------------------")
+        instrument.Print("\nCycle Conditions:")
         for i in range(1, 16):
-            print("\n\tT"+str(+i)+" = "+str(ToCelcius(self.T[i]))+" C")
-            print("\tP"+str(+i)+" = "+str(MPToBar(self.P[i]))+" bar")
+            instrument.Print("\n\tT"+str(+i)+" = "+str(ToCelcius(self.T[i]))+" C")
+            instrument.Print("\tP"+str(+i)+" = "+str(MPToBar(self.P[i]))+" bar")
+
+        self.SetMassFlows(m1, m2, m3, ma)
+
+    def SetMassFlows(self, m1, m2, m3, ma):
+        # mass flows only scale the works and heat inputs, so they can be changed
+        # without recalculating the state points
+        mass_flow_1 = m1
+        mass_flow_2 = m2
+        mass_flow_3 = m3
+        mass_flow_amine = ma
+
+        self.massflows = {
+            'mass flow 1': mass_flow_1,
+            'mass flow 2': mass_flow_2,
+            'mass flow 3': mass_flow_3,
+            'mass flow to amine': mass_flow_amine
+        }
+
+        # total mass flow
+        total_mass_flow = mass_flow_1 + mass_flow_2 + mass_flow_3
+
+        # Turbine Mass Flows
+        HPT_mass_flow = mass_flow_3
+        IPT_mass_flow = HPT_mass_flow + mass_flow_2
+        LPT_mass_flow = IPT_mass_flow + mass_flow_1 - mass_flow_amine
+
+        # Pump Mass Flows
+        HPP_mass_flow = mass_flow_3
+        IPP_mass_flow = mass_flow_2
+        LPP_mass_flow = IPP_mass_flow + HPP_mass_flow + mass_flow_1
+
+        # HRSG Mass Flows
+        self.economiser_1_mass_flow = total_mass_flow
+        self.economiser_2_mass_flow = mass_flow_2
+        self.economiser_3_mass_flow = mass_flow_3
+
+        self.evaporator_1_mass_flow = mass_flow_1
+        self.evaporator_2_mass_flow = mass_flow_2
+        self.evaporator_3_mass_flow = mass_flow_3
+
+        self.superheater_1_mass_flow = mass_flow_1 - mass_flow_amine
+        self.superheater_2_mass_flow = mass_flow_2 + mass_flow_3
+        self.superheater_3_mass_flow = mass_flow_3
 
         #Finding specific work of turbines and pump
         self.total_works = {
@@ -206,9 +216,9 @@ class SteamCycle:
             'HP Economiser Heat Input':  self.economiser_3_mass_flow * (self.h[12] - self.h[11])
         }
 
-        print("\nCycle Specific Works:")
+        instrument.Print("\nCycle Specific Works:")
         for work, value in self.total_works.items():
-            print("\n\t"+work+" = "+str(value))
+            instrument.Print("\n\t"+work+" = "+str(value))
 
         #Finding Total Heat into Cycle from HRSG
         self.q_in = self.total_works['LP Economiser Heat Input'] + self.total_works['LP Evaporator Heat Input'] + self.total_works['LP Superheater Heat Input'] + self.total_works['IP Economiser Heat Input'] + \
@@ -221,10 +231,15 @@ class SteamCycle:
         self.efficiency = self.w_net / self.q_in
         self.total_works['Efficiency'] = self.efficiency
 
-        print("\nCycle Efficiency:")
-        print("\n\tefficiency = "+str(self.efficiency*100)+"%")
-        print("\n\tWith a Net Work of : "+str(np.round(self.w_net))+"kW")
-        print("\n\tand a Total Heat Input of: "+str(np.round(self.q_in))+"kW\n")
+        instrument.Print("\nCycle Efficiency:")
+        instrument.Print("\n\tefficiency = "+str(self.efficiency*100)+"%")
+        instrument.Print("\n\tWith a Net Work of : "+str(np.round(self.w_net))+"kW")
+        instrument.Print("\n\tand a Total Heat Input of: "+str(np.round(self.q_in))+"kW\n")
+
+    def Result(self):
+        # compact copy of the states and energies for keeping many cases
+        return states.SteamCycleResult(self.states.copy(), states.WorkRecord(self.total_works), states.WorkRecord(self.massflows),
+                                       self.q_in, self.w_net, self.efficiency)
 
     def PlotResults(self, axes, type='ts', annotated=True, lines=True, linestyle="dashed"):
         connectivity = [[1, 2, 3, 4, 5, 6, 1],  # lp
@@ -241,7 +256,7 @@ class SteamCycle:
             axes.set_ylabel("Specific Enthalpy [kJ/kg]")
             axes.set_title("h-S Diagram for Steam Cycle")
         else:
-            print("Invalid graph type requested! Options are \'hs\' for enthalpy or \'ts\' for temperature")
+            instrument.Print("Invalid graph type requested! Options are \'hs\' for enthalpy or \'ts\' for temperature")
             return False
         #add labels to points
         labels = []
@@ -281,4 +296,169 @@ class SteamCycle:
                 writer.writerow(["Mass Flow Rates"])
                 writer.writerows(self.massflows.items())
         except IOError:
-            print("I/O error")
+            instrument.Print("I/O error")
+
+
+###############################################################################
+
+
+class SteamCycleBatch:
+    # Same cycle as SteamCycle, evaluated for arrays of operating points at once.
+    # Inputs broadcast against each other; T, P, h and s are (16, N) arrays indexed
+    # by state point exactly like the scalar lists (row 0 is unused). Values agree
+    # with SteamCycle to within 1e-9 relative.
+
+    def __init__(self, hp, ip, lp, m1, m2, m3, ma, steam_high_temp, water_low_temp, properties=None):
+        properties = instrument.Properties(*backends.Steam(properties))
+        hp, ip, lp, m1, m2, m3, ma, steam_high_temp, water_low_temp = np.broadcast_arrays(
+            *[np.asarray(value, dtype=float) for value in (hp, ip, lp, m1, m2, m3, ma, steam_high_temp, water_low_temp)])
+        self.n = hp.size
+        self.HP = hp.reshape(-1)
+        self.IP = ip.reshape(-1)
+        self.LP = lp.reshape(-1)
+        self._SetFlows(m1.reshape(-1), m2.reshape(-1), m3.reshape(-1), ma.reshape(-1))
+
+        self.SteamHighTemp = steam_high_temp.reshape(-1)
+
+        quality = 0.9  # at turbine outlet
+
+        T = np.zeros((16, self.n))
+        P = np.zeros((16, self.n))
+        h = np.zeros((16, self.n))
+        s = np.zeros((16, self.n))
+
+        T[1] = ToKelvin(water_low_temp.reshape(-1))
+        P[1] = properties.PSat_T(T[1])
+        P[2:6] = BarToMP(self.LP)
+        P[[7, 8, 9, 10, 15]] = BarToMP(self.IP)
+        P[11:15] = BarToMP(self.HP)
+
+        # saturation lines of the three drums and the condenser in one call;
+        # states 3/4, 8/9 and 12/13 are the liquid/vapour ends of each drum
+        liquid, vapour = properties.Saturation(P[[3, 8, 12, 1]])
+        T[[3, 4, 8, 9, 12, 13]] = np.repeat(liquid['T'][:3], 2, axis=0)
+        h[[3, 8, 12]] = liquid['h'][:3]
+        s[[3, 8, 12]] = liquid['s'][:3]
+        h[[4, 9, 13]] = vapour['h'][:3]
+        s[[4, 9, 13]] = vapour['s'][:3]
+        T[6] = T[1]
+        h[6] = liquid['h'][3] + quality * (vapour['h'][3] - liquid['h'][3])
+        s[6] = liquid['s'][3] + quality * (vapour['s'][3] - liquid['s'][3])
+        T[14] = ToKelvin(self.SteamHighTemp)
+
+        # pumps: isentropic from condensate (state 1) and LP drum liquid (state 3)
+        state = properties.Region1(T[1], P[1], derivatives=False)
+        h[1] = state['h']
+        s[1] = state['s']
+        T[2] = properties.Backward1_T_Ps(P[2], s[1])
+        T[7] = properties.Backward1_T_Ps(P[7], s[3])
+        T[11] = properties.Backward1_T_Ps(P[11], s[3])
+        state = properties.Region1(T[[2, 7, 11]], P[[2, 7, 11]], derivatives=False)
+        h[[2, 7, 11]] = state['h']
+        s[[2, 7, 11]] = state['s']
+
+        # turbines: HP inlet is fixed, the rest chain back from the exhaust (state 6)
+        state = properties.Region2(T[14], P[14], derivatives=False)
+        h[14] = state['h']
+        s[14] = state['s']
+        T[5] = properties.Backward2_T_Ps(P[5], s[6])
+        state = properties.Region2(T[5], P[5], derivatives=False)
+        h[5] = state['h']
+        s[5] = state['s']
+        T[10] = properties.Backward2_T_Ps(P[10], s[5])
+        T[15] = properties.Backward2_T_Ps(P[15], s[14])
+        state = properties.Region2(T[[10, 15]], P[[10, 15]], derivatives=False)
+        h[[10, 15]] = state['h']
+        s[[10, 15]] = state['s']
+
+        self.T = T
+        self.P = P
+        self.h = h
+        self.s = s
+
+        self._SetWorks()
+
+    def _SetFlows(self, mass_flow_1, mass_flow_2, mass_flow_3, mass_flow_amine):
+        # the input flows and the HRSG exchangers' water/steam flows
+        self.massflows = {
+            'mass flow 1': mass_flow_1,
+            'mass flow 2': mass_flow_2,
+            'mass flow 3': mass_flow_3,
+            'mass flow to amine': mass_flow_amine
+        }
+
+        total_mass_flow = mass_flow_1 + mass_flow_2 + mass_flow_3
+
+        # HRSG Mass Flows
+        self.economiser_1_mass_flow = total_mass_flow
+        self.economiser_2_mass_flow = mass_flow_2
+        self.economiser_3_mass_flow = mass_flow_3
+
+        self.evaporator_1_mass_flow = mass_flow_1
+        self.evaporator_2_mass_flow = mass_flow_2
+        self.evaporator_3_mass_flow = mass_flow_3
+
+        self.superheater_1_mass_flow = mass_flow_1 - mass_flow_amine
+        self.superheater_2_mass_flow = mass_flow_2 + mass_flow_3
+        self.superheater_3_mass_flow = mass_flow_3
+
+    def _SetWorks(self):
+        # works, heat input and efficiency from the states and mass flows
+        h = self.h
+        mass_flow_1 = self.massflows['mass flow 1']
+        mass_flow_2 = self.massflows['mass flow 2']
+        mass_flow_3 = self.massflows['mass flow 3']
+        mass_flow_amine = self.massflows['mass flow to amine']
+
+        # Turbine Mass Flows
+        HPT_mass_flow = mass_flow_3
+        IPT_mass_flow = HPT_mass_flow + mass_flow_2
+        LPT_mass_flow = IPT_mass_flow + mass_flow_1 - mass_flow_amine
+
+        # Pump Mass Flows
+        HPP_mass_flow = mass_flow_3
+        IPP_mass_flow = mass_flow_2
+        LPP_mass_flow = IPP_mass_flow + HPP_mass_flow + mass_flow_1
+
+        self.total_works = {
+            'LP Pump work': LPP_mass_flow * (h[2] - h[1]),
+            'IP Pump work': IPP_mass_flow * (h[7] - h[3]),
+            'HP Pump work': HPP_mass_flow * (h[11] - h[3]),
+            'HP Turbine work': HPT_mass_flow * (h[14] - h[15]),
+            'IP Turbine work': IPT_mass_flow * (h[10] - h[5]),
+            'LP Turbine work': LPT_mass_flow * (h[5] - h[6]),
+            'LP Superheater Heat Input': self.superheater_1_mass_flow * (h[5] - h[4]),
+            'LP Evaporator Heat Input': self.evaporator_1_mass_flow * (h[4] - h[3]),
+            'LP Economiser Heat Input':  self.economiser_1_mass_flow * (h[3] - h[2]),
+            'IP Superheater Heat Input': self.superheater_2_mass_flow * (h[10] - h[15]),
+            'IP Superheater 2 Heat Input': self.evaporator_2_mass_flow * (h[15] - h[9]),
+            'IP Evaporator Heat Input': self.evaporator_2_mass_flow * (h[9] - h[8]),
+            'IP Economiser Heat Input':  self.economiser_2_mass_flow * (h[8] - h[7]),
+            'HP Superheater Heat Input': self.superheater_3_mass_flow * (h[14] - h[13]),
+            'HP Evaporator Heat Input': self.evaporator_3_mass_flow * (h[13] - h[12]),
+            'HP Economiser Heat Input':  self.economiser_3_mass_flow * (h[12] - h[11])
+        }
+
+        works = self.total_works
+        self.q_in = works['LP Economiser Heat Input'] + works['LP Evaporator Heat Input'] + works['LP Superheater Heat Input'] + works['IP Economiser Heat Input'] + \
+            works['IP Evaporator Heat Input'] + works['IP Superheater Heat Input'] + works['HP Economiser Heat Input'] + works['HP Evaporator Heat Input'] + works['HP Superheater Heat Input']
+        self.w_net = works['HP Turbine work'] + works['IP Turbine work'] + works['LP Turbine work'] - works['HP Pump work'] - works['IP Pump work'] - works['LP Pump work']
+        works['Net Work'] = self.w_net
+        self.efficiency = self.w_net / self.q_in
+        works['Efficiency'] = self.efficiency
+
+    def WithFlows(self, index, m1, m2, m3):
+        # this cycle's cases `index` (repeats allowed) with steam flows m1, m2
+        # and m3 instead: the states are copied, only the flows and works
+        # are recalculated
+        cycle = copy.copy(self)
+        cycle.n = len(index)
+        cycle.HP, cycle.IP, cycle.LP, cycle.SteamHighTemp = self.HP[index], self.IP[index], self.LP[index], self.SteamHighTemp[index]
+        cycle.T, cycle.P, cycle.h, cycle.s = self.T[:, index], self.P[:, index], self.h[:, index], self.s[:, index]
+        cycle._SetFlows(np.asarray(m1, dtype=float), np.asarray(m2, dtype=float), np.asarray(m3, dtype=float),
+                        self.massflows['mass flow to amine'][index])
+        cycle._SetWorks()
+        return cycle
+
+    def __len__(self):
+        return self.n
@@ -0,0 +1,140 @@
+import concurrent.futures
+import itertools
+import os
+
+import numpy as np
+
+import instrument
+import plant
+
+# Parametric sweeps of the whole plant (plant.EvaluatePlant) over a process pool.
+#
+#     table = sweep.Sweep(sweep.Grid(hp=[140, 150, 165], P_r=np.linspace(15, 25, 11)))
+#     table['net_work'], table['hp'] ...
+#
+# Cases are a grid (Grid) or a list of dicts (Cases); anything not given comes
+# from plant.DEFAULTS. They are split into contiguous chunks, each chunk is one
+# work unit sent to a worker as a single float array and returned as one, so
+# pickling stays small and the workers only synchronise once per chunk. Rows of
+# the table are always in case order whatever order the chunks finish in.
+# Cases the models cannot evaluate are left as nan.
+
+
+def Grid(**axes):
+    # every combination of the given values, the last axis varying fastest
+    names = tuple(axes)
+    values = [np.atleast_1d(np.asarray(axes[name], dtype=float)) for name in names]
+    rows = np.array(list(itertools.product(*values)), dtype=float).reshape(-1, len(names))
+    return names, rows
+
+
+def Cases(cases):
+    # a list of dicts (or a dict of equal length sequences) as (names, rows).
+    # Missing keys take the plant.DEFAULTS value.
+    if isinstance(cases, dict):
+        names = tuple(cases)
+        return names, np.stack([np.asarray(cases[name], dtype=float) for name in names], axis=1)
+    names = tuple(sorted(set().union(*cases), key=plant.INPUTS.index))
+    rows = [[case.get(name, plant.DEFAULTS[name]) for name in names] for case in cases]
+    return names, np.array(rows, dtype=float).reshape(-1, len(names))
+
+
+class SweepTable:
+    # input and result columns of a sweep, one row per case
+
+    def __init__(self, names, rows, results):
+        self.inputs = names
+        self.results = plant.RESULTS
+        self.columns = {}
+        for index, name in enumerate(names):
+            self.columns[name] = rows[:, index]
+        for index, name in enumerate(plant.RESULTS):
+            self.columns[name] = results[:, index]
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def Row(self, index):
+        return {name: float(column[index]) for name, column in self.columns.items()}
+
+    def ToArray(self):
+        # structured array with one field per column
+        table = np.empty(len(self), dtype=[(name, float) for name in self.columns])
+        for name, column in self.columns.items():
+            table[name] = column
+        return table
+
+    def SaveResults(self, filename):
+        try:
+            np.savetxt(filename + ".csv", np.stack(list(self.columns.values()), axis=1),
+                       delimiter=',', header=','.join(self.columns), comments='')
+            return True
+        except IOError:
+            instrument.Print("I/O error")
+            return False
+
+
+def Sweep(cases, workers=None, chunksize=None, progress=None, batch=False, executor=None, segments=1, store=None, cache=None):
+    # evaluate every case, returning a SweepTable in case order.
+    # cases: (names, rows) from Grid/Cases, or a list of dicts.
+    # workers: processes to use (default os.cpu_count(); 1 runs in this process).
+    # chunksize: cases per work unit (default about 4 chunks per worker, so a
+    #   slow chunk does not leave the other workers idle at the end).
+    # progress: called as progress(cases_done, cases_total) after each chunk.
+    # batch: evaluate each chunk with the vectorised plant.EvaluatePlantBatch
+    #   (about 100x faster per case, agrees to 1e-9 relative).
+    # executor: an existing concurrent.futures executor to reuse, e.g. across the
+    #   generations of an optimisation, instead of starting a new pool.
+    # segments: exchanger discretisation used for min_approach.
+    # store: a result_store.ResultStore that each chunk is appended to as it
+    #   finishes (case numbers follow on from the store's, in case order).
+    # cache: a disk_cache.DiskCache to look cases up in and add them to. Worker
+    #   processes count hits in their own copies, so its Stats() only covers
+    #   cases evaluated in this process.
+    names, rows = cases if isinstance(cases, tuple) else Cases(cases)
+    total = len(rows)
+    workers = workers or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, -(-total // (4 * workers)))
+    results = np.full((total, len(plant.RESULTS)), np.nan)
+    starts = range(0, total, chunksize)
+    first_case = len(store) if store is not None else 0
+
+    done = 0
+    if workers == 1 and executor is None:
+        for start in starts:
+            results[start:start + chunksize] = plant.EvaluateRows(rows[start:start + chunksize], names, batch, segments, cache)
+            done += len(rows[start:start + chunksize])
+            if store is not None:
+                _Store(store, first_case, start, names, rows[start:start + chunksize], results[start:start + chunksize])
+            if progress is not None:
+                progress(done, total)
+        if store is not None:
+            store.Flush()
+        return SweepTable(names, rows, results)
+
+    pool = executor or concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {pool.submit(plant.EvaluateRows, rows[start:start + chunksize], names, batch, segments, cache): start for start in starts}
+        for future in concurrent.futures.as_completed(futures):
+            start = futures[future]
+            chunk = future.result()
+            results[start:start + len(chunk)] = chunk
+            done += len(chunk)
+            if store is not None:
+                _Store(store, first_case, start, names, rows[start:start + len(chunk)], chunk)
+            if progress is not None:
+                progress(done, total)
+    finally:
+        if executor is None:
+            pool.shutdown()
+        if store is not None:
+            store.Flush()
+    return SweepTable(names, rows, results)
+
+
+def _Store(store, first_case, start, names, rows, results):
+    store.AppendTable(names, rows, results, cases=first_case + start + np.arange(len(rows)))
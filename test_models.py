@@ -0,0 +1,279 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import arrangement
+import batch_input
+import benchmarks
+import disk_cache
+import heat_balance
+import iapws97_vec
+import instrument
+import inverse_properties
+import plant
+import plant_model
+import property_tables
+import result_store
+import sensitivity
+import service
+import steam_3_pressure_with_reheat as steam
+import uncertainty
+
+# Pass/fail checks of the accuracy the benchmarks report, run from within the
+# HRSG folder: python -m pytest -q test_models.py
+
+
+def test_design_point_matches_references():
+    # scalar, batch and plant_model paths against the reference CSVs
+    errors = benchmarks.Accuracy()
+    failed = {name: error for name, error in errors.items() if not error <= benchmarks.ACCURACY_RTOL}
+    assert not failed
+
+
+def test_steam_cycle_batch_matches_scalar():
+    inputs = benchmarks.RandomSteamInputs(100, seed=3)
+    batch = steam.SteamCycleBatch(*inputs)
+    with instrument.Quiet():
+        for i in range(len(batch)):
+            cycle = steam.SteamCycle(*[value[i] for value in inputs])
+            for name in ('T', 'P', 'h', 's'):
+                np.testing.assert_allclose(getattr(batch, name)[1:, i], getattr(cycle, name)[1:], rtol=1e-9, atol=1e-12, err_msg=name)
+            np.testing.assert_allclose([batch.w_net[i], batch.q_in[i], batch.efficiency[i]], [cycle.w_net, cycle.q_in, cycle.efficiency], rtol=1e-9)
+
+
+def test_steam_cycle_batch_with_flows_matches_new_batch():
+    inputs = benchmarks.RandomSteamInputs(50, seed=4)
+    flows = benchmarks.RandomSteamInputs(50, seed=5)[3:6]
+    index = np.arange(50)
+    rescaled = steam.SteamCycleBatch(*inputs).WithFlows(index, *flows)
+    fresh = steam.SteamCycleBatch(*inputs[:3], *flows, *inputs[6:])
+    for name in ('h', 'q_in', 'w_net', 'economiser_1_mass_flow', 'superheater_2_mass_flow'):
+        np.testing.assert_array_equal(getattr(rescaled, name), getattr(fresh, name), err_msg=name)
+
+
+def test_inverse_properties_round_trip():
+    rng = np.random.default_rng(0)
+    T = rng.uniform(650, 1050, 2000)
+    P = np.exp(rng.uniform(np.log(0.001), np.log(10), 2000))
+    region2 = iapws97_vec.Region2(T, P, derivatives=False)
+    T1 = rng.uniform(280, 600, 2000)
+    P1 = np.maximum(np.exp(rng.uniform(np.log(0.01), np.log(90), 2000)), 1.001 * iapws97_vec.PSat_T(T1))
+    region1 = iapws97_vec.Region1(T1, P1, derivatives=False)
+
+    np.testing.assert_allclose(inverse_properties.PFromTS(T, region2['s']), P, rtol=1e-8)
+    np.testing.assert_allclose(inverse_properties.TFromPH(P, region2['h'], region=2), T, rtol=1e-8)
+    np.testing.assert_allclose(inverse_properties.TFromPS(P, region2['s'], region=2), T, rtol=1e-8)
+    np.testing.assert_allclose(inverse_properties.PFromTH(T, region2['h'], region=2), P, rtol=1e-8)
+    np.testing.assert_allclose(inverse_properties.TFromPH(P1, region1['h']), T1, rtol=1e-8)
+    np.testing.assert_allclose(inverse_properties.TFromPS(P1, region1['s']), T1, rtol=1e-8)
+
+
+def test_arrangement_search_matches_exhaustive():
+    assert benchmarks.ArrangementCheck()
+
+
+def test_heat_balance_gives_the_pinch():
+    # the solved flows, put back through the scalar plant, give the pinch
+    solved = heat_balance.SolveBatch({'hp': [140, 150, 165], 'P_r': [15, 20, 25]}, pinch=10)
+    assert solved['converged'].all()
+    assert solved['residual'].max() <= 1e-6
+    for case in range(3):
+        inputs = {name: float(value[case]) for name, value in solved['inputs'].items()}
+        gasTurbine, steamCycle, hrsg = plant.Plant(inputs, gas_properties=False)
+        exchangers = {exchanger.name: exchanger for exchanger in hrsg.exchangers}
+        pinches = [exchangers[name].t['hot out'] - exchangers[name].t['cold in'] for name in heat_balance.EVAPORATORS]
+        np.testing.assert_allclose(pinches, 10, atol=1e-6)
+        assert abs(solved['results']['net_work'][case] - plant.Results(gasTurbine, steamCycle, hrsg)['net_work']) <= 1e-6 * abs(solved['results']['net_work'][case])
+
+
+def test_arrangement_of_the_design_point_is_unchanged_by_search_size():
+    # the best arrangement does not depend on how many are kept
+    hrsg = plant.Plant(segments=5)[2]
+    assert [best.approaches for best in arrangement.Search(hrsg, count=1)] == [best.approaches for best in arrangement.Search(hrsg, count=5)[:1]]
+
+
+def test_batch_input_checks_loaded_values_and_skips_blank_lines(tmp_path):
+    # a zero load leaves no flue gas, so that row is invalid; the blank line
+    # is not a row whether or not the chunk parses on the fast path
+    for last in ('150,1', '150,x'):
+        filename = str(tmp_path / 'points.csv')
+        with open(filename, 'w') as f:
+            f.write('hp,load\n150,0\n\n' + last + '\n')
+        chunks = list(batch_input.Chunks(filename))
+        assert [len(rows) for names, rows, valid in chunks] == [2]
+        assert chunks[0][2].tolist() == [False, last == '150,1']
+
+
+def test_steam_cycle_pfromts_returns_the_last_pressure_when_out_of_iterations():
+    s = iapws97_vec.Region2(700, 0.8, derivatives=False)['s']
+    assert abs(steam.PFromTS(700, s, 1.8, 1e-4, 50) / 0.8 - 1) <= 1e-9
+    assert np.isfinite(steam.PFromTS(700, s, 1.8, 1e-4, 1))
+    assert np.isnan(inverse_properties.PFromTS(700, s, guess=1.8, maxiter=1))
+
+
+def test_service_deduplicates_caches_and_answers_bad_lines(tmp_path):
+    # the service in a thread of this process, evaluating on a thread pool
+    path = str(tmp_path / 'hrsg.sock')
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    server = service.Service(executor=executor)
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(server.Serve(path))
+
+    def Run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+    thread = threading.Thread(target=Run)
+    with instrument.Quiet():
+        thread.start()
+        try:
+            while not os.path.exists(path):
+                time.sleep(0.01)
+            with service.Client(path, timeout=60) as client:
+                first, again, other, repeat = client.EvaluateMany([{'hp': 150}, {'hp': 150}, {'hp': 151}, {'hp': 150}])
+                assert first == again == repeat and first != other
+                assert abs(first['net_work'] - plant.EvaluatePlant(hp=150)['net_work']) <= 1e-9 * first['net_work']
+                stats = client.Stats()
+                assert (stats['evaluated'], stats['deduplicated'], stats['cached']) == (2, 2, 0)
+                assert client.Evaluate({'hp': 151}) == other
+                assert client.Stats()['cached'] == 1
+
+                with pytest.raises(ValueError, match="Unknown plant inputs"):
+                    client.Evaluate({'nope': 1})
+                client.file.write(b"not json\n")
+                client.file.flush()
+                assert json.loads(client.file.readline()) == {'id': None, 'error': "Invalid JSON"}
+                with pytest.raises(ValueError, match="Request too long"):
+                    client.Requests([{'inputs': {'hp': 'x' * service.LINE_LIMIT}}, {'inputs': {'hp': 'y' * service.LINE_LIMIT}}])
+                # the second over-long reply is skipped and the connection still works
+                assert client.Evaluate({'hp': 150}) == first
+        finally:
+            loop.call_soon_threadsafe(task.cancel)
+            thread.join()
+            loop.close()
+            executor.shutdown()
+
+
+def test_result_store_round_trip_and_chunk_files(tmp_path):
+    path = str(tmp_path / 'store')
+    inputs = dict(zip(('hp', 'ip', 'lp', 'm1', 'm2', 'm3', 'ma', 'steam_high_temp', 'water_low_temp'), benchmarks.RandomSteamInputs(20)))
+    parts = [plant.PlantBatch({name: value[first:first + 10] for name, value in inputs.items()}) for first in (0, 10)]
+    with result_store.ResultStore(path, chunk_cases=8) as store:
+        for first, objects in zip((0, 10), parts):
+            store.AppendBatch(*objects, inputs={name: value[first:first + 10] for name, value in inputs.items()})
+    store = result_store.ResultStore(path)
+    cases = store.Read('cases')
+    assert cases['case'].tolist() == list(range(20))
+    np.testing.assert_array_equal(cases['net_work'], np.concatenate([plant.ResultsBatch(*objects)['net_work'] for objects in parts]))
+    np.testing.assert_array_equal(cases['hp'], inputs['hp'])
+    np.testing.assert_array_equal(store.Read('steam_states', case=13)['h'], parts[1][1].h[1:, 3])
+    hot_out = np.concatenate([np.stack([exchanger.t['hot out'] for exchanger in objects[2].exchangers], axis=1).reshape(-1) for objects in parts])
+    np.testing.assert_array_equal(store.Read('exchangers')['hot_out'], hot_out)
+
+    # leftovers of a crashed flush are not chunks, and a gap in the numbers
+    # is not refilled
+    np.save(os.path.join(path, 'cases-000005.npy.tmp'), cases[:1])
+    with open(os.path.join(path, 'cases.123.tmp'), 'wb') as f:
+        f.write(b'partial')
+    os.rename(os.path.join(path, 'cases-000001.npy'), os.path.join(path, 'cases-000007.npy'))
+    store.AppendTable(['hp'], [[150]], [[0] * len(plant.RESULTS)])
+    store.Flush()
+    assert [os.path.basename(name) for name in store._Files('cases')] == ['cases-000000.npy', 'cases-000007.npy', 'cases-000008.npy']
+    assert store.Read('cases')['case'].tolist() == list(range(21))
+
+
+def test_disk_cache_evicts_least_recently_used_and_prunes_only_versions(tmp_path):
+    cache = disk_cache.DiskCache(str(tmp_path), max_bytes=2 ** 30)
+    keys = [disk_cache.Key('gas_turbine', [i]) for i in range(10)]
+    for i, key in enumerate(keys):
+        cache.Put('gas_turbine', key, x=np.full(100, i, dtype=float))
+        os.utime(cache._Filename('gas_turbine', key), (1000 + i, 1000 + i))
+    assert cache.Get('gas_turbine', keys[0])['x'][0] == 0  # now the most recent
+    cache.max_bytes = cache.Size() // 2
+    assert cache.Evict() == 6
+    assert [cache.Get('gas_turbine', key) is not None for key in keys] == [True] + [False] * 6 + [True] * 3
+
+    # a failed write leaves no temporary behind
+    os.makedirs(os.path.join(cache._Filename('gas_turbine', keys[1]), 'entry'))
+    with instrument.Quiet():
+        assert not cache.Put('gas_turbine', keys[1], x=np.zeros(100))
+    assert os.listdir(os.path.dirname(cache._Filename('gas_turbine', keys[1]))) == [keys[1] + '.npy']
+
+    old = '0123456789abcdef'
+    for name in (old, 'results', 'abcdef'):
+        os.makedirs(os.path.join(str(tmp_path), name))
+    open(os.path.join(str(tmp_path), 'fedcba9876543210'), 'w').close()
+    assert cache.Prune() == [old]
+    assert sorted(os.listdir(str(tmp_path))) == sorted([cache.version, 'results', 'abcdef', 'fedcba9876543210'])
+
+
+def test_property_tables_within_their_documented_errors():
+    # the worst errors listed at the top of property_tables
+    bounds = {'region1 h': 5e-3, 'region1 s': 8e-6, 'region2 h': 5e-2, 'region2 s': 7e-5, 'saturation T': 4e-6,
+              'saturation h': 2e-4, 'saturation s': 3e-7, 'backward1 T': 2e-4, 'backward2 T': 4e-3}
+    errors = property_tables.Validate(property_tables.Load(), points=500)
+    assert {name: error for name, error in errors.items() if not error <= bounds[name]} == {}
+
+
+def test_plant_model_reruns_only_the_affected_nodes():
+    exchangers = [name for name, cold_in, cold_out, mass_flow, exchanger_type in plant.EXCHANGERS]
+    with instrument.Quiet():
+        model = plant_model.PlantModel()
+        model.Calculate()
+        model.Set(m1=45)
+        model.Calculate()
+        assert model.recomputed == ['steam_flows'] + exchangers + ['hrsg', 'results']
+        model.Set(P_r=18)
+        results = model.Calculate()
+        assert model.recomputed == ['gas_turbine'] + exchangers + ['hrsg', 'results']
+        expected = plant.EvaluatePlant(m1=45, P_r=18)
+        model.SetExchanger('LP Economiser', m_cold=101)
+        model.Calculate()
+        # the last exchanger on the gas side, so none after it
+        assert model.recomputed == ['LP Economiser', 'hrsg', 'results']
+        model.Calculate()
+        assert model.recomputed == []
+    for name in plant.RESULTS:
+        assert results[name] == pytest.approx(expected[name], rel=1e-9, abs=1e-12), name
+
+
+def test_uncertainty_statistics_and_seeds():
+    rng = np.random.default_rng(0)
+    values = rng.normal(5, 2, 100000)
+    statistics = uncertainty.Statistics(sketch_size=200)
+    for chunk in np.split(values, 100):
+        statistics.Add(chunk)
+    assert statistics.count == len(values)
+    assert statistics.mean == pytest.approx(values.mean(), rel=1e-12)
+    assert statistics.std == pytest.approx(values.std(ddof=1), rel=1e-9)
+    assert (statistics.min, statistics.max) == (values.min(), values.max())
+    # a quantile from the sketch is off by about 1 / sketch_size in rank
+    quantiles = np.array(uncertainty.QUANTILES)
+    ranks = np.searchsorted(np.sort(values), statistics.Quantile(quantiles)) / len(values)
+    np.testing.assert_allclose(ranks, quantiles, atol=2 / 200)
+
+    with instrument.Quiet():
+        first, again, other = [uncertainty.Propagate(n=300, batch=100, seed=seed).statistics for seed in (1, 1, 2)]
+    assert first == again
+    assert first['net_work']['mean'] != other['net_work']['mean']
+
+
+def test_sensitivity_jacobian_matches_central_differences():
+    wrt = ('m1', 'P_r', 'hp', 'T_atm')
+    with instrument.Quiet():
+        result = sensitivity.Jacobian(wrt=wrt)
+        brute = np.empty_like(result.jacobian)
+        for column, name in enumerate(result.wrt):
+            step = result.steps[name]
+            up = plant.EvaluatePlant({name: result.inputs[name] + step})
+            down = plant.EvaluatePlant({name: result.inputs[name] - step})
+            brute[:, column] = [(up[output] - down[output]) / (2 * step) for output in result.outputs]
+    scale = np.maximum(np.abs(brute), 1e-6 * np.max(np.abs(brute), axis=1, keepdims=True))
+    assert np.max(np.abs(result.jacobian - brute) / scale) <= 1e-5
@@ -0,0 +1,124 @@
+import csv
+import itertools
+
+import numpy as np
+
+import plant
+import plant_model
+
+# The plant over a series of operating conditions, e.g. a year of hourly
+# ambient temperatures and load points, as a generator pipeline.
+#
+#     hours = timeseries.Hourly(T_atm=temperatures, load=loads)
+#     for step in timeseries.Simulate(hours):
+#         step['T_atm'], step['net_work'] ...
+#
+# Each condition is a dict of plant inputs that differ from the base case
+# (plant.DEFAULTS unless `base` is given), optionally with 'load', a fraction
+# that scales LOAD_INPUTS. Conditions are read `block` at a time, evaluated
+# together with the vectorised batch classes and yielded one dict per step, so
+# memory stays the same however long the series is and the input can itself be
+# a generator (a file being read, a live feed).
+#
+# incremental=True evaluates step by step on a plant_model.PlantModel instead:
+# each step reruns only what its changes reach, so the steam state points are
+# reused for as long as the pressures and temperatures of the steam cycle stay
+# the same. It is the slower mode, for when the full objects of each step are
+# wanted (model=...). Neither mode has a per-step iteration to warm start: the
+# steam states come from the explicit IAPWS-97 backward equations.
+
+# inputs that scale with the 'load' fraction: fuel, flue gas and steam flows
+LOAD_INPUTS = ('fuel_in', 'fluegas_massflow', 'm1', 'm2', 'm3', 'ma')
+
+
+def Hourly(**series):
+    # conditions from equal length sequences (or iterators) of input values,
+    # e.g. Hourly(T_atm=temperatures, load=loads)
+    names = tuple(series)
+    for values in zip(*series.values()):
+        yield dict(zip(names, values))
+
+
+def ReadConditions(filename):
+    # conditions from a CSV file with a header row of input names (and 'load'),
+    # read a row at a time
+    with open(filename, newline='') as f:
+        for row in csv.DictReader(f):
+            yield {name: float(value) for name, value in row.items()}
+
+
+def SaveSteps(steps, filename, names=None):
+    # write the steps from Simulate to filename.csv as they arrive; names are
+    # the condition columns, by default those of the first step
+    steps = iter(steps)
+    first = next(steps, None)
+    if first is None:
+        return 0
+    names = list(names or [name for name in first if name not in plant.RESULTS and name != 'step'])
+    count = 0
+    with open(filename + ".csv", 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['step'] + names + list(plant.RESULTS))
+        for step in itertools.chain([first], steps):
+            writer.writerow([step['step']] + [step.get(name, '') for name in names] + [step[name] for name in plant.RESULTS])
+            count += 1
+    return count
+
+
+def Blocks(conditions, block):
+    # lists of up to `block` conditions
+    conditions = iter(conditions)
+    while True:
+        chunk = list(itertools.islice(conditions, block))
+        if not chunk:
+            return
+        yield chunk
+
+
+def Inputs(condition, base):
+    # plant inputs of one condition, load applied
+    unknown = [name for name in condition if name not in base and name != 'load']
+    if unknown:
+        raise ValueError("Unknown plant inputs " + ", ".join(unknown) + ", expected " + ", ".join(base) + " or load")
+    values = dict(base)
+    values.update(condition)
+    load = values.pop('load', 1)
+    for name in LOAD_INPUTS:
+        values[name] = values[name] * load
+    return values
+
+
+def Simulate(conditions, base=None, block=1000, segments=1, incremental=False, store=None, model=None):
+    # yields {'step', the condition's own entries, plant.RESULTS} for each
+    # condition in turn. Steps the models cannot evaluate have nan results.
+    # store: a result_store.ResultStore each block's cases are appended to.
+    # model: the PlantModel for incremental=True, e.g. to inspect its objects.
+    base = dict(plant.DEFAULTS, **(base or {}))
+    step = 0
+    if incremental:
+        model = model or plant_model.PlantModel(base, segments=segments, gas_properties=False)
+    for chunk in Blocks(conditions, block):
+        names = plant.INPUTS
+        rows = np.array([[values[name] for name in names] for values in (Inputs(condition, base) for condition in chunk)], dtype=float)
+        if incremental:
+            results = np.array([_Step(model, dict(zip(names, row))) for row in rows.tolist()], dtype=float)
+        else:
+            results = plant.EvaluateRows(rows, names, batch=True, segments=segments)
+        if store is not None:
+            store.AppendTable(names, rows, results)
+        for condition, row in zip(chunk, results.tolist()):
+            yield dict(condition, step=step, **dict(zip(plant.RESULTS, row)))
+            step += 1
+    if store is not None:
+        store.Flush()
+
+
+def _Step(model, inputs):
+    # plant.RESULTS of one step on the incremental model
+    try:
+        model.Set(**inputs)
+        results = model.Calculate()
+    except (ValueError, ZeroDivisionError, NotImplementedError, OverflowError):
+        model.dirty = set(model.nodes)  # half updated, start clean next step
+        return [np.nan] * len(plant.RESULTS)
+    return [results[name] for name in plant.RESULTS]
@@ -0,0 +1,236 @@
+import math
+
+import numpy as np
+
+import instrument
+import plant
+
+# Monte Carlo uncertainty of the plant's results from uncertain inputs.
+#
+#     analysis = uncertainty.Propagate(uncertainty.EXAMPLE, n=100000, seed=1)
+#     analysis.statistics['overall_efficiency']   # mean, std, min, max, quantiles
+#     uncertainty.Propagate({'n_t': uncertainty.Normal(0.85, 0.01),
+#                            'P_r': uncertainty.Uniform(18, 22)}, method='random')
+#
+# Inputs without a distribution keep their plant.DEFAULTS value (or `base`).
+# Samples are drawn `batch` at a time, run through plant.EvaluatePlantBatch and
+# folded into streaming statistics, so memory depends on the batch size and
+# not on n. method 'lhs' is a Latin hypercube within each batch (each input's
+# range split into `batch` equally likely strata, one sample in each, strata
+# paired at random between inputs); 'random' is plain Monte Carlo. The same
+# seed gives the same samples and statistics.
+#
+# Mean and variance are merged batch by batch (Chan et al.). Quantiles come
+# from a compressed sample: whenever more than 2 * sketch_size values are held
+# they are sorted and merged into sketch_size weighted centroids of equal
+# weight, so a quantile is off by at most about 1 / sketch_size in rank.
+# Samples the models cannot evaluate are counted as failed and left out.
+
+OUTPUTS = ('overall_efficiency', 'net_work')
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+
+class Normal:
+
+    def __init__(self, mean, std):
+        self.mean = mean
+        self.std = std
+
+    def Ppf(self, u):
+        # inverse cumulative distribution of uniform u in (0, 1)
+        return self.mean + self.std * StandardNormalPpf(u)
+
+
+class Uniform:
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def Ppf(self, u):
+        return self.low + (self.high - self.low) * u
+
+
+class Triangular:
+
+    def __init__(self, low, mode, high):
+        self.low = low
+        self.mode = mode
+        self.high = high
+
+    def Ppf(self, u):
+        width = self.high - self.low
+        split = (self.mode - self.low) / width
+        return np.where(u < split, self.low + np.sqrt(u * width * (self.mode - self.low)),
+                        self.high - np.sqrt((1 - u) * width * (self.high - self.mode)))
+
+
+class TruncatedNormal:
+    # a normal distribution cut to [low, high], e.g. for efficiencies below 1
+
+    def __init__(self, mean, std, low=-np.inf, high=np.inf):
+        self.normal = Normal(mean, std)
+        self.low = _StandardNormalCdf((low - mean) / std)
+        self.high = _StandardNormalCdf((high - mean) / std)
+
+    def Ppf(self, u):
+        return self.normal.Ppf(self.low + (self.high - self.low) * u)
+
+
+# Acklam's rational approximation of the standard normal inverse cdf, relative
+# error below 1.2e-9
+_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02, 1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02, 6.680131188771972e+01, -1.328068155288572e+01)
+_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00, -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00)
+_LOW = 0.02425
+
+
+def StandardNormalPpf(u):
+    u = np.asarray(u, dtype=float)
+    tail = np.minimum(u, 1 - u)
+    q = np.sqrt(-2 * np.log(np.maximum(tail, 1e-300)))
+    x_tail = np.polyval(_C, q) / np.polyval(_D + (1,), q)
+    x_tail = np.where(u < 0.5, x_tail, -x_tail)
+    r = (u - 0.5) ** 2
+    x_central = (u - 0.5) * np.polyval(_A, r) / np.polyval(_B + (1,), r)
+    return np.where(tail < _LOW, x_tail, x_central)
+
+
+def _StandardNormalCdf(x):
+    # scalar cdf for the truncation limits
+    return 0.5 * (1 + math.erf(x / np.sqrt(2))) if np.isfinite(x) else float(x > 0)
+
+
+# the inputs named as uncertain, about the main.py design point
+EXAMPLE = {
+    'n_t': TruncatedNormal(0.85, 0.01, high=1),
+    'n_c': TruncatedNormal(0.85, 0.01, high=1),
+    'P_r': Normal(20.1, 0.5),  # gas turbine pressure ratio
+    'LHV': Normal(50000, 500),  # kJ/kg
+    'fluegas_massflow': Normal(724, 10),  # kg/s
+    'steam_high_temp': Normal(565, 5),  # C
+    'water_low_temp': Uniform(10, 20),  # C
+}
+
+def Sample(distributions, n, rng, method='lhs'):
+    # {name: n samples} of each distribution
+    names = tuple(distributions)
+    if method == 'lhs':
+        u = (np.stack([rng.permutation(n) for name in names], axis=1) + rng.random((n, len(names)))) / n
+    elif method == 'random':
+        u = rng.random((n, len(names)))
+    else:
+        raise ValueError("Unknown sampling method " + str(method) + ", expected 'lhs' or 'random'")
+    u = np.clip(u, 1e-12, 1 - 1e-12)
+    return {name: np.asarray(distributions[name].Ppf(u[:, index]), dtype=float) for index, name in enumerate(names)}
+
+
+class Statistics:
+    # streaming count, mean, variance, range and quantiles of one output
+
+    def __init__(self, sketch_size=2000):
+        self.sketch_size = sketch_size
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+        self.min = np.inf
+        self.max = -np.inf
+        self.values = np.empty(0)
+        self.weights = np.empty(0)
+
+    def Add(self, values):
+        values = np.asarray(values, dtype=float).reshape(-1)
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        n = len(values)
+        mean = values.mean()
+        delta = mean - self.mean
+        total = self.count + n
+        self.m2 += ((values - mean) ** 2).sum() + delta ** 2 * self.count * n / total
+        self.mean += delta * n / total
+        self.count = total
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.values = np.concatenate([self.values, values])
+        self.weights = np.concatenate([self.weights, np.ones(n)])
+        if len(self.values) > 2 * self.sketch_size:
+            self._Compress()
+
+    def _Compress(self):
+        order = np.argsort(self.values)
+        values, weights = self.values[order], self.weights[order]
+        cumulative = np.cumsum(weights)
+        group = np.minimum((cumulative - weights / 2) * self.sketch_size // cumulative[-1], self.sketch_size - 1).astype(int)
+        totals = np.bincount(group, weights, minlength=self.sketch_size)
+        keep = totals > 0
+        self.values = (np.bincount(group, weights * values, minlength=self.sketch_size)[keep] / totals[keep])
+        self.weights = totals[keep]
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def Quantile(self, q):
+        # q in [0, 1], scalar or array
+        if not self.count:
+            return np.full(np.shape(q), np.nan)
+        order = np.argsort(self.values)
+        values, weights = self.values[order], self.weights[order]
+        rank = (np.cumsum(weights) - weights / 2) / weights.sum()
+        return np.interp(q, np.concatenate([[0], rank, [1]]), np.concatenate([[self.min], values, [self.max]]))
+
+    def Summary(self, quantiles=QUANTILES):
+        return {
+            'count': self.count,
+            'mean': float(self.mean),
+            'std': float(self.std),
+            'min': float(self.min),
+            'max': float(self.max),
+            'quantiles': dict(zip(quantiles, np.atleast_1d(self.Quantile(quantiles)).tolist())),
+        }
+
+
+class UncertaintyResult:
+
+    def __init__(self, statistics, samples, failed, quantiles):
+        self.accumulators = statistics  # output -> Statistics
+        self.statistics = {name: stats.Summary(quantiles) for name, stats in statistics.items()}
+        self.samples = samples
+        self.failed = failed  # samples the models could not evaluate
+
+
+def Propagate(distributions=None, n=100000, batch=10000, method='lhs', seed=0, outputs=OUTPUTS, base=None,
+              quantiles=QUANTILES, segments=1, sketch_size=2000, progress=None):
+    # distributions: {plant input: Normal/Uniform/... with a Ppf}, default EXAMPLE.
+    # outputs: plant.RESULTS to keep statistics of.
+    # progress: called as progress(samples_done, n) after each batch.
+    distributions = EXAMPLE if distributions is None else distributions
+    unknown = [name for name in list(distributions) + list(base or {}) if name not in plant.DEFAULTS]
+    unknown += [name for name in outputs if name not in plant.RESULTS]
+    if unknown:
+        raise ValueError("Unknown plant inputs or results " + ", ".join(unknown))
+    values = dict(plant.DEFAULTS, **(base or {}))
+    rng = np.random.default_rng(seed)
+    statistics = {name: Statistics(sketch_size) for name in outputs}
+    failed = 0
+    done = 0
+    while done < n:
+        size = min(batch, n - done)
+        inputs = dict(values, **Sample(distributions, size, rng, method))
+        names = tuple(inputs)
+        rows = np.stack([np.broadcast_to(np.asarray(inputs[name], dtype=float), size) for name in names], axis=1)
+        with instrument.Stage('uncertainty batch'):
+            results = plant.EvaluateRows(rows, names, batch=True, segments=segments)
+        failed += int(np.count_nonzero(np.all(np.isnan(results), axis=1)))
+        for name in outputs:
+            statistics[name].Add(results[:, plant.RESULTS.index(name)])
+        done += size
+        if progress is not None:
+            progress(done, n)
+    return UncertaintyResult(statistics, n, failed, quantiles)